@@ -0,0 +1,37 @@
+"""Soft-delete marker on tests
+
+Revision ID: 0a3e7c5d9b24
+Revises: f2c9d7b4e816
+Create Date: 2026-10-18 09:12:44.530187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '0a3e7c5d9b24'
+down_revision: Union[str, None] = 'f2c9d7b4e816'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Колонка без значения по умолчанию — добавление не переписывает таблицу
+    op.add_column('tests', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_tests_pending_purge', 'tests', ['id'], unique=False,
+            postgresql_where=sa.text('deleted_at IS NOT NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tests_pending_purge', table_name='tests', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('tests', 'deleted_at')
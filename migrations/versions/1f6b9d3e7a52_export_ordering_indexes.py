@@ -0,0 +1,36 @@
+"""Indexes for export range scans
+
+Revision ID: 1f6b9d3e7a52
+Revises: 0a3e7c5d9b24
+Create Date: 2026-10-19 11:05:27.614093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '1f6b9d3e7a52'
+down_revision: Union[str, None] = '0a3e7c5d9b24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Выгрузки фильтруют и сортируют по времени: без индексов — полный скан и сортировка всей таблицы
+INDEXES = [
+    ('ix_user_questions_answered_at', 'user_questions', ['answered_at']),
+    ('ix_user_test_sessions_start_time', 'user_test_sessions', ['start_time']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,60 @@
+"""Indexes for hot filter paths, drop redundant primary key indexes
+
+Revision ID: 5c7d2e8f9a01
+Revises: 3b9f1c2d4e5a
+Create Date: 2026-10-16 11:40:05.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '5c7d2e8f9a01'
+down_revision: Union[str, None] = '3b9f1c2d4e5a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблицы, у которых PK был объявлен с index=True: индекс дублирует индекс первичного ключа
+PK_INDEXED_TABLES = (
+    'users', 'chat_messages', 'materials', 'user_materials', 'tests',
+    'questions', 'answers', 'user_questions', 'user_test_sessions',
+)
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = (
+    ('ix_chat_messages_user_created', 'chat_messages', ['user_id', sa.text('created_at DESC')], None),
+    ('ix_user_materials_user_material', 'user_materials', ['user_id', 'material_id'], None),
+    ('ix_questions_test_id', 'questions', ['test_id'], None),
+    ('ix_answers_question_id', 'answers', ['question_id'], None),
+    ('ix_user_questions_user_question', 'user_questions', ['user_id', 'question_id'], None),
+    ('ix_user_questions_question_id', 'user_questions', ['question_id'], None),
+    ('ix_user_test_sessions_user_test_start', 'user_test_sessions', ['user_id', 'test_id', 'start_time'], None),
+    ('ix_user_test_sessions_open', 'user_test_sessions', ['user_id', 'test_id'], 'is_completed = false'),
+    ('ix_user_test_sessions_test_completed', 'user_test_sessions', ['test_id'], 'is_completed = true'),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в горячие таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        for table in PK_INDEXED_TABLES:
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_id')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in PK_INDEXED_TABLES:
+            op.create_index(f'ix_{table}_id', table, ['id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
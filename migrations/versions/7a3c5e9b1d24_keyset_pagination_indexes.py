@@ -0,0 +1,44 @@
+"""Indexes for keyset pagination on (created_at, id)
+
+Revision ID: 7a3c5e9b1d24
+Revises: 5c7d2e8f9a01
+Create Date: 2026-10-16 15:20:41.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '7a3c5e9b1d24'
+down_revision: Union[str, None] = '5c7d2e8f9a01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя, таблица, колонки)
+INDEXES = (
+    ('ix_users_created_id', 'users', ['created_at', 'id']),
+    ('ix_materials_created_id', 'materials', ['created_at', 'id']),
+    ('ix_tests_created_id', 'tests', ['created_at', 'id']),
+    ('ix_questions_test_created_id', 'questions', ['test_id', 'created_at', 'id']),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        # (test_id, created_at, id) покрывает поиск по test_id — старый индекс больше не нужен
+        op.drop_index('ix_questions_test_id', table_name='questions', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_questions_test_id', 'questions', ['test_id'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
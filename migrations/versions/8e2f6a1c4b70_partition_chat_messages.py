@@ -0,0 +1,94 @@
+"""Monthly range partitions for chat_messages
+
+Revision ID: 8e2f6a1c4b70
+Revises: 7a3c5e9b1d24
+Create Date: 2026-10-16 17:05:12.430915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '8e2f6a1c4b70'
+down_revision: Union[str, None] = '7a3c5e9b1d24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперёд создать сразу; дальше партиции создаёт utils/db/partitions.py
+PARTITIONS_AHEAD = 3
+
+COLUMNS = "id, user_id, role, message_text, created_at"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Границы партиций считаем в UTC — так же, как utils/db/partitions.py
+    op.execute("SET LOCAL timezone = 'UTC'")
+
+    # Старая таблица уходит в сторону вместе с именами её индексов
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_legacy")
+    op.execute("ALTER TABLE chat_messages_legacy RENAME CONSTRAINT chat_messages_pkey TO chat_messages_legacy_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_chat_messages_user_created RENAME TO ix_chat_messages_legacy_user_created")
+
+    # Ключ партиционирования обязан входить в первичный ключ
+    op.execute("""
+        CREATE TABLE chat_messages (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id),
+            role VARCHAR NOT NULL,
+            message_text TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT chat_messages_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    # Партиции с месяца самого старого сообщения и на PARTITIONS_AHEAD месяцев вперёд
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month timestamptz;
+            last_month timestamptz := date_trunc('month', now()) + interval '{PARTITIONS_AHEAD} months';
+        BEGIN
+            SELECT coalesce(date_trunc('month', min(created_at)), date_trunc('month', now()))
+              INTO month FROM chat_messages_legacy;
+            WHILE month <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+                    'chat_messages_p' || to_char(month, 'YYYY_MM'), month, month + interval '1 month'
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END $$
+    """)
+    # Страховка, если обслуживание партиций не успело создать очередной месяц
+    op.execute("CREATE TABLE chat_messages_default PARTITION OF chat_messages DEFAULT")
+
+    # Индекс на родителе создаётся на каждой партиции
+    op.execute("CREATE INDEX ix_chat_messages_user_created ON chat_messages (user_id, created_at DESC)")
+
+    op.execute(f"INSERT INTO chat_messages ({COLUMNS}) SELECT {COLUMNS} FROM chat_messages_legacy")
+    op.execute("DROP TABLE chat_messages_legacy")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_partitioned")
+    op.execute("ALTER TABLE chat_messages_partitioned RENAME CONSTRAINT chat_messages_pkey TO chat_messages_partitioned_pkey")
+    op.execute("ALTER INDEX ix_chat_messages_user_created RENAME TO ix_chat_messages_partitioned_user_created")
+
+    op.execute("""
+        CREATE TABLE chat_messages (
+            id UUID NOT NULL,
+            user_id UUID NOT NULL REFERENCES users (id),
+            role VARCHAR NOT NULL,
+            message_text TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            CONSTRAINT chat_messages_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("CREATE INDEX ix_chat_messages_user_created ON chat_messages (user_id, created_at DESC)")
+
+    # Уже заархивированные партиции не возвращаются — их данные остаются в архиве
+    op.execute(f"INSERT INTO chat_messages ({COLUMNS}) SELECT {COLUMNS} FROM chat_messages_partitioned")
+    op.execute("DROP TABLE chat_messages_partitioned CASCADE")
@@ -0,0 +1,78 @@
+"""ON DELETE CASCADE foreign keys for user and test history
+
+Revision ID: 9d4b7f2a6c13
+Revises: 8e2f6a1c4b70
+Create Date: 2026-10-16 18:32:47.205611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '9d4b7f2a6c13'
+down_revision: Union[str, None] = '8e2f6a1c4b70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (таблица, колонка, ссылка, ON DELETE)
+FOREIGN_KEYS = (
+    ('chat_messages', 'user_id', 'users', 'CASCADE'),
+    ('user_materials', 'user_id', 'users', 'CASCADE'),
+    ('user_materials', 'material_id', 'materials', 'CASCADE'),
+    ('questions', 'test_id', 'tests', 'CASCADE'),
+    ('answers', 'question_id', 'questions', 'CASCADE'),
+    ('user_questions', 'user_id', 'users', 'CASCADE'),
+    ('user_questions', 'question_id', 'questions', 'CASCADE'),
+    ('user_questions', 'selected_answer_id', 'answers', 'SET NULL'),
+    ('user_test_sessions', 'user_id', 'users', 'CASCADE'),
+    ('user_test_sessions', 'test_id', 'tests', 'CASCADE'),
+)
+
+# Без индекса по ссылающейся колонке каждое каскадное удаление — seq scan дочерней таблицы
+INDEXES = (
+    ('ix_user_materials_material_id', 'user_materials', ['material_id']),
+    ('ix_user_questions_selected_answer_id', 'user_questions', ['selected_answer_id']),
+    ('ix_user_test_sessions_test_id', 'user_test_sessions', ['test_id']),
+)
+
+# NOT VALID нельзя повесить на партиционированную таблицу — там ключ проверяется сразу
+PARTITIONED_TABLES = ('chat_messages',)
+
+
+def _replace_foreign_keys(on_delete: bool) -> None:
+    for table, column, referred, action in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        clause = f' ON DELETE {action}' if on_delete else ''
+        not_valid = '' if table in PARTITIONED_TABLES else ' NOT VALID'
+        op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}')
+        op.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {name} '
+            f'FOREIGN KEY ({column}) REFERENCES {referred} (id){clause}{not_valid}'
+        )
+
+
+def _validate_foreign_keys() -> None:
+    # VALIDATE берёт SHARE UPDATE EXCLUSIVE и не блокирует запись, поэтому идёт отдельно от ALTER
+    with op.get_context().autocommit_block():
+        for table, column, _, _ in FOREIGN_KEYS:
+            if table not in PARTITIONED_TABLES:
+                op.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_{column}_fkey')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+    _replace_foreign_keys(on_delete=True)
+    _validate_foreign_keys()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_foreign_keys(on_delete=False)
+    _validate_foreign_keys()
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
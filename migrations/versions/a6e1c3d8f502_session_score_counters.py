@@ -0,0 +1,55 @@
+"""Answer counters on user_test_sessions
+
+Revision ID: a6e1c3d8f502
+Revises: 9d4b7f2a6c13
+Create Date: 2026-10-16 19:48:13.574220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'a6e1c3d8f502'
+down_revision: Union[str, None] = '9d4b7f2a6c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = ('answered_count', 'correct_count', 'wrong_count')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Константный DEFAULT не переписывает таблицу
+    for column in COUNTERS:
+        op.add_column(
+            'user_test_sessions',
+            sa.Column(column, sa.Integer(), server_default='0', nullable=False)
+        )
+
+    # Ответ относится к попытке, если дан между её началом и завершением
+    op.execute("""
+        UPDATE user_test_sessions AS s
+        SET answered_count = a.answered,
+            correct_count = a.correct,
+            wrong_count = a.answered - a.correct
+        FROM (
+            SELECT s2.id,
+                   count(uq.id) AS answered,
+                   count(uq.id) FILTER (WHERE uq.is_correct) AS correct
+            FROM user_test_sessions AS s2
+            JOIN questions AS q ON q.test_id = s2.test_id
+            JOIN user_questions AS uq ON uq.question_id = q.id AND uq.user_id = s2.user_id
+            WHERE uq.answered_at >= s2.start_time
+              AND (s2.end_time IS NULL OR uq.answered_at <= s2.end_time)
+            GROUP BY s2.id
+        ) AS a
+        WHERE a.id = s.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for column in reversed(COUNTERS):
+        op.drop_column('user_test_sessions', column)
@@ -0,0 +1,82 @@
+"""Scope user_questions to a test session
+
+Revision ID: b3f8d5e2a917
+Revises: a6e1c3d8f502
+Create Date: 2026-10-16 21:03:29.816450
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b3f8d5e2a917'
+down_revision: Union[str, None] = 'a6e1c3d8f502'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user_questions', sa.Column('session_id', sa.UUID(), nullable=True))
+    op.create_foreign_key(
+        'user_questions_session_id_fkey', 'user_questions', 'user_test_sessions',
+        ['session_id'], ['id'], ondelete='CASCADE'
+    )
+
+    # Ответ относится к последней попытке того же теста, начатой до ответа.
+    # Дубли (session_id, question_id) остаются без сессии — берём самый поздний ответ
+    op.execute("""
+        UPDATE user_questions AS uq
+        SET session_id = m.session_id
+        FROM (
+            SELECT DISTINCT ON (s.id, uq2.question_id) uq2.id AS user_question_id, s.id AS session_id
+            FROM user_questions AS uq2
+            JOIN questions AS q ON q.id = uq2.question_id
+            JOIN LATERAL (
+                SELECT s2.id FROM user_test_sessions AS s2
+                WHERE s2.user_id = uq2.user_id
+                  AND s2.test_id = q.test_id
+                  AND s2.start_time <= uq2.answered_at
+                ORDER BY s2.start_time DESC
+                LIMIT 1
+            ) AS s ON true
+            ORDER BY s.id, uq2.question_id, uq2.answered_at DESC
+        ) AS m
+        WHERE m.user_question_id = uq.id
+    """)
+
+    # Счётчики попыток пересчитываем по новой привязке
+    op.execute("""
+        UPDATE user_test_sessions AS s
+        SET answered_count = coalesce(a.answered, 0),
+            correct_count = coalesce(a.correct, 0),
+            wrong_count = coalesce(a.answered - a.correct, 0)
+        FROM user_test_sessions AS s2
+        LEFT JOIN (
+            SELECT session_id, count(*) AS answered, count(*) FILTER (WHERE is_correct) AS correct
+            FROM user_questions
+            WHERE session_id IS NOT NULL
+            GROUP BY session_id
+        ) AS a ON a.session_id = s2.id
+        WHERE s2.id = s.id
+    """)
+
+    # Уникальный индекс строится без блокировки записи, ограничение вешается на готовый индекс
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_user_questions_session_question', 'user_questions', ['session_id', 'question_id'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+    op.execute(
+        'ALTER TABLE user_questions ADD CONSTRAINT uq_user_questions_session_question '
+        'UNIQUE USING INDEX uq_user_questions_session_question'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_user_questions_session_question', 'user_questions', type_='unique')
+    op.drop_constraint('user_questions_session_id_fkey', 'user_questions', type_='foreignkey')
+    op.drop_column('user_questions', 'session_id')
@@ -0,0 +1,61 @@
+"""Unique partial index for the open test session
+
+Revision ID: c1a7e4b9d358
+Revises: b3f8d5e2a917
+Create Date: 2026-10-16 22:14:52.339187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c1a7e4b9d358'
+down_revision: Union[str, None] = 'b3f8d5e2a917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Гонка в старом start_test могла оставить несколько открытых попыток — открытой остаётся последняя
+    op.execute("""
+        UPDATE user_test_sessions AS s
+        SET is_completed = true, end_time = s.start_time, total_time_seconds = 0
+        WHERE s.is_completed = false
+          AND EXISTS (
+              SELECT 1 FROM user_test_sessions AS newer
+              WHERE newer.user_id = s.user_id
+                AND newer.test_id = s.test_id
+                AND newer.is_completed = false
+                AND (newer.start_time, newer.id) > (s.start_time, s.id)
+          )
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_user_test_sessions_open', 'user_test_sessions', ['user_id', 'test_id'], unique=True,
+            postgresql_where=sa.text('is_completed = false'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        # Уникальный индекс покрывает те же запросы
+        op.drop_index(
+            'ix_user_test_sessions_open', table_name='user_test_sessions',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_test_sessions_open', 'user_test_sessions', ['user_id', 'test_id'], unique=False,
+            postgresql_where=sa.text('is_completed = false'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            'uq_user_test_sessions_open', table_name='user_test_sessions',
+            postgresql_concurrently=True, if_exists=True
+        )
@@ -0,0 +1,41 @@
+"""Full-text search vector and GIN index on materials
+
+Revision ID: d5c2a8f1e364
+Revises: c1a7e4b9d358
+Create Date: 2026-10-16 23:26:08.704193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'd5c2a8f1e364'
+down_revision: Union[str, None] = 'c1a7e4b9d358'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Конфигурация должна совпадать с FTS_CONFIG в server/app/utils/db/fulltext.py
+SEARCH_VECTOR = """
+    setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(subtitle, '')), 'B') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(content, '')), 'C')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # STORED-колонка переписывает таблицу один раз; дальше вектор пересчитывается при INSERT/UPDATE
+    op.execute(f"ALTER TABLE materials ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED")
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_materials_search_vector "
+            "ON materials USING gin (search_vector)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_materials_search_vector")
+    op.execute("ALTER TABLE materials DROP COLUMN search_vector")
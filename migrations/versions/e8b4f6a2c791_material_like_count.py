@@ -0,0 +1,45 @@
+"""Like counter on materials
+
+Revision ID: e8b4f6a2c791
+Revises: d5c2a8f1e364
+Create Date: 2026-10-17 00:41:37.092816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e8b4f6a2c791'
+down_revision: Union[str, None] = 'd5c2a8f1e364'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('materials', sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE materials AS m
+        SET like_count = likes.count
+        FROM (
+            SELECT material_id, count(*) AS count
+            FROM user_materials
+            WHERE is_liked
+            GROUP BY material_id
+        ) AS likes
+        WHERE likes.material_id = m.id
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_materials_like_count_id', 'materials', ['like_count', 'id'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_materials_like_count_id', table_name='materials', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('materials', 'like_count')
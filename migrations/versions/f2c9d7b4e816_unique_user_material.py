@@ -0,0 +1,84 @@
+"""Unique (user_id, material_id) on user_materials
+
+Revision ID: f2c9d7b4e816
+Revises: e8b4f6a2c791
+Create Date: 2026-10-17 11:20:05.418233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'f2c9d7b4e816'
+down_revision: Union[str, None] = 'e8b4f6a2c791'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Гонка первого лайка могла оставить несколько строк на пару — остаётся самая ранняя,
+    # лайк на ней стоит, если он стоял хотя бы на одной из дублей
+    op.execute("""
+        UPDATE user_materials AS um
+        SET is_liked = d.is_liked
+        FROM (
+            SELECT DISTINCT ON (user_id, material_id)
+                id, bool_or(is_liked) OVER (PARTITION BY user_id, material_id) AS is_liked
+            FROM user_materials
+            ORDER BY user_id, material_id, created_at, id
+        ) AS d
+        WHERE d.id = um.id AND um.is_liked IS DISTINCT FROM d.is_liked
+    """)
+    op.execute("""
+        DELETE FROM user_materials AS um
+        WHERE EXISTS (
+            SELECT 1 FROM user_materials AS older
+            WHERE older.user_id = um.user_id
+              AND older.material_id = um.material_id
+              AND (older.created_at, older.id) < (um.created_at, um.id)
+        )
+    """)
+
+    # Дубли попадали в счётчик — пересчитываем его
+    op.execute("""
+        UPDATE materials AS m
+        SET like_count = coalesce(likes.count, 0)
+        FROM materials AS m2
+        LEFT JOIN (
+            SELECT material_id, count(*) AS count
+            FROM user_materials
+            WHERE is_liked
+            GROUP BY material_id
+        ) AS likes ON likes.material_id = m2.id
+        WHERE m2.id = m.id AND m.like_count IS DISTINCT FROM coalesce(likes.count, 0)
+    """)
+
+    # Уникальный индекс строится без блокировки записи, ограничение вешается на готовый индекс
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_user_materials_user_material', 'user_materials', ['user_id', 'material_id'],
+            unique=True, postgresql_concurrently=True, if_not_exists=True
+        )
+    op.execute(
+        'ALTER TABLE user_materials ADD CONSTRAINT uq_user_materials_user_material '
+        'UNIQUE USING INDEX uq_user_materials_user_material'
+    )
+    # Уникальный индекс покрывает те же запросы
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_materials_user_material', table_name='user_materials',
+            postgresql_concurrently=True, if_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_materials_user_material', 'user_materials', ['user_id', 'material_id'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True
+        )
+    op.drop_constraint('uq_user_materials_user_material', 'user_materials', type_='unique')
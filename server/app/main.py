@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from server.app.routers.auth import auth_router
 from server.app.routers.users import user_router
 from server.app.routers.ai import ai_router
@@ -7,8 +10,57 @@ from server.app.routers.tests import tests_router
 from server.app.routers.questions import questions_router
 from server.app.routers.sessions import sessions_router
 from server.app.routers.user_stats import user_stats_router
+from server.app.routers.metrics import metrics_router
+from server.app.routers.exports import exports_router
+from server.app.utils.security import shutdown_hash_pool
+from server.app.utils.revocation import revocation_list
+from server.app.utils.question_index import question_index
+from server.app.utils.db.engine import async_engine, engine, is_sqlite
+from server.app.utils.db.models import Base
+from server.app.utils.db.replicas import replica_router
+from server.app.utils.db.partitions import run_periodic_maintenance
+from server.app.utils.db.purge import resume_test_purges
+from server.app.utils.db.instrumentation import SQL_INSTRUMENTATION, collect_queries, log_n_plus_one
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if is_sqlite(async_engine.url):
+        # Встроенный режим без миграций: схема создаётся при старте
+        async with async_engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+    await question_index.rebuild()
+    revocation_sync = asyncio.create_task(revocation_list.run_periodic_sync())
+    replica_health = asyncio.create_task(replica_router.run_periodic_health_checks())
+    question_index_rebuild = asyncio.create_task(question_index.run_periodic_rebuild())
+    # Удаления тестов, прерванные прошлым перезапуском
+    test_purges = asyncio.create_task(resume_test_purges())
+    background = [revocation_sync, replica_health, question_index_rebuild, test_purges]
+    if engine.dialect.name == "postgresql":
+        # Будущие партиции chat_messages и архивация старых
+        background.append(asyncio.create_task(run_periodic_maintenance(engine)))
+    yield
+    for task in background:
+        task.cancel()
+    shutdown_hash_pool()
+    await replica_router.dispose()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+if SQL_INSTRUMENTATION:
+    @app.middleware("http")
+    async def sql_stats_middleware(request: Request, call_next):
+        """ Число SQL-запросов и суммарное время в БД — в заголовках ответа, повторы — в лог """
+        with collect_queries() as stats:
+            response = await call_next(request)
+        response.headers["X-DB-Queries"] = str(stats.count)
+        response.headers["X-DB-Time-ms"] = str(stats.total_ms)
+        log_n_plus_one(stats, f"{request.method} {request.url.path}")
+        return response
 
-app = FastAPI()
 
 app.include_router(auth_router)
 app.include_router(user_router)
@@ -18,7 +70,9 @@ app.include_router(tests_router)
 app.include_router(questions_router)
 app.include_router(sessions_router)
 app.include_router(user_stats_router)
+app.include_router(metrics_router)
+app.include_router(exports_router)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "API is running!"}
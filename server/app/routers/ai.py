@@ -1,10 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from together import Together
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from together import AsyncTogether
 from server.app.schemas.ai import AIRequest, AIResponse, InterviewRequest, InterviewResponse
 from server.app.utils.db.models import ChatMessage
-from server.app.utils.db.setup import get_db
-from server.app.routers.auth import get_current_user
+from server.app.utils.db.setup import get_async_db
+from server.app.routers.auth import get_current_principal, Principal
 from dotenv import load_dotenv
 from typing import List
 import os
@@ -16,7 +17,7 @@ TOGETHER_API_KEY = os.getenv("TOGETHER_API_KEY")
 if not TOGETHER_API_KEY:
     raise ValueError("TOGETHER_API_KEY не найден в переменных окружения")
 
-client = Together(api_key=TOGETHER_API_KEY)
+client = AsyncTogether(api_key=TOGETHER_API_KEY)
 
 ai_router = APIRouter(prefix="/ai", tags=["AI"])
 
@@ -24,10 +25,10 @@ ai_router = APIRouter(prefix="/ai", tags=["AI"])
 chat_sessions = {}
 
 @ai_router.post("/ask", response_model=AIResponse)
-def ask_together_ai(request: AIRequest):
+async def ask_together_ai(request: AIRequest):
     """Отправляет запрос в Together.ai и возвращает ответ."""
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
             messages=[{"role": "user", "content": request.question}]
         )
@@ -39,28 +40,30 @@ def ask_together_ai(request: AIRequest):
 
 
 @ai_router.post("/interview", response_model=InterviewResponse)
-def interview_chat(
+async def interview_chat(
     request: InterviewRequest,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
     max_history: int = 15  # глубина истории
 ):
     """ Чат с ИИ-интервьюером, который задает вопросы по Swift """
 
     # Загружаем последние max_history сообщений из БД
-    history = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.user_id == current_user.id)
+    history = (await db.execute(
+        select(ChatMessage)
+        .where(ChatMessage.user_id == current_user.id)
         .order_by(ChatMessage.created_at.desc())
         .limit(max_history)
-        .all()
-    )
+    )).scalars().all()
 
     # Инвертируем порядок (от старых к новым) и превращаем в messages для Together
     history_messages = [
         {"role": msg.role, "content": msg.message_text}
         for msg in reversed(history)
     ]
+    # Завершаем транзакцию чтения: соединение возвращается в пул и не висит
+    # idle in transaction, пока ждём ответ модели (это секунды). Реплики запишем отдельной короткой транзакцией
+    await db.commit()
 
     # Добавляем системный промпт при начале диалога
     if not history_messages or history_messages[0]["role"] != "system":
@@ -111,7 +114,7 @@ def interview_chat(
     history_messages.append({"role": "user", "content": request.answer})
 
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
             messages=history_messages
         )
@@ -131,7 +134,7 @@ def interview_chat(
             message_text=bot_reply
         ))
 
-        db.commit()
+        await db.commit()
 
         return InterviewResponse(question=bot_reply)
 
@@ -143,26 +146,27 @@ def interview_chat(
 # Новая ручка: HR интервью
 # --------------------------------
 @ai_router.post("/hr-interview", response_model=InterviewResponse)
-def hr_interview_chat(
+async def hr_interview_chat(
     request: InterviewRequest,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
     max_history: int = 15
 ):
     """ Чат с ИИ-HR для подготовки к soft skill интервью """
 
-    history = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.user_id == current_user.id)
+    history = (await db.execute(
+        select(ChatMessage)
+        .where(ChatMessage.user_id == current_user.id)
         .order_by(ChatMessage.created_at.desc())
         .limit(max_history)
-        .all()
-    )
+    )).scalars().all()
 
     history_messages = [
         {"role": msg.role, "content": msg.message_text}
         for msg in reversed(history)
     ]
+    # Отдаём соединение в пул на время запроса к модели (см. /interview)
+    await db.commit()
 
     if not history_messages or history_messages[0]["role"] != "system":
         history_messages.insert(0, {
@@ -214,7 +218,7 @@ def hr_interview_chat(
     history_messages.append({"role": "user", "content": request.answer})
 
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
             messages=history_messages
         )
@@ -222,7 +226,7 @@ def hr_interview_chat(
 
         db.add(ChatMessage(user_id=current_user.id, role="user", message_text=request.answer))
         db.add(ChatMessage(user_id=current_user.id, role="assistant", message_text=bot_reply))
-        db.commit()
+        await db.commit()
 
         return InterviewResponse(question=bot_reply)
 
@@ -234,26 +238,27 @@ def hr_interview_chat(
 # Новая ручка: Техническое интервью
 # --------------------------------
 @ai_router.post("/tech-interview", response_model=InterviewResponse)
-def tech_interview_chat(
+async def tech_interview_chat(
     request: InterviewRequest,
-    db: Session = Depends(get_db),
-    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
     max_history: int = 15
 ):
     """ Чат с ИИ для технического интервью: алгоритмы, структуры данных """
 
-    history = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.user_id == current_user.id)
+    history = (await db.execute(
+        select(ChatMessage)
+        .where(ChatMessage.user_id == current_user.id)
         .order_by(ChatMessage.created_at.desc())
         .limit(max_history)
-        .all()
-    )
+    )).scalars().all()
 
     history_messages = [
         {"role": msg.role, "content": msg.message_text}
         for msg in reversed(history)
     ]
+    # Отдаём соединение в пул на время запроса к модели (см. /interview)
+    await db.commit()
 
     if not history_messages or history_messages[0]["role"] != "system":
         history_messages.insert(0, {
@@ -287,7 +292,7 @@ def tech_interview_chat(
     history_messages.append({"role": "user", "content": request.answer})
 
     try:
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
             messages=history_messages
         )
@@ -295,7 +300,7 @@ def tech_interview_chat(
 
         db.add(ChatMessage(user_id=current_user.id, role="user", message_text=request.answer))
         db.add(ChatMessage(user_id=current_user.id, role="assistant", message_text=bot_reply))
-        db.commit()
+        await db.commit()
 
         return InterviewResponse(question=bot_reply)
 
@@ -304,7 +309,7 @@ def tech_interview_chat(
 
 
 @ai_router.post("/generate-test")
-def generate_test():
+async def generate_test():
     """
     Генерирует JSON с 10 вопросами по программированию через LLM
     """
@@ -326,7 +331,7 @@ def generate_test():
             "Только JSON! Без лишнего текста, без описаний. Тема теста: Основы Swift."
         )
 
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="meta-llama/Llama-3.3-70B-Instruct-Turbo",
             messages=[
                 {"role": "system", "content": "Ты генератор тестов. Возвращаешь только валидный JSON без комментариев."},
@@ -1,12 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
-from datetime import timedelta
 from jose import jwt, JWTError
-from server.app.utils.db.models import User
-from server.app.utils.db.setup import get_db
-from server.app.utils.security import hash_password, verify_password, create_access_token
-from server.app.schemas.user import UserCreate, UserLogin, Token  # ✅ Теперь Token доступен
+from server.app.utils.db.models import User, RefreshToken, RevokedToken
+from server.app.utils.db.setup import get_async_db
+from server.app.utils.cache import TTLCache
+from server.app.utils.revocation import revocation_list
+from server.app.utils.rate_limit import login_rate_limiter, retry_after_header
+from server.app.utils.security import (
+    hash_password_async, verify_password_async, create_access_token, create_refresh_token,
+    role_for_email, HashingOverloaded
+)
+from server.app.schemas.user import UserCreate, UserLogin, Token, RefreshRequest, LogoutRequest
 
 auth_router = APIRouter(prefix="/auth", tags=["Auth"])
 
@@ -15,44 +27,260 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
 
+# Кэш "проверенный токен -> снимок пользователя", чтобы не ходить в БД на каждый запрос
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAXSIZE = int(os.getenv("PRINCIPAL_CACHE_MAXSIZE", "10000"))
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAXSIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Отвязанная от сессии копия пользователя, которую можно безопасно хранить в кэше
+    и отдавать в разные запросы. Для изменения данных нужно заново загрузить User из БД.
+    """
+    id: UUID
+    email: str
+    name: str
+    date_of_birth: Optional[date]
+    gender: Optional[str]
+    grade: Optional[str]
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            name=user.name,
+            date_of_birth=user.date_of_birth,
+            gender=user.gender,
+            grade=user.grade,
+            created_at=user.created_at,
+            updated_at=user.updated_at,
+        )
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Данные о пользователе, которые берутся прямо из claims токена, без запроса к БД.
+    Подходит для ручек, которым нужен только id пользователя и его роль.
+    """
+    id: UUID
+    email: str
+    role: str
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+
+def invalidate_user_cache(user_id: UUID) -> None:
+    """ Сбрасывает все закэшированные токены пользователя (после изменения или удаления) """
+    principal_cache.invalidate_where(lambda entry: entry[1].id == user_id)
+
+
+async def _get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
+
+async def _issue_tokens(db: AsyncSession, user: User) -> dict:
+    """ Выдаёт пару access/refresh; refresh-токен регистрируется в БД по jti """
+    access_token = create_access_token(
+        data={"sub": user.email, "uid": str(user.id), "role": role_for_email(user.email)}
+    )
+    refresh_token, jti, expires_at = create_refresh_token(user.id)
+    db.add(RefreshToken(jti=jti, user_id=user.id, expires_at=expires_at))
+    await db.commit()
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+def _decode_access_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Некорректный токен")
+    # refresh-токен нельзя использовать вместо access-токена
+    if payload.get("type", "access") != "access":
+        raise HTTPException(status_code=401, detail="Некорректный токен")
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise HTTPException(status_code=401, detail="Токен отозван")
+    return payload
+
+
+# Хэширование уходит в пул процессов, поэтому event loop не занят на всё время работы bcrypt
 @auth_router.post("/register", response_model=UserCreate)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await _get_user_by_email(db, user_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email уже зарегистрирован")
 
+    try:
+        hashed_password = await hash_password_async(user_data.password)
+    except HashingOverloaded:
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте позже", headers={"Retry-After": "1"})
+
     new_user = User(
         email=user_data.email,
         name=user_data.name,
-        password=hash_password(user_data.password)
+        password=hashed_password
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
 @auth_router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.password):
+async def login(user_data: UserLogin, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Лимиты проверяются до запроса к БД и до bcrypt, чтобы перебор паролей не тратил CPU
+    client_ip = request.client.host if request.client else None
+    allowed, retry_after = await login_rate_limiter.check(client_ip, user_data.email)
+    if not allowed:
+        raise HTTPException(status_code=429, detail="Слишком много попыток входа", headers=retry_after_header(retry_after))
+
+    user = await _get_user_by_email(db, user_data.email)
+    if not user:
+        raise HTTPException(status_code=401, detail="Неверные учетные данные")
+
+    with login_rate_limiter.verifications.slot() as acquired:
+        if not acquired:
+            raise HTTPException(status_code=429, detail="Слишком много попыток входа", headers={"Retry-After": "1"})
+        try:
+            password_ok = await verify_password_async(user_data.password, user.password)
+        except HashingOverloaded:
+            raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте позже", headers={"Retry-After": "1"})
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Неверные учетные данные")
 
-    access_token = create_access_token(data={"sub": user.email}, expires_delta=timedelta(hours=1))
-    return {"access_token": access_token, "token_type": "bearer"}
+    return await _issue_tokens(db, user)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """ Декодирует JWT и получает текущего пользователя из БД """
+@auth_router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Обменивает refresh-токен на новую пару токенов (старый refresh-токен отзывается).
+    """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Не удалось проверить учетные данные")
-        user = db.query(User).filter(User.email == email).first()
-        if user is None:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        return user
+        payload = jwt.decode(request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Некорректный токен")
+    if payload.get("type") != "refresh":
+        raise HTTPException(status_code=401, detail="Некорректный токен")
+
+    # Атомарно помечаем токен использованным: из двух параллельных обменов пройдёт только один
+    now = datetime.now(timezone.utc)
+    rotated = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.jti == payload.get("jti"), RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    if not rotated.rowcount:
+        stored = (await db.execute(
+            select(RefreshToken).where(RefreshToken.jti == payload.get("jti"))
+        )).scalars().first()
+        if stored:
+            # Повторное использование уже обменянного токена — похоже на утечку, отзываем все токены пользователя
+            await db.execute(
+                update(RefreshToken)
+                .where(RefreshToken.user_id == stored.user_id, RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=now)
+            )
+            await db.commit()
+        raise HTTPException(status_code=401, detail="Токен отозван")
+
+    user = (await db.execute(select(User).where(User.id == UUID(payload["uid"])))).scalars().first()
+    if not user:
+        await db.rollback()
+        raise HTTPException(status_code=401, detail="Пользователь не найден")
+
+    return await _issue_tokens(db, user)
+
+
+@auth_router.post("/logout")
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Отзывает текущий access-токен и, если передан, refresh-токен.
+    """
+    payload = _decode_access_token(token)
+    jti = payload.get("jti")
+    expires_at = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+    if jti:
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
+
+    if request and request.refresh_token:
+        try:
+            refresh_payload = jwt.decode(request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            refresh_payload = {}
+        if refresh_payload.get("type") == "refresh" and refresh_payload.get("uid") == payload.get("uid"):
+            await db.execute(
+                update(RefreshToken)
+                .where(RefreshToken.jti == refresh_payload.get("jti"), RefreshToken.revoked_at.is_(None))
+                .values(revoked_at=datetime.now(timezone.utc))
+            )
+
+    await db.commit()
+    if jti:
+        revocation_list.add(jti, expires_at)
+    principal_cache.pop(token)
+    return {"detail": "Вы вышли из системы"}
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> UserSnapshot:
+    """ Декодирует JWT и получает текущего пользователя (из кэша или из БД) """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        jti, snapshot = cached
+        if revocation_list.is_revoked(jti):
+            raise HTTPException(status_code=401, detail="Токен отозван")
+        return snapshot
+
+    payload = _decode_access_token(token)
+    email: str = payload.get("sub")
+    if email is None:
+        raise HTTPException(status_code=401, detail="Не удалось проверить учетные данные")
+    user = await _get_user_by_email(db, email)
+    if user is None:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+
+    snapshot = UserSnapshot.from_user(user)
+    # Запись не должна пережить сам токен
+    expires_in = payload.get("exp", 0) - datetime.now(timezone.utc).timestamp()
+    principal_cache.set(token, (payload.get("jti"), snapshot), ttl=expires_in)
+    return snapshot
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Проверяет JWT и возвращает Principal из его claims, не обращаясь к БД.
+    Для полного профиля пользователя используйте get_current_user.
+    """
+    payload = _decode_access_token(token)
+    email = payload.get("sub")
+    uid = payload.get("uid")
+    role = payload.get("role")
+    if email is None or uid is None or role is None:
+        # Токены старого формата (только email в sub) — нужно войти заново
+        raise HTTPException(status_code=401, detail="Не удалось проверить учетные данные")
+    try:
+        user_id = UUID(uid)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Некорректный токен")
+    return Principal(id=user_id, email=email, role=role)
+
+
+@auth_router.get("/cache/stats")
+async def get_principal_cache_stats(current_user: Principal = Depends(get_current_principal)):
+    """ Счётчики попаданий/промахов кэша пользователей (только админ) """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+    return principal_cache.stats()
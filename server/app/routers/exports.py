@@ -0,0 +1,136 @@
+from datetime import datetime
+from typing import Literal, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from server.app.utils.db.models import ChatMessage, Question, UserQuestion, UserTestSession
+from server.app.routers.auth import get_current_principal, Principal
+from server.app.utils.export import MEDIA_TYPES, stream_rows
+
+exports_router = APIRouter(prefix="/exports", tags=["Exports"])
+
+ExportFormat = Literal["ndjson", "csv"]
+
+
+def _export_response(statement, export_format: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_rows(statement, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'}
+    )
+
+
+def _check_admin(current_user: Principal) -> None:
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+
+
+# -----------------------------------------------------------
+# GET /exports/user-questions - ответы пользователей (только админ)
+# -----------------------------------------------------------
+@exports_router.get("/user-questions")
+async def export_user_questions(
+    format: ExportFormat = Query("ndjson", description="ndjson или csv"),
+    since: Optional[datetime] = Query(None, description="answered_at >= since"),
+    until: Optional[datetime] = Query(None, description="answered_at < until"),
+    test_id: Optional[UUID] = None,
+    user_id: Optional[UUID] = None,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Выгружает user_questions потоком: строки читаются с сервера порциями,
+    поэтому память не растёт вместе с размером таблицы.
+    """
+    _check_admin(current_user)
+
+    query = select(
+        UserQuestion.id,
+        UserQuestion.user_id,
+        UserQuestion.session_id,
+        Question.test_id,
+        UserQuestion.question_id,
+        UserQuestion.selected_answer_id,
+        UserQuestion.is_correct,
+        UserQuestion.answered_at
+    ).join(Question, Question.id == UserQuestion.question_id)
+
+    if since:
+        query = query.where(UserQuestion.answered_at >= since)
+    if until:
+        query = query.where(UserQuestion.answered_at < until)
+    if test_id:
+        query = query.where(Question.test_id == test_id)
+    if user_id:
+        query = query.where(UserQuestion.user_id == user_id)
+
+    return _export_response(query.order_by(UserQuestion.answered_at), format, "user_questions")
+
+
+# -----------------------------------------------------------
+# GET /exports/test-sessions - попытки прохождения тестов (только админ)
+# -----------------------------------------------------------
+@exports_router.get("/test-sessions")
+async def export_test_sessions(
+    format: ExportFormat = Query("ndjson", description="ndjson или csv"),
+    since: Optional[datetime] = Query(None, description="start_time >= since"),
+    until: Optional[datetime] = Query(None, description="start_time < until"),
+    test_id: Optional[UUID] = None,
+    user_id: Optional[UUID] = None,
+    current_user: Principal = Depends(get_current_principal)
+):
+    _check_admin(current_user)
+
+    query = select(
+        UserTestSession.id,
+        UserTestSession.user_id,
+        UserTestSession.test_id,
+        UserTestSession.start_time,
+        UserTestSession.end_time,
+        UserTestSession.total_time_seconds,
+        UserTestSession.is_completed
+    )
+
+    if since:
+        query = query.where(UserTestSession.start_time >= since)
+    if until:
+        query = query.where(UserTestSession.start_time < until)
+    if test_id:
+        query = query.where(UserTestSession.test_id == test_id)
+    if user_id:
+        query = query.where(UserTestSession.user_id == user_id)
+
+    return _export_response(query.order_by(UserTestSession.start_time), format, "test_sessions")
+
+
+# -----------------------------------------------------------
+# GET /exports/chat-messages - переписка с ИИ (только админ)
+# -----------------------------------------------------------
+@exports_router.get("/chat-messages")
+async def export_chat_messages(
+    format: ExportFormat = Query("ndjson", description="ndjson или csv"),
+    since: Optional[datetime] = Query(None, description="created_at >= since"),
+    until: Optional[datetime] = Query(None, description="created_at < until"),
+    user_id: Optional[UUID] = None,
+    current_user: Principal = Depends(get_current_principal)
+):
+    _check_admin(current_user)
+
+    query = select(
+        ChatMessage.id,
+        ChatMessage.user_id,
+        ChatMessage.role,
+        ChatMessage.message_text,
+        ChatMessage.created_at
+    )
+
+    if since:
+        query = query.where(ChatMessage.created_at >= since)
+    if until:
+        query = query.where(ChatMessage.created_at < until)
+    if user_id:
+        query = query.where(ChatMessage.user_id == user_id)
+
+    return _export_response(query.order_by(ChatMessage.created_at), format, "chat_messages")
@@ -1,69 +1,190 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List, Optional
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
 
+from server.app.utils.db import fulltext
 from server.app.utils.db.models import Material, UserMaterial, User
-from server.app.utils.db.setup import get_db
-from server.app.routers.auth import get_current_user
+from server.app.utils.db.setup import get_async_db, get_read_db
+from server.app.utils.conditional import conditional_response, is_conditional, make_etag, validator_headers
+from server.app.utils.pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, PageParams, paginate
+from server.app.routers.auth import get_current_principal, Principal
 from server.app.schemas.material import (
     MaterialResponse,
+    MaterialSummary,
     MaterialCreate,
     MaterialUpdate,
-    MaterialLikeRequest
+    MaterialLikeRequest,
+    MaterialSearchResult
 )
 
 materials_router = APIRouter(prefix="/materials", tags=["Materials"])
 
+# Колонки MaterialSummary: списки не читают content из БД
+SUMMARY_COLUMNS = load_only(
+    Material.id, Material.title, Material.subtitle, Material.level, Material.like_count,
+    Material.created_at, Material.updated_at
+)
+
 
 # -----------------------------------------------------------
 # 1.1. GET /materials - список материалов c фильтром
 # -----------------------------------------------------------
-@materials_router.get("/", response_model=List[MaterialResponse])
-def get_materials(
+@materials_router.get("/", response_model=List[MaterialSummary])
+async def get_materials(
+        response: Response,
         level: Optional[str] = Query(None, description="Уровень: junior/middle/senior"),
         search: Optional[str] = Query(None, description="Поисковая строка"),
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),  # если нужно авторизовать
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(get_current_principal),  # если нужно авторизовать
 ):
     """
-    Возвращает список всех материалов.
+    Возвращает страницу материалов (без текста), новые первыми.
     Опциональные параметры:
       - level: фильтрация по уровню (junior/middle/senior)
-      - search: поиск по названию/подзаголовку
+      - search: полнотекстовый поиск по названию, подзаголовку и тексту
+      - cursor/limit: пагинация, курсор следующей страницы — в заголовке X-Next-Cursor
+    Порядок — по дате; выдача по релевантности — GET /materials/search.
     """
-    query = db.query(Material)
+    query = select(Material).options(SUMMARY_COLUMNS)
 
     if level:
-        query = query.filter(Material.level == level)
+        query = query.where(Material.level == level)
 
     if search:
-        search_pattern = f"%{search}%"
-        # поиск по title или subtitle (пример)
-        query = query.filter(
-            (Material.title.ilike(search_pattern)) |
-            (Material.subtitle.ilike(search_pattern))
+        if db.get_bind().dialect.name == "postgresql":
+            query = query.where(fulltext.fts_match(search))
+        else:
+            query = query.where(fulltext.like_match(search))
+
+    return await paginate(db, query, Material, page, response)
+
+
+# -----------------------------------------------------------
+# 1.1a. GET /materials/search - поиск по релевантности
+# -----------------------------------------------------------
+@materials_router.get("/search", response_model=List[MaterialSearchResult])
+async def search_materials(
+        q: str = Query(..., min_length=1, description="Запрос: слова, \"фразы\", or, -исключения"),
+        level: Optional[str] = Query(None, description="Уровень: junior/middle/senior"),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Сколько лучших результатов вернуть"),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Лучшие совпадения по ts_rank (вес: название > подзаголовок > текст)
+    с фрагментами текста, где совпадения выделены <b>...</b>.
+    В PostgreSQL кандидаты берутся по GIN-индексу, а ts_headline считается
+    только для limit строк, поэтому время ответа не растёт вместе с числом материалов.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        # Встроенный режим: LIKE без ранжирования, новые первыми
+        query = select(Material).where(fulltext.like_match(q))
+        if level:
+            query = query.where(Material.level == level)
+        materials = (await db.execute(
+            query.order_by(Material.created_at.desc(), Material.id.desc()).limit(limit)
+        )).scalars().all()
+        return [
+            MaterialSearchResult(
+                id=material.id,
+                title=material.title,
+                subtitle=material.subtitle,
+                level=material.level,
+                created_at=material.created_at,
+                rank=0.0,
+                snippet=fulltext.plain_snippet(material.content, q)
+            )
+            for material in materials
+        ]
+
+    rank = fulltext.fts_rank(q).label("rank")
+    top = select(
+        Material.id, Material.title, Material.subtitle, Material.level,
+        Material.created_at, Material.content, rank
+    ).where(fulltext.fts_match(q))
+    if level:
+        top = top.where(Material.level == level)
+    top = top.order_by(rank.desc(), Material.id).limit(limit).subquery()
+
+    rows = (await db.execute(
+        select(
+            top.c.id, top.c.title, top.c.subtitle, top.c.level, top.c.created_at, top.c.rank,
+            fulltext.fts_headline(func.coalesce(top.c.content, top.c.subtitle, literal("")), q).label("snippet")
+        ).order_by(top.c.rank.desc(), top.c.id)
+    )).all()
+    return [
+        MaterialSearchResult(
+            id=row.id,
+            title=row.title,
+            subtitle=row.subtitle,
+            level=row.level,
+            created_at=row.created_at,
+            rank=row.rank,
+            snippet=fulltext.headline_html(row.snippet)
         )
+        for row in rows
+    ]
+
 
-    materials = query.order_by(Material.created_at.desc()).all()
-    return materials
+# -----------------------------------------------------------
+# 1.1b. GET /materials/popular - самые лайкаемые
+# -----------------------------------------------------------
+@materials_router.get("/popular", response_model=List[MaterialSummary])
+async def get_popular_materials(
+        level: Optional[str] = Query(None, description="Уровень: junior/middle/senior"),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Сколько материалов вернуть"),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Материалы по убыванию числа лайков.
+    Читается счётчик materials.like_count (индекс ix_materials_like_count_id),
+    user_materials при этом не агрегируется.
+    """
+    query = select(Material).options(SUMMARY_COLUMNS)
+    if level:
+        query = query.where(Material.level == level)
+    return (await db.execute(
+        query.order_by(Material.like_count.desc(), Material.id.desc()).limit(limit)
+    )).scalars().all()
 
 
 # -----------------------------------------------------------
 # 1.2. GET /materials/{material_id} - детальная инфа
 # -----------------------------------------------------------
 @materials_router.get("/{material_id}", response_model=MaterialResponse)
-def get_material_by_id(
+async def get_material_by_id(
         material_id: UUID,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user),  # если доступ только авторизованным
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(get_current_principal),  # если доступ только авторизованным
 ):
     """
     Возвращает детальную информацию об учебном материале по его UUID.
+    Поддерживает If-None-Match / If-Modified-Since: если валидаторы пришли, сначала
+    читается только updated_at, и при актуальной версии отдаётся 304 без загрузки content.
+    Без них материал читается одним запросом, ETag считается по загруженной строке.
     """
-    material = db.query(Material).filter(Material.id == material_id).first()
+    if is_conditional(request):
+        updated_at = (await db.execute(select(Material.updated_at).where(Material.id == material_id))).scalar()
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Материал не найден")
+        not_modified = conditional_response(request, response, make_etag(material_id, updated_at), updated_at)
+        if not_modified:
+            return not_modified
+
+    material = (await db.execute(select(Material).where(Material.id == material_id))).scalars().first()
     if not material:
         raise HTTPException(status_code=404, detail="Материал не найден")
+    response.headers.update(validator_headers(make_etag(material.id, material.updated_at), material.updated_at))
     return material
 
 
@@ -71,17 +192,17 @@ def get_material_by_id(
 # 1.3. POST /materials - создание материала (только админ)
 # -----------------------------------------------------------
 @materials_router.post("/", response_model=MaterialResponse)
-def create_material(
+async def create_material(
         material_data: MaterialCreate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     Создаёт новый материал.
     Доступно только администратору.
     """
     # Пример проверки "админа" по email
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
     new_material = Material(
@@ -91,8 +212,8 @@ def create_material(
         level=material_data.level
     )
     db.add(new_material)
-    db.commit()
-    db.refresh(new_material)
+    await db.commit()
+    await db.refresh(new_material)
 
     return new_material
 
@@ -101,20 +222,20 @@ def create_material(
 # 1.4. PUT /materials/{material_id} - обновление (только админ)
 # -----------------------------------------------------------
 @materials_router.put("/{material_id}", response_model=MaterialResponse)
-def update_material(
+async def update_material(
         material_id: UUID,
         material_data: MaterialUpdate,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     Обновляет поля (title, subtitle, content, level) у существующего материала.
     Доступно только администратору.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    material = db.query(Material).filter(Material.id == material_id).first()
+    material = (await db.execute(select(Material).where(Material.id == material_id))).scalars().first()
     if not material:
         raise HTTPException(status_code=404, detail="Материал не найден")
 
@@ -127,8 +248,8 @@ def update_material(
     if material_data.level is not None:
         material.level = material_data.level
 
-    db.commit()
-    db.refresh(material)
+    await db.commit()
+    await db.refresh(material)
     return material
 
 
@@ -136,24 +257,24 @@ def update_material(
 # 1.5. DELETE /materials/{material_id} - удаление (только админ)
 # -----------------------------------------------------------
 @materials_router.delete("/{material_id}")
-def delete_material(
+async def delete_material(
         material_id: UUID,
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     Удаляет материал по UUID.
     Доступно только администратору.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    material = db.query(Material).filter(Material.id == material_id).first()
+    material = (await db.execute(select(Material).where(Material.id == material_id))).scalars().first()
     if not material:
         raise HTTPException(status_code=404, detail="Материал не найден")
 
-    db.delete(material)
-    db.commit()
+    await db.delete(material)
+    await db.commit()
     return {"detail": "Материал удалён"}
 
 
@@ -161,63 +282,82 @@ def delete_material(
 # 1.6. POST /materials/{material_id}/like - поставить / снять лайк
 # -----------------------------------------------------------
 @materials_router.post("/{material_id}/like")
-def set_material_like(
+async def set_material_like(
         material_id: UUID,
         like_data: MaterialLikeRequest,  # { is_liked: bool }
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     Меняет поле is_liked в UserMaterial для текущего пользователя.
     Может принимать is_liked=true/false.
+    Счётчик materials.like_count меняется в той же транзакции и только если флаг
+    действительно переключился: повторный лайк его не увеличивает.
     """
-    # Проверяем, что материал существует
-    material = db.query(Material).filter(Material.id == material_id).first()
-    if not material:
+    # Первая отметка: INSERT ... ON CONFLICT DO NOTHING по uq_user_materials_user_material,
+    # из двух параллельных запросов строку вставит только один. Существование материала — внешний ключ
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    try:
+        inserted = (await db.execute(
+            insert(UserMaterial)
+            .values(user_id=current_user.id, material_id=material_id, is_liked=like_data.is_liked)
+            .on_conflict_do_nothing(index_elements=[UserMaterial.user_id, UserMaterial.material_id])
+            .returning(UserMaterial.id)
+        )).first()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Материал не найден")
 
-    # Проверяем, есть ли уже запись в user_materials
-    user_material = db.query(UserMaterial).filter(
-        UserMaterial.user_id == current_user.id,
-        UserMaterial.material_id == material_id
-    ).first()
-
-    if not user_material:
-        # если нет - создать запись
-        user_material = UserMaterial(
-            user_id=current_user.id,
-            material_id=material_id,
-            is_liked=like_data.is_liked
-        )
-        db.add(user_material)
+    if inserted:
+        # Новая строка без лайка счётчик не меняет
+        flipped = like_data.is_liked
     else:
-        # если есть - просто обновить флаг
-        user_material.is_liked = like_data.is_liked
+        # Строка уже есть: условный UPDATE меняет её, только если флаг был другим,
+        # а блокировка строки упорядочивает параллельные переключения
+        flipped = (await db.execute(
+            update(UserMaterial)
+            .where(
+                UserMaterial.user_id == current_user.id,
+                UserMaterial.material_id == material_id,
+                UserMaterial.is_liked.is_distinct_from(like_data.is_liked)
+            )
+            .values(is_liked=like_data.is_liked)
+            .execution_options(synchronize_session=False)
+        )).rowcount > 0
 
-    db.commit()
+    if flipped:
+        # updated_at не трогаем: он версия содержимого для ETag карточки
+        await db.execute(
+            update(Material)
+            .where(Material.id == material_id)
+            .values(
+                like_count=Material.like_count + (1 if like_data.is_liked else -1),
+                updated_at=Material.updated_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    await db.commit()
     return {"detail": f"Лайк установлен в состояние {like_data.is_liked}"}
 
 
 # -----------------------------------------------------------
 # 1.7. GET /users/me/materials/liked - список лайкнутых пользователем
 # -----------------------------------------------------------
-@materials_router.get("/my/liked", response_model=List[MaterialResponse])
-def get_liked_materials(
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+@materials_router.get("/my/liked", response_model=List[MaterialSummary])
+async def get_liked_materials(
+        response: Response,
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
     Возвращает все материалы, которые текущий пользователь лайкнул (is_liked = true).
+    Страница читается одним запросом: materials JOIN user_materials.
     """
-    # находим все user_materials с is_liked = True
-    user_materials = db.query(UserMaterial).filter(
+    query = select(Material).options(SUMMARY_COLUMNS).join(UserMaterial, and_(
+        UserMaterial.material_id == Material.id,
         UserMaterial.user_id == current_user.id,
         UserMaterial.is_liked == True
-    ).all()
-
-    # Вытащим из них IDs материалов
-    liked_ids = [um.material_id for um in user_materials]
-
-    # Загрузим все материалы с этими ID
-    materials = db.query(Material).filter(Material.id.in_(liked_ids)).all()
-    return materials
+    ))
+    return await paginate(db, query, Material, page, response)
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from server.app.routers.auth import get_current_principal, Principal
+from server.app.utils.db.engine import async_engine, engine, pool_stats
+from server.app.utils.db.replicas import replica_router
+
+metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+# -----------------------------------------------------------
+# GET /metrics/db-pool - состояние пула соединений (только админ)
+# -----------------------------------------------------------
+@metrics_router.get("/db-pool")
+async def get_db_pool_stats(current_user: Principal = Depends(get_current_principal)):
+    """
+    Возвращает занятые/свободные соединения, overflow, время выдачи соединения
+    (ожидание + открытие нового, отдельно — время открытия) и таймауты,
+    а также состояние реплик для чтения.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+    return {
+        "async": pool_stats(async_engine),
+        "sync": pool_stats(engine),
+        "replicas": replica_router.stats(),
+    }
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from uuid import UUID
 
-from server.app.utils.db.setup import get_db
+from server.app.utils.db.setup import get_async_db, get_read_db
+from server.app.utils.conditional import conditional_response, make_etag
+from server.app.utils.pagination import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, PageParams, paginate
+from server.app.utils.question_index import question_index
 from server.app.utils.db.models import User, Test, Question, Answer
-from server.app.routers.auth import get_current_user
+from server.app.routers.auth import get_current_principal, Principal
 from server.app.schemas.question import (
-    QuestionCreate, QuestionUpdate, QuestionResponse,
+    QuestionCreate, QuestionUpdate, QuestionResponse, QuestionSearchResult,
     AnswerCreate, AnswerUpdate, AnswerResponse
 )
 
@@ -18,22 +22,65 @@ questions_router = APIRouter(tags=["Questions and Answers"])
 # GET /tests/{test_id}/questions
 # ------------------------------------------------------------------
 @questions_router.get("/tests/{test_id}/questions", response_model=List[QuestionResponse])
-def get_questions_by_test(
+async def get_questions_by_test(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
-    Возвращает список всех вопросов, принадлежащих указанному тесту.
-    По желанию можно добавить пагинацию, фильтры, и т.д.
+    Возвращает страницу вопросов указанного теста в порядке добавления.
+    Курсор следующей страницы — в заголовке X-Next-Cursor.
+    ETag страницы строится из числа вопросов теста и их последнего updated_at:
+    при совпадении If-None-Match отдаётся 304 без загрузки вопросов.
     """
-    # Проверяем, существует ли такой тест
-    test = db.query(Test).filter(Test.id == test_id).first()
-    if not test:
+    # Существование теста и версия набора вопросов — одним запросом
+    version = (await db.execute(
+        select(func.count(Question.id).label("count"), func.max(Question.updated_at).label("updated_at"))
+        .select_from(Test)
+        .outerjoin(Question, Question.test_id == Test.id)
+        .where(Test.id == test_id, Test.deleted_at.is_(None))
+        .group_by(Test.id)
+    )).first()
+    if version is None:
         raise HTTPException(status_code=404, detail="Тест не найден")
+    # Удаление не сдвигает max(updated_at), поэтому Last-Modified для коллекции не отдаём
+    etag = make_etag(test_id, version.count, version.updated_at, page.cursor, page.limit)
+    not_modified = conditional_response(request, response, etag)
+    if not_modified:
+        return not_modified
+
+    query = select(Question).where(Question.test_id == test_id)
+    return await paginate(db, query, Question, page, response, descending=False)
+
 
-    questions = db.query(Question).filter(Question.test_id == test_id).all()
-    return questions
+# ------------------------------------------------------------------
+# 4.1.1. Нечёткий поиск по банку вопросов
+# GET /questions/search
+# ------------------------------------------------------------------
+@questions_router.get("/questions/search", response_model=List[QuestionSearchResult])
+async def search_questions(
+    q: str = Query(..., min_length=1, description="Текст для поиска в вопросах, темах и вариантах ответов"),
+    test_id: Optional[UUID] = Query(None, description="Искать только в этом тесте"),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Ищет вопросы по триграммам (находит части слов и слова с опечатками).
+    Отвечает из индекса в памяти процесса, без запросов к БД.
+    """
+    return [
+        QuestionSearchResult(
+            id=match.question.id,
+            test_id=match.question.test_id,
+            topic=match.question.topic,
+            question_text=match.question.question_text,
+            score=match.score
+        )
+        for match in question_index.search(q, limit=limit, test_id=test_id)
+    ]
 
 
 # ------------------------------------------------------------------
@@ -41,16 +88,16 @@ def get_questions_by_test(
 # GET /questions/{question_id}
 # ------------------------------------------------------------------
 @questions_router.get("/questions/{question_id}", response_model=QuestionResponse)
-def get_question_by_id(
+async def get_question_by_id(
     question_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Возвращает детальную информацию о вопросе по его UUID.
     Можно дополнительно отдавать список ответов (через другую схему).
     """
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = (await db.execute(select(Question).where(Question.id == question_id))).scalars().first()
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
     return question
@@ -61,19 +108,19 @@ def get_question_by_id(
 # POST /tests/{test_id}/questions
 # ------------------------------------------------------------------
 @questions_router.post("/tests/{test_id}/questions", response_model=QuestionResponse)
-def create_question_for_test(
+async def create_question_for_test(
     test_id: UUID,
     question_data: QuestionCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Создаёт новый вопрос внутри указанного теста (только админ).
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    test = db.query(Test).filter(Test.id == test_id).first()
+    test = (await db.execute(select(Test).where(Test.id == test_id, Test.deleted_at.is_(None)))).scalars().first()
     if not test:
         raise HTTPException(status_code=404, detail="Тест не найден")
 
@@ -84,8 +131,9 @@ def create_question_for_test(
         explanation=question_data.explanation
     )
     db.add(new_question)
-    db.commit()
-    db.refresh(new_question)
+    await db.commit()
+    await db.refresh(new_question)
+    question_index.upsert_question(new_question.id, new_question.test_id, new_question.topic, new_question.question_text)
     return new_question
 
 
@@ -94,20 +142,20 @@ def create_question_for_test(
 # PUT /questions/{question_id}
 # ------------------------------------------------------------------
 @questions_router.put("/questions/{question_id}", response_model=QuestionResponse)
-def update_question(
+async def update_question(
     question_id: UUID,
     question_data: QuestionUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Обновляет поля (topic, question_text, explanation) у существующего вопроса.
     Только админ.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = (await db.execute(select(Question).where(Question.id == question_id))).scalars().first()
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
 
@@ -118,8 +166,9 @@ def update_question(
     if question_data.explanation is not None:
         question.explanation = question_data.explanation
 
-    db.commit()
-    db.refresh(question)
+    await db.commit()
+    await db.refresh(question)
+    question_index.upsert_question(question.id, question.test_id, question.topic, question.question_text)
     return question
 
 
@@ -128,23 +177,24 @@ def update_question(
 # DELETE /questions/{question_id}
 # ------------------------------------------------------------------
 @questions_router.delete("/questions/{question_id}")
-def delete_question(
+async def delete_question(
     question_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Удаляет вопрос по UUID (только админ).
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = (await db.execute(select(Question).where(Question.id == question_id))).scalars().first()
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
 
-    db.delete(question)
-    db.commit()
+    await db.delete(question)
+    await db.commit()
+    question_index.remove_question(question_id)
     return {"detail": "Вопрос удалён"}
 
 
@@ -153,20 +203,32 @@ def delete_question(
 #      Получение всех ответов для вопроса
 # ------------------------------------------------------------------
 @questions_router.get("/questions/{question_id}/answers", response_model=List[AnswerResponse])
-def get_answers_for_question(
+async def get_answers_for_question(
     question_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Возвращает все варианты ответов, которые принадлежат указанному вопросу.
+    Поддерживает If-None-Match так же, как GET /tests/{test_id}/questions.
     """
-    # Проверяем, что вопрос существует
-    question = db.query(Question).filter(Question.id == question_id).first()
-    if not question:
+    # Существование вопроса и версия набора ответов — одним запросом
+    version = (await db.execute(
+        select(func.count(Answer.id).label("count"), func.max(Answer.updated_at).label("updated_at"))
+        .select_from(Question)
+        .outerjoin(Answer, Answer.question_id == Question.id)
+        .where(Question.id == question_id)
+        .group_by(Question.id)
+    )).first()
+    if version is None:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
+    not_modified = conditional_response(request, response, make_etag(question_id, version.count, version.updated_at))
+    if not_modified:
+        return not_modified
 
-    answers = db.query(Answer).filter(Answer.question_id == question_id).all()
+    answers = (await db.execute(select(Answer).where(Answer.question_id == question_id))).scalars().all()
     return answers
 
 
@@ -175,20 +237,20 @@ def get_answers_for_question(
 #      Создание нового варианта ответа
 # ------------------------------------------------------------------
 @questions_router.post("/questions/{question_id}/answers", response_model=AnswerResponse)
-def create_answer_for_question(
+async def create_answer_for_question(
     question_id: UUID,
     answer_data: AnswerCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Создаёт новый вариант ответа в конкретном вопросе (только админ).
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
     # Проверяем, что вопрос существует
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = (await db.execute(select(Question).where(Question.id == question_id))).scalars().first()
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
 
@@ -198,8 +260,9 @@ def create_answer_for_question(
         is_correct=answer_data.is_correct
     )
     db.add(new_answer)
-    db.commit()
-    db.refresh(new_answer)
+    await db.commit()
+    await db.refresh(new_answer)
+    question_index.set_answer(new_answer.question_id, new_answer.id, new_answer.text)
     return new_answer
 
 
@@ -208,20 +271,20 @@ def create_answer_for_question(
 #      Обновление варианта ответа
 # ------------------------------------------------------------------
 @questions_router.put("/answers/{answer_id}", response_model=AnswerResponse)
-def update_answer(
+async def update_answer(
     answer_id: UUID,
     answer_data: AnswerUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Обновляет текст или флаг is_correct у конкретного варианта ответа.
     Только админ.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    answer = db.query(Answer).filter(Answer.id == answer_id).first()
+    answer = (await db.execute(select(Answer).where(Answer.id == answer_id))).scalars().first()
     if not answer:
         raise HTTPException(status_code=404, detail="Ответ не найден")
 
@@ -230,8 +293,9 @@ def update_answer(
     if answer_data.is_correct is not None:
         answer.is_correct = answer_data.is_correct
 
-    db.commit()
-    db.refresh(answer)
+    await db.commit()
+    await db.refresh(answer)
+    question_index.set_answer(answer.question_id, answer.id, answer.text)
     return answer
 
 
@@ -240,21 +304,22 @@ def update_answer(
 #      Удаление варианта ответа
 # ------------------------------------------------------------------
 @questions_router.delete("/answers/{answer_id}")
-def delete_answer(
+async def delete_answer(
     answer_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Удаляет конкретный вариант ответа (только админ).
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    answer = db.query(Answer).filter(Answer.id == answer_id).first()
+    answer = (await db.execute(select(Answer).where(Answer.id == answer_id))).scalars().first()
     if not answer:
         raise HTTPException(status_code=404, detail="Ответ не найден")
 
-    db.delete(answer)
-    db.commit()
+    await db.delete(answer)
+    await db.commit()
+    question_index.remove_answer(answer.question_id, answer_id)
     return {"detail": "Вариант ответа удалён"}
@@ -1,14 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import DateTime, Uuid, false, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 from datetime import datetime, timezone
+from typing import List, Optional
 from sqlalchemy import func
 
-from server.app.utils.db.setup import get_db
+from server.app.utils.db.setup import get_async_db, get_read_db
 from server.app.utils.db.models import (
     User, Test, Question, Answer, UserTestSession, UserQuestion
 )
-from server.app.routers.auth import get_current_user
+from server.app.routers.auth import get_current_principal, Principal
 
 from server.app.schemas.test_session import (
     StartTestResponse,
@@ -16,54 +21,107 @@ from server.app.schemas.test_session import (
     AnswerQuestionResponse,
     FinishTestResponse,
     MyTestStatsResponse,
-    TestStatsResponse
+    TestStatsResponse,
+    SessionAnswerResponse
 )
 
 sessions_router = APIRouter(tags=["Test Sessions"])
 
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite возвращает время без tzinfo, хотя хранит его в UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+# Внешние ключи user_test_sessions (имена из миграции 9d4b7f2a6c13)
+SESSION_USER_FK = "user_test_sessions_user_id_fkey"
+SESSION_TEST_FK = "user_test_sessions_test_id_fkey"
+
+
+def _violated_constraint(exc: IntegrityError) -> Optional[str]:
+    """ Имя нарушенного ограничения: asyncpg кладёт его в исходное исключение, psycopg — в diag """
+    for source in (exc.orig.__cause__, getattr(exc.orig, "diag", None), exc.orig):
+        name = getattr(source, "constraint_name", None)
+        if name:
+            return name
+    return None
+
+
+async def _missing_session_reference(db: AsyncSession, user_id: UUID, test_id: UUID) -> Optional[str]:
+    """ SQLite не называет нарушенный внешний ключ — смотрим, какой из строк не стало """
+    if (await db.execute(select(User.id).where(User.id == user_id))).scalar() is None:
+        return SESSION_USER_FK
+    if (await db.execute(select(Test.id).where(Test.id == test_id))).scalar() is None:
+        return SESSION_TEST_FK
+    return None
+
+
 # -------------------------------------------------------------
 # 5.1. Начало прохождения теста
 # POST /tests/{test_id}/start
 # -------------------------------------------------------------
 @sessions_router.post("/tests/{test_id}/start", response_model=StartTestResponse)
-def start_test(
+async def start_test(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    resume: bool = Query(False, description="Вернуть уже открытую попытку вместо ошибки 400"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Создаёт запись в UserTestSession для текущего пользователя, ставит start_time.
     Возвращает ID этой сессии (session_id) и время старта.
+
+    Один INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING: открытую попытку охраняет
+    уникальный частичный индекс, строка вставляется, только если тест есть и не удалён.
     """
-    # Проверяем, существует ли тест
-    test = db.query(Test).filter(Test.id == test_id).first()
-    if not test:
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    live_test = select(
+        literal(current_user.id, Uuid), Test.id, literal(datetime.now(timezone.utc), DateTime(timezone=True)), false()
+    ).where(Test.id == test_id, Test.deleted_at.is_(None))
+    statement = (
+        insert(UserTestSession)
+        .from_select(["user_id", "test_id", "start_time", "is_completed"], live_test)
+        .on_conflict_do_nothing(
+            index_elements=[UserTestSession.user_id, UserTestSession.test_id],
+            index_where=UserTestSession.is_completed == false()
+        )
+        .returning(UserTestSession.id, UserTestSession.start_time)
+    )
+    try:
+        created = (await db.execute(statement)).first()
+        await db.commit()
+    except IntegrityError as exc:
+        # Конфликт по открытой попытке гасит ON CONFLICT — остаются внешние ключи: тест удалили
+        # между SELECT и INSERT, либо удалили пользователя, чей токен ещё действует
+        await db.rollback()
+        constraint = _violated_constraint(exc)
+        if constraint is None and "FOREIGN KEY" in str(exc.orig):
+            constraint = await _missing_session_reference(db, current_user.id, test_id)
+        if constraint == SESSION_TEST_FK:
+            raise HTTPException(status_code=404, detail="Тест не найден")
+        if constraint == SESSION_USER_FK:
+            raise HTTPException(status_code=401, detail="Пользователь не найден")
+        raise
+
+    if created:
+        return StartTestResponse(session_id=created.id, start_time=created.start_time)
+
+    # Ничего не вставлено: либо уже есть открытая попытка, либо теста нет
+    if not (await db.execute(select(Test.id).where(Test.id == test_id, Test.deleted_at.is_(None)))).scalar():
         raise HTTPException(status_code=404, detail="Тест не найден")
 
-    # Проверим, нет ли уже незавершённой сессии
-    existing_session = db.query(UserTestSession).filter(
+    if not resume:
+        raise HTTPException(status_code=400, detail="У вас уже есть незавершённый тест")
+
+    existing = (await db.execute(select(UserTestSession.id, UserTestSession.start_time).where(
         UserTestSession.user_id == current_user.id,
         UserTestSession.test_id == test_id,
         UserTestSession.is_completed == False
-    ).first()
-    if existing_session:
-        # Если вы хотите запрещать параллельные сессии, можно вернуть 400
-        raise HTTPException(status_code=400, detail="У вас уже есть незавершённый тест")
-
-    new_session = UserTestSession(
-        user_id=current_user.id,
-        test_id=test_id,
-        start_time=datetime.now(timezone.utc),
-        is_completed=False
-    )
-    db.add(new_session)
-    db.commit()
-    db.refresh(new_session)
-
-    return StartTestResponse(
-        session_id=new_session.id,
-        start_time=new_session.start_time
-    )
+    ))).first()
+    if not existing:
+        # Попытку успели завершить между INSERT и SELECT
+        raise HTTPException(status_code=409, detail="Попытка уже завершена, начните тест заново")
+    return StartTestResponse(session_id=existing.id, start_time=existing.start_time, resumed=True)
 
 
 # -------------------------------------------------------------
@@ -71,63 +129,78 @@ def start_test(
 # POST /tests/{test_id}/questions/{question_id}/answer
 # -------------------------------------------------------------
 @sessions_router.post("/tests/{test_id}/questions/{question_id}/answer", response_model=AnswerQuestionResponse)
-def answer_question(
+async def answer_question(
     test_id: UUID,
     question_id: UUID,
     answer_req: AnswerQuestionRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Сохраняет ответ пользователя на вопрос.
     - selected_answer_id: UUID
     - Опционально сразу проверяет правильность ответа.
     """
-    # Проверяем, есть ли незавершённая сессия у пользователя для этого теста
-    session = db.query(UserTestSession).filter(
+    # Проверяем, есть ли незавершённая сессия у пользователя для этого теста.
+    # FOR UPDATE упорядочивает ответы одной попытки между собой и с finish_test:
+    # старое значение ответа читается уже под блокировкой, и счётчики не расходятся
+    session = (await db.execute(select(UserTestSession).where(
         UserTestSession.user_id == current_user.id,
         UserTestSession.test_id == test_id,
         UserTestSession.is_completed == False
-    ).first()
+    ).with_for_update())).scalars().first()
     if not session:
         raise HTTPException(status_code=400, detail="Нет активной сессии для этого теста")
 
     # Проверяем, что question_id действительно относится к этому тесту
-    question = db.query(Question).filter(Question.id == question_id, Question.test_id == test_id).first()
+    question = (await db.execute(select(Question).where(Question.id == question_id, Question.test_id == test_id))).scalars().first()
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден в этом тесте")
 
     # Проверяем, что selected_answer_id действительно принадлежит этому вопросу
-    answer = db.query(Answer).filter(Answer.id == answer_req.selected_answer_id, Answer.question_id == question_id).first()
+    answer = (await db.execute(select(Answer).where(Answer.id == answer_req.selected_answer_id, Answer.question_id == question_id))).scalars().first()
     if not answer:
         raise HTTPException(status_code=404, detail="Ответ не найден или не соответствует вопросу")
 
     # Определяем, верен ли ответ
     is_correct = answer.is_correct
 
-    # Проверяем, отвечал ли пользователь уже на этот вопрос (можно разрешить перезапись)
-    user_question = db.query(UserQuestion).filter(
-        UserQuestion.user_id == current_user.id,
+    # Проверяем, отвечал ли пользователь уже на этот вопрос в этой попытке (ответ можно изменить)
+    user_question = (await db.execute(select(UserQuestion).where(
+        UserQuestion.session_id == session.id,
         UserQuestion.question_id == question_id
-    ).first()
+    ))).scalars().first()
 
     if not user_question:
         # Создаём запись
+        answered_delta, correct_delta = 1, int(is_correct)
         user_question = UserQuestion(
             user_id=current_user.id,
             question_id=question_id,
+            session_id=session.id,
             selected_answer_id=answer.id,
             is_correct=is_correct
         )
         db.add(user_question)
     else:
-        # Обновляем запись (если вы хотите разрешить менять ответ)
+        # Обновляем запись: число ответов не меняется, меняется только их верность
+        answered_delta, correct_delta = 0, int(is_correct) - int(bool(user_question.is_correct))
         user_question.selected_answer_id = answer.id
         user_question.is_correct = is_correct
         user_question.answered_at = datetime.now(timezone.utc)
 
-    db.commit()
-    db.refresh(user_question)
+    # Инкремент на стороне БД; дельта посчитана под блокировкой строки попытки
+    await db.execute(
+        update(UserTestSession)
+        .where(UserTestSession.id == session.id)
+        .values(
+            answered_count=UserTestSession.answered_count + answered_delta,
+            correct_count=UserTestSession.correct_count + correct_delta,
+            wrong_count=UserTestSession.wrong_count + (answered_delta - correct_delta)
+        )
+    )
+    await db.commit()
+    await db.refresh(user_question)
 
     return AnswerQuestionResponse(
         user_question_id=user_question.id,
@@ -141,53 +214,39 @@ def answer_question(
 # POST /tests/{test_id}/finish
 # -------------------------------------------------------------
 @sessions_router.post("/tests/{test_id}/finish", response_model=FinishTestResponse)
-def finish_test(
+async def finish_test(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Устанавливает end_time и total_time_seconds в UserTestSession.
     Ставит is_completed = true.
-    Возвращает статистику: кол-во правильных и неправильных ответов.
+    Возвращает статистику: кол-во правильных и неправильных ответов (счётчики сессии).
     """
-    session = db.query(UserTestSession).filter(
+    # Та же блокировка, что в answer_question: завершение ждёт ответы, которые уже в работе
+    session = (await db.execute(select(UserTestSession).where(
         UserTestSession.user_id == current_user.id,
         UserTestSession.test_id == test_id,
         UserTestSession.is_completed == False
-    ).first()
+    ).with_for_update())).scalars().first()
     if not session:
         raise HTTPException(status_code=400, detail="Нет активной сессии или тест уже завершён")
 
     # Ставим end_time, считаем total_time
     end_time = datetime.now(timezone.utc)
-    start_time = session.start_time
-    if start_time.tzinfo is None:
-        start_time = start_time.replace(tzinfo=timezone.utc)
-
-    time_spent = int((end_time - start_time).total_seconds())
+    time_spent = int((end_time - _as_utc(session.start_time)).total_seconds())
     session.end_time = end_time
     session.total_time_seconds = time_spent
     session.is_completed = True
-    db.commit()
-
-    # Считаем кол-во правильных/неправильных ответов
-    user_questions = db.query(UserQuestion).filter(
-        UserQuestion.user_id == current_user.id,
-        UserQuestion.question_id.in_(
-            db.query(Question.id).filter(Question.test_id == test_id)
-        )
-    ).all()
-
-    correct_answers_count = sum(1 for uq in user_questions if uq.is_correct)
-    wrong_answers_count = len(user_questions) - correct_answers_count
+    await db.commit()
 
     return FinishTestResponse(
         session_id=session.id,
         end_time=end_time,
         total_time_seconds=time_spent,
-        correct_answers_count=correct_answers_count,
-        wrong_answers_count=wrong_answers_count
+        correct_answers_count=session.correct_count,
+        wrong_answers_count=session.wrong_count
     )
 
 
@@ -196,10 +255,10 @@ def finish_test(
 # GET /tests/{test_id}/stats/me
 # -------------------------------------------------------------
 @sessions_router.get("/tests/{test_id}/stats/me", response_model=MyTestStatsResponse)
-def get_my_test_stats(
+async def get_my_test_stats(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Возвращает для текущего пользователя:
@@ -207,10 +266,12 @@ def get_my_test_stats(
     - total_time_seconds,
     - кол-во правильных и неправильных ответов
     """
-    session = db.query(UserTestSession).filter(
-        UserTestSession.user_id == current_user.id,
-        UserTestSession.test_id == test_id
-    ).order_by(UserTestSession.start_time.desc()).first()
+    session = (await db.execute(
+        select(UserTestSession).where(
+            UserTestSession.user_id == current_user.id,
+            UserTestSession.test_id == test_id
+        ).order_by(UserTestSession.start_time.desc())
+    )).scalars().first()
 
     if not session:
         # Пользователь ещё не проходил тест
@@ -221,22 +282,11 @@ def get_my_test_stats(
             wrong_answers_count=0
         )
 
-    # Считаем ответы
-    user_questions = db.query(UserQuestion).filter(
-        UserQuestion.user_id == current_user.id,
-        UserQuestion.question_id.in_(
-            db.query(Question.id).filter(Question.test_id == test_id)
-        )
-    ).all()
-
-    correct_answers_count = sum(1 for uq in user_questions if uq.is_correct)
-    wrong_answers_count = len(user_questions) - correct_answers_count
-
     return MyTestStatsResponse(
         is_completed=session.is_completed,
         total_time_seconds=session.total_time_seconds,
-        correct_answers_count=correct_answers_count,
-        wrong_answers_count=wrong_answers_count
+        correct_answers_count=session.correct_count,
+        wrong_answers_count=session.wrong_count
     )
 
 
@@ -245,25 +295,33 @@ def get_my_test_stats(
 # GET /tests/{test_id}/stats
 # -------------------------------------------------------------
 @sessions_router.get("/tests/{test_id}/stats", response_model=TestStatsResponse)
-def get_test_stats(
+async def get_test_stats(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
-    Общая статистика по всем пользователям:
-      - total_users_attempted
-      - avg_correct_answers
-      - avg_wrong_answers
-      - avg_time_seconds
+    Общая статистика по завершённым попыткам:
+      - total_users_attempted — число разных пользователей
+      - avg_correct_answers, avg_wrong_answers, avg_time_seconds — средние на попытку
+        (пересдачи учитываются каждая отдельно и в числителе, и в знаменателе)
     """
     # Проверка на роль админа
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    # Все сессии для данного теста
-    sessions = db.query(UserTestSession).filter(UserTestSession.test_id == test_id, UserTestSession.is_completed == True).all()
-    if not sessions:
+    # Агрегат по счётчикам завершённых сессий — одной строкой, без загрузки ответов
+    stats = (await db.execute(
+        select(
+            func.count(func.distinct(UserTestSession.user_id)).label("users"),
+            func.count(UserTestSession.id).label("attempts"),
+            func.coalesce(func.sum(UserTestSession.correct_count), 0).label("correct"),
+            func.coalesce(func.sum(UserTestSession.wrong_count), 0).label("wrong"),
+            func.avg(UserTestSession.total_time_seconds).label("avg_time")
+        ).where(UserTestSession.test_id == test_id, UserTestSession.is_completed == True)
+    )).one()
+
+    if not stats.users:
         # Если никто не проходил тест, то статистики нет
         return TestStatsResponse(
             total_users_attempted=0,
@@ -272,45 +330,50 @@ def get_test_stats(
             avg_time_seconds=0
         )
 
-    user_ids = [s.user_id for s in sessions]
-
-    # Собираем все ответы (UserQuestion), относящиеся к этому тесту для указанных пользователей
-    user_questions = db.query(UserQuestion).filter(
-        UserQuestion.user_id.in_(user_ids),
-        UserQuestion.question_id.in_(
-            db.query(Question.id).filter(Question.test_id == test_id)
-        )
-    ).all()
-
-    # Подсчитаем correct/total по каждому пользователю
-    # либо считаем в лоб, если пользователей немного:
-    # correct = кол-во user_questions где is_correct == True
-    correct_count = sum(1 for uq in user_questions if uq.is_correct)
-    total_answers = len(user_questions)
-    wrong_count = total_answers - correct_count
-
-    total_users_attempted = len(set(user_ids))
-
-    # среднее количество правильных ответов на пользователя
-    # для корректного расчёта можно сгруппировать по user_id,
-    # но для упрощения возьмём "суммарные correct / кол-во пользователей"
-    avg_correct_answers = 0.0
-    avg_wrong_answers = 0.0
-
-    if total_users_attempted > 0:
-        avg_correct_answers = correct_count / total_users_attempted
-        avg_wrong_answers = wrong_count / total_users_attempted
-
-    # среднее время прохождения
-    times = [s.total_time_seconds for s in sessions if s.total_time_seconds is not None]
-    if times:
-        avg_time_seconds = sum(times) / len(times)
-    else:
-        avg_time_seconds = 0.0
-
     return TestStatsResponse(
-        total_users_attempted=total_users_attempted,
-        avg_correct_answers=round(avg_correct_answers, 2),
-        avg_wrong_answers=round(avg_wrong_answers, 2),
-        avg_time_seconds=round(avg_time_seconds, 2)
+        total_users_attempted=stats.users,
+        avg_correct_answers=round(stats.correct / stats.attempts, 2),
+        avg_wrong_answers=round(stats.wrong / stats.attempts, 2),
+        avg_time_seconds=round(float(stats.avg_time or 0), 2)
     )
+
+
+# -------------------------------------------------------------
+# 5.6. Ответы одной попытки (разбор)
+# GET /sessions/{session_id}/answers
+# -------------------------------------------------------------
+@sessions_router.get("/sessions/{session_id}/answers", response_model=List[SessionAnswerResponse])
+async def get_session_answers(
+    session_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Возвращает ответы, данные в попытке, в порядке вопросов теста
+    (как в GET /tests/{test_id}/questions). Время ответа для порядка не годится:
+    при смене ответа answered_at обновляется.
+    Доступно владельцу попытки и администратору.
+    """
+    owner_id = (await db.execute(
+        select(UserTestSession.user_id).where(UserTestSession.id == session_id)
+    )).scalar()
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Сессия не найдена")
+    if owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+
+    answers = (await db.execute(
+        select(UserQuestion)
+        .join(Question, Question.id == UserQuestion.question_id)
+        .where(UserQuestion.session_id == session_id)
+        .order_by(Question.created_at, Question.id)
+    )).scalars().all()
+    return [
+        SessionAnswerResponse(
+            question_id=answer.question_id,
+            selected_answer_id=answer.selected_answer_id,
+            is_correct=bool(answer.is_correct),
+            answered_at=answer.answered_at
+        )
+        for answer in answers
+    ]
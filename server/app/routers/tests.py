@@ -1,58 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+import uuid
+from datetime import timedelta
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from typing import List, Optional, Union
 from uuid import UUID
 
-from server.app.utils.db.models import Test, User
-from server.app.utils.db.setup import get_db
-from server.app.routers.auth import get_current_user
-from server.app.schemas.test import TestCreate, TestUpdate, TestResponse
+from server.app.utils.db.models import Answer, Question, Test, User, utcnow
+from server.app.utils.db.setup import get_async_db, get_read_db
+from server.app.utils.db.purge import purge_test
+from server.app.utils.question_index import question_index
+from server.app.utils.conditional import conditional_response, is_conditional, make_etag, validator_headers
+from server.app.utils.pagination import PageParams, paginate
+from server.app.routers.auth import get_current_principal, Principal
+from server.app.schemas.test import (
+    TestCreate, TestUpdate, TestResponse, TestSummary, TestImport, TestImportResponse, QuestionImportList
+)
 
 tests_router = APIRouter(prefix="/tests", tags=["Tests"])
 
 # -----------------------------------------------------------
 # 3.1. GET /tests - список тестов (с опциональным поиском)
 # -----------------------------------------------------------
-@tests_router.get("/", response_model=List[TestResponse])
-def get_tests(
+@tests_router.get("/", response_model=List[TestSummary])
+async def get_tests(
+    response: Response,
     search: Optional[str] = Query(None, description="Поиск в названии/описании"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """
-    Возвращает список всех тестов.
+    Возвращает страницу тестов (без описания), новые первыми.
     Опционально можно делать поиск (search) по title или description.
+    Курсор следующей страницы — в заголовке X-Next-Cursor.
     """
-    query = db.query(Test)
+    # description участвует только в фильтре и в SELECT не попадает
+    query = select(Test).options(load_only(Test.id, Test.title, Test.created_at, Test.updated_at)).where(
+        Test.deleted_at.is_(None)
+    )
 
     if search:
         pattern = f"%{search}%"
-        query = query.filter(
+        query = query.where(
             (Test.title.ilike(pattern)) |
             (Test.description.ilike(pattern))
         )
 
-    tests = query.order_by(Test.created_at.desc()).all()
-    return tests
+    return await paginate(db, query, Test, page, response)
 
 
 # -----------------------------------------------------------
 # 3.2. GET /tests/{test_id} - детальная информация
 # -----------------------------------------------------------
 @tests_router.get("/{test_id}", response_model=TestResponse)
-def get_test_by_id(
+async def get_test_by_id(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """
     Возвращает детальную информацию о тесте по его UUID.
     При желании можно включить список вопросов.
+    Поддерживает условный GET (ETag / Last-Modified) — см. GET /materials/{material_id}.
     """
-    test = db.query(Test).filter(Test.id == test_id).first()
+    if is_conditional(request):
+        updated_at = (await db.execute(
+            select(Test.updated_at).where(Test.id == test_id, Test.deleted_at.is_(None))
+        )).scalar()
+        if updated_at is None:
+            raise HTTPException(status_code=404, detail="Тест не найден")
+        not_modified = conditional_response(request, response, make_etag(test_id, updated_at), updated_at)
+        if not_modified:
+            return not_modified
+
+    test = (await db.execute(select(Test).where(Test.id == test_id, Test.deleted_at.is_(None)))).scalars().first()
     if not test:
         raise HTTPException(status_code=404, detail="Тест не найден")
 
+    response.headers.update(validator_headers(make_etag(test.id, test.updated_at), test.updated_at))
     return test
 
 
@@ -60,16 +89,16 @@ def get_test_by_id(
 # 3.3. POST /tests - создание теста (только админ)
 # -----------------------------------------------------------
 @tests_router.post("/", response_model=TestResponse)
-def create_test(
+async def create_test(
     test_data: TestCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Создаёт новый тест.
     Доступно только администратору.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
     new_test = Test(
@@ -77,8 +106,8 @@ def create_test(
         description=test_data.description
     )
     db.add(new_test)
-    db.commit()
-    db.refresh(new_test)
+    await db.commit()
+    await db.refresh(new_test)
     return new_test
 
 
@@ -86,20 +115,20 @@ def create_test(
 # 3.4. PUT /tests/{test_id} - обновление (только админ)
 # -----------------------------------------------------------
 @tests_router.put("/{test_id}", response_model=TestResponse)
-def update_test(
+async def update_test(
     test_id: UUID,
     test_data: TestUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Обновляет поля (title, description) у существующего теста.
     Доступно только администратору.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    test = db.query(Test).filter(Test.id == test_id).first()
+    test = (await db.execute(select(Test).where(Test.id == test_id, Test.deleted_at.is_(None)))).scalars().first()
     if not test:
         raise HTTPException(status_code=404, detail="Тест не найден")
 
@@ -108,8 +137,8 @@ def update_test(
     if test_data.description is not None:
         test.description = test_data.description
 
-    db.commit()
-    db.refresh(test)
+    await db.commit()
+    await db.refresh(test)
     return test
 
 
@@ -117,22 +146,113 @@ def update_test(
 # 3.5. DELETE /tests/{test_id} - удаление (только админ)
 # -----------------------------------------------------------
 @tests_router.delete("/{test_id}")
-def delete_test(
+async def delete_test(
     test_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
-    Удаляет тест по UUID.
+    Удаляет тест по UUID вместе с вопросами, ответами и попытками прохождения.
+    Тест помечается удалённым в этой же транзакции и сразу пропадает из API;
+    строки удаляются порциями в фоне, после отправки ответа. Если процесс перезапустится
+    раньше, удаление продолжит resume_test_purges при старте.
     Доступно только администратору.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещён")
 
-    test = db.query(Test).filter(Test.id == test_id).first()
-    if not test:
+    marked = await db.execute(
+        update(Test)
+        .where(Test.id == test_id, Test.deleted_at.is_(None))
+        .values(deleted_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if not marked.rowcount:
         raise HTTPException(status_code=404, detail="Тест не найден")
+    await db.commit()
 
-    db.delete(test)
-    db.commit()
+    background_tasks.add_task(purge_test, test_id)
+    question_index.remove_test(test_id)
     return {"detail": "Тест удалён"}
+
+
+# -----------------------------------------------------------
+# 3.6. POST /tests/import - тест с вопросами и ответами одним запросом (только админ)
+# -----------------------------------------------------------
+@tests_router.post("/import", response_model=TestImportResponse)
+async def import_test(
+    document: Union[TestImport, QuestionImportList],
+    title: Optional[str] = Query(None, description="Название, если передан только список вопросов"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Создаёт тест вместе со всеми вопросами и вариантами ответов в одной транзакции.
+    Принимает либо {"title", "description", "questions": [...]},
+    либо массив вопросов в формате /ai/generate-test (questionText, answers[].isCorrect).
+    Доступно только администратору.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Доступ запрещён")
+
+    if isinstance(document, list):
+        document = TestImport(
+            title=title or document[0].topic or "Импортированный тест",
+            questions=document
+        )
+
+    # id генерируем заранее, чтобы вставить каждую таблицу одним executemany без RETURNING
+    now = utcnow()
+    test_id = uuid.uuid4()
+    question_rows, answer_rows = [], []
+    for index, question in enumerate(document.questions):
+        question_id = uuid.uuid4()
+        # Вопросы выдаются по (created_at, id) — сдвиг на микросекунды сохраняет порядок документа
+        question_created_at = now + timedelta(microseconds=index)
+        question_rows.append({
+            "id": question_id,
+            "test_id": test_id,
+            "topic": question.topic,
+            "question_text": question.question_text,
+            "explanation": question.explanation,
+            "created_at": question_created_at,
+            "updated_at": question_created_at,
+        })
+        answer_rows.extend(
+            {
+                "id": uuid.uuid4(),
+                "question_id": question_id,
+                "text": answer.text,
+                "is_correct": answer.is_correct,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for answer in question.answers
+        )
+
+    await db.execute(insert(Test).values(
+        id=test_id,
+        title=document.title,
+        description=document.description,
+        created_at=now,
+        updated_at=now
+    ))
+    await db.execute(insert(Question), question_rows)
+    await db.execute(insert(Answer), answer_rows)
+    await db.commit()
+
+    for row in question_rows:
+        question_index.upsert_question(row["id"], test_id, row["topic"], row["question_text"])
+    for row in answer_rows:
+        question_index.set_answer(row["question_id"], row["id"], row["text"])
+
+    return TestImportResponse(
+        id=test_id,
+        title=document.title,
+        description=document.description,
+        created_at=now,
+        updated_at=now,
+        questions_count=len(question_rows),
+        answers_count=len(answer_rows)
+    )
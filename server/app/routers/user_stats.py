@@ -1,26 +1,27 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import case, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from typing import Dict
 from datetime import datetime, timezone
 
-from server.app.utils.db.setup import get_db
+from server.app.utils.db.setup import get_read_db
 from server.app.utils.db.models import (
     User, UserTestSession, UserQuestion, Question
 )
-from server.app.routers.auth import get_current_user
+from server.app.routers.auth import get_current_principal, Principal
 from server.app.schemas.user_stat import (
     UserTestsStatsResponse,
     UserQuestionsStatsResponse,
     TopicStats
 )
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from server.app.utils.db.setup import get_db
-from server.app.utils.db.models import User, UserTestSession, UserQuestion
-from server.app.routers.auth import get_current_user
+from server.app.utils.db.setup import get_read_db
+from server.app.utils.db.models import User, UserTestSession, UserQuestion, Question
+from server.app.routers.auth import get_current_principal, Principal
 from server.app.schemas.user_stat import TestSessionEntry, UserStatsForLeaderboard
 
 user_stats_router = APIRouter(tags=["User Stats"])
@@ -31,9 +32,9 @@ user_stats_router = APIRouter(tags=["User Stats"])
 # GET /users/me/tests/stats
 # ------------------------------------------------------------------------------
 @user_stats_router.get("/users/me/tests/stats", response_model=UserTestsStatsResponse)
-def get_user_tests_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_user_tests_stats(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Считает общее число пройденных тестов (is_completed = true),
@@ -41,15 +42,22 @@ def get_user_tests_stats(
     а также суммарное количество правильных/неправильных ответов (по всем тестам).
     """
 
-    # 1) Находим все завершённые сессии пользователя
-    sessions = db.query(UserTestSession).filter(
-        UserTestSession.user_id == current_user.id,
-        UserTestSession.is_completed == True
-    ).all()
-
-    total_tests_completed = len(sessions)
+    # Все показатели — агрегатом по завершённым попыткам, ответы не загружаются
+    stats = (await db.execute(
+        select(
+            func.count(UserTestSession.id).label("completed"),
+            func.avg(UserTestSession.total_time_seconds).label("avg_time"),
+            func.max(UserTestSession.total_time_seconds).label("max_time"),
+            func.min(UserTestSession.total_time_seconds).label("min_time"),
+            func.coalesce(func.sum(UserTestSession.correct_count), 0).label("correct"),
+            func.coalesce(func.sum(UserTestSession.wrong_count), 0).label("wrong")
+        ).where(
+            UserTestSession.user_id == current_user.id,
+            UserTestSession.is_completed == True
+        )
+    )).one()
 
-    if total_tests_completed == 0:
+    if stats.completed == 0:
         # если пользователь не завершил ни одного теста
         return UserTestsStatsResponse(
             total_tests_completed=0,
@@ -60,34 +68,13 @@ def get_user_tests_stats(
             total_wrong_answers=0
         )
 
-    # 2) считаем время
-    times = [s.total_time_seconds for s in sessions if s.total_time_seconds is not None]
-    if times:
-        avg_time = sum(times) / len(times)
-        max_time = max(times)
-        min_time = min(times)
-    else:
-        avg_time = 0.0
-        max_time = 0
-        min_time = 0
-
-    # 3) считаем количество правильных/неправильных ответов
-    # Для этого найдём все UserQuestion, где user_id = current_user.id
-    # Можно не фильтровать по test_id, т.к. хотим суммарно по всем тестам.
-    user_questions = db.query(UserQuestion).filter(
-        UserQuestion.user_id == current_user.id
-    ).all()
-
-    total_correct_answers = sum(1 for uq in user_questions if uq.is_correct)
-    total_wrong_answers = len(user_questions) - total_correct_answers
-
     return UserTestsStatsResponse(
-        total_tests_completed=total_tests_completed,
-        average_time_seconds=round(avg_time, 2),
-        max_time_seconds=max_time,
-        min_time_seconds=min_time,
-        total_correct_answers=total_correct_answers,
-        total_wrong_answers=total_wrong_answers
+        total_tests_completed=stats.completed,
+        average_time_seconds=round(float(stats.avg_time or 0), 2),
+        max_time_seconds=stats.max_time or 0,
+        min_time_seconds=stats.min_time or 0,
+        total_correct_answers=stats.correct,
+        total_wrong_answers=stats.wrong
     )
 
 
@@ -96,9 +83,9 @@ def get_user_tests_stats(
 # GET /users/me/questions/stats
 # ------------------------------------------------------------------------------
 @user_stats_router.get("/users/me/questions/stats", response_model=UserQuestionsStatsResponse)
-def get_user_questions_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_user_questions_stats(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Возвращает суммарное количество правильных/неправильных ответов,
@@ -113,31 +100,25 @@ def get_user_questions_stats(
       }
     }
     """
-    # Получаем все записи UserQuestion для этого пользователя
-    user_questions = db.query(UserQuestion).join(Question, Question.id == UserQuestion.question_id).filter(
-        UserQuestion.user_id == current_user.id
-    ).all()
-
-    total_correct = sum(1 for uq in user_questions if uq.is_correct)
-    total_wrong = len(user_questions) - total_correct
-
-    # Группируем по теме (Question.topic)
-    # user_questions[i].question.topic
-    topic_stats: Dict[str, {"correct": int, "wrong": int}] = {}
-
-    for uq in user_questions:
-        topic = uq.question.topic if uq.question.topic else "No Topic"
-        if topic not in topic_stats:
-            topic_stats[topic] = {"correct": 0, "wrong": 0}
-        if uq.is_correct:
-            topic_stats[topic]["correct"] += 1
-        else:
-            topic_stats[topic]["wrong"] += 1
-
-    # Преобразуем в удобную модель
-    by_topic_result = {}
-    for topic, data in topic_stats.items():
-        by_topic_result[topic] = TopicStats(correct=data["correct"], wrong=data["wrong"])
+    # Один GROUP BY по теме: БД возвращает по строке на тему, а не все ответы пользователя
+    topic = func.coalesce(Question.topic, "No Topic").label("topic")
+    rows = (await db.execute(
+        select(
+            topic,
+            func.count(UserQuestion.id).label("answered"),
+            func.coalesce(func.sum(case((UserQuestion.is_correct == True, 1), else_=0)), 0).label("correct")
+        )
+        .join(Question, Question.id == UserQuestion.question_id)
+        .where(UserQuestion.user_id == current_user.id)
+        .group_by(topic)
+    )).all()
+
+    by_topic_result = {
+        row.topic: TopicStats(correct=row.correct, wrong=row.answered - row.correct)
+        for row in rows
+    }
+    total_correct = sum(row.correct for row in rows)
+    total_wrong = sum(row.answered for row in rows) - total_correct
 
     return UserQuestionsStatsResponse(
         total_correct_answers=total_correct,
@@ -146,59 +127,63 @@ def get_user_questions_stats(
     )
 
 @user_stats_router.get("/users/me/sessions", response_model=List[TestSessionEntry])
-def get_user_test_sessions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_user_test_sessions(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    sessions = db.query(UserTestSession).filter(
-        UserTestSession.user_id == current_user.id,
-        UserTestSession.is_completed == True
-    ).all()
-
-    result = []
-    for session in sessions:
-        question_ids = [q.id for q in session.test.questions]
-        user_questions = db.query(UserQuestion).filter(
-            UserQuestion.user_id == current_user.id,
-            UserQuestion.question_id.in_(question_ids)
-        ).all()
-
-        correct = sum(1 for q in user_questions if q.is_correct)
-        incorrect = len(user_questions) - correct
-        result.append(TestSessionEntry(
-            correct_answers=correct,
-            incorrect_answers=incorrect,
-            duration=session.total_time_seconds or 0
-        ))
+    # Счётчики хранятся в самой попытке — один запрос без обращения к user_questions
+    sessions = (await db.execute(
+        select(
+            UserTestSession.correct_count,
+            UserTestSession.wrong_count,
+            UserTestSession.total_time_seconds
+        ).where(
+            UserTestSession.user_id == current_user.id,
+            UserTestSession.is_completed == True
+        ).order_by(UserTestSession.start_time)
+    )).all()
 
-    return result
+    return [
+        TestSessionEntry(
+            correct_answers=session.correct_count,
+            incorrect_answers=session.wrong_count,
+            duration=session.total_time_seconds or 0
+        )
+        for session in sessions
+    ]
 
 
 @user_stats_router.get("/leaderboard", response_model=List[UserStatsForLeaderboard])
-def get_leaderboard(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_leaderboard(
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
-    users = db.query(User).all()
-    result = []
-
-    for user in users:
-        sessions = db.query(UserTestSession).filter(
-            UserTestSession.user_id == user.id,
-            UserTestSession.is_completed == True
-        ).all()
-
-        if not sessions:
-            continue
-
-        question_ids = db.query(UserQuestion).filter(UserQuestion.user_id == user.id).all()
-        correct = sum(1 for q in question_ids if q.is_correct)
-        total_time = sum(s.total_time_seconds or 0 for s in sessions)
-
-        result.append(UserStatsForLeaderboard(
-            name=user.name or user.email,
-            total_correct_answers=correct,
-            total_time_seconds=total_time
-        ))
-
-    return result
\ No newline at end of file
+    # Агрегаты по завершённым попыткам: суммарное время и правильные ответы на пользователя
+    completed_sessions = (
+        select(
+            UserTestSession.user_id,
+            func.sum(func.coalesce(UserTestSession.total_time_seconds, 0)).label("total_time"),
+            func.sum(UserTestSession.correct_count).label("correct")
+        )
+        .where(UserTestSession.is_completed == True)
+        .group_by(UserTestSession.user_id)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(
+            User.name,
+            User.email,
+            completed_sessions.c.total_time,
+            completed_sessions.c.correct
+        )
+        .join(completed_sessions, completed_sessions.c.user_id == User.id)
+    )).all()
+
+    return [
+        UserStatsForLeaderboard(
+            name=row.name or row.email,
+            total_correct_answers=row.correct,
+            total_time_seconds=row.total_time
+        )
+        for row in rows
+    ]
@@ -1,17 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
 from server.app.utils.db.models import User
-from server.app.utils.db.setup import get_db
-from server.app.routers.auth import get_current_user
+from server.app.utils.db.setup import get_async_db, get_read_db
+from server.app.utils.db.purge import purge_user
+from server.app.utils.pagination import PageParams, paginate
+from server.app.routers.auth import (
+    get_current_user, get_current_principal, invalidate_user_cache, Principal, UserSnapshot
+)
 from server.app.schemas.user import UserResponse, UserUpdate
 
 user_router = APIRouter(prefix="/users", tags=["Users"])
 
 
 @user_router.get("/me", response_model=UserResponse)
-def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: UserSnapshot = Depends(get_current_user)):
     """
     Возвращает данные текущего (авторизованного) пользователя.
     """
@@ -19,41 +24,42 @@ def read_users_me(current_user: User = Depends(get_current_user)):
 
 
 @user_router.get("/", response_model=list[UserResponse])
-def get_all_users(
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+async def get_all_users(
+        response: Response,
+        page: PageParams = Depends(),
+        db: AsyncSession = Depends(get_read_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
-    Возвращает список всех пользователей (доступно только админу).
-    Пример: проверяем current_user.email == "admin@example.com"
+    Возвращает страницу пользователей, новые первыми (доступно только админу).
+    Роль администратора берётся из токена, без запроса к БД.
     """
-    if current_user.email != "admin@example.com":
+    if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Доступ запрещен")
 
-    users = db.query(User).all()
-    return users
+    return await paginate(db, select(User), User, page, response)
 
 
 @user_router.get("/{user_id}", response_model=UserResponse)
-def get_user_by_id(
+async def get_user_by_id(
         user_id: UUID,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_read_db)
 ):
     """
     Возвращает информацию о пользователе по его UUID.
     user_id мы указываем как UUID, чтобы FastAPI автоматически конвертировал.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = (await db.execute(select(User).where(User.id == user_id))).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user
 
 
 @user_router.put("/me", response_model=UserResponse)
-def update_user(
+async def update_user(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Позволяет пользователю обновить свои данные:
@@ -63,39 +69,51 @@ def update_user(
       - gender
       - grade
     """
+    # current_user — снимок из кэша, изменяем свежую запись из БД
+    user = (await db.execute(select(User).where(User.id == current_user.id))).scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
 
     if user_update.email:
-        existing_user = db.query(User).filter(User.email == user_update.email).first()
+        existing_user = (await db.execute(select(User).where(User.email == user_update.email))).scalars().first()
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(status_code=400, detail="Этот email уже используется")
-        current_user.email = user_update.email
+        user.email = user_update.email
 
     if user_update.name:
-        current_user.name = user_update.name
+        user.name = user_update.name
 
     if user_update.date_of_birth is not None:
-        current_user.date_of_birth = user_update.date_of_birth
+        user.date_of_birth = user_update.date_of_birth
 
     if user_update.gender is not None:
-        current_user.gender = user_update.gender
+        user.gender = user_update.gender
 
     if user_update.grade is not None:
-        current_user.grade = user_update.grade
+        user.grade = user_update.grade
 
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user_cache(user.id)
+    return user
 
 
 
 @user_router.delete("/me")
-def delete_user(
-        db: Session = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+async def delete_user(
+        background_tasks: BackgroundTasks,
+        db: AsyncSession = Depends(get_async_db),
+        current_user: Principal = Depends(get_current_principal)
 ):
     """
-    Удаляет текущего пользователя из системы.
+    Удаляет текущего пользователя из системы вместе с его историей.
+    История удаляется порциями в фоне, после отправки ответа.
     """
-    db.delete(current_user)
-    db.commit()
+    user_id = (await db.execute(select(User.id).where(User.id == current_user.id))).scalar()
+    if not user_id:
+        raise HTTPException(status_code=404, detail="Пользователь не найден")
+    background_tasks.add_task(purge_user, user_id)
+    # Повторно — после удаления, чтобы в кэш не попал снимок, прочитанный во время очистки
+    background_tasks.add_task(invalidate_user_cache, user_id)
+    invalidate_user_cache(current_user.id)
     return {"message": "Пользователь успешно удален"}
@@ -27,5 +27,27 @@ class MaterialResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Для списков: без content — полный текст отдаёт GET /materials/{material_id}
+class MaterialSummary(BaseModel):
+    id: UUID
+    title: str
+    subtitle: Optional[str]
+    level: Optional[str]
+    like_count: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class MaterialSearchResult(BaseModel):
+    id: UUID
+    title: str
+    subtitle: Optional[str]
+    level: Optional[str]
+    created_at: datetime
+    rank: float
+    snippet: Optional[str]  # HTML: экранированный фрагмент content с совпадениями в <b>...</b>
+
 class MaterialLikeRequest(BaseModel):
     is_liked: bool
@@ -33,6 +33,16 @@ class QuestionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# ------------------------------------------------
+# Результат поиска по банку вопросов
+# ------------------------------------------------
+class QuestionSearchResult(BaseModel):
+    id: UUID
+    test_id: UUID
+    topic: Optional[str]
+    question_text: str
+    score: float  # доля триграмм запроса, найденных в вопросе
+
 # ------------------------------------------------
 # Cхемы для Answer
 # ------------------------------------------------
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import AliasChoices, BaseModel, Field, field_validator
+from typing import Annotated, List, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -23,3 +23,50 @@ class TestResponse(BaseModel):
 
     class Config:
         from_attributes = True  # Или orm_mode=True в более старых версиях
+
+# Для списков: без description — её отдаёт GET /tests/{test_id}
+class TestSummary(BaseModel):
+    id: UUID
+    title: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+# ------------------------------------------------
+# Импорт теста целиком (тест + вопросы + ответы)
+# Принимает и формат /ai/generate-test (questionText, isCorrect)
+# ------------------------------------------------
+class AnswerImport(BaseModel):
+    text: str
+    is_correct: bool = Field(False, validation_alias=AliasChoices("is_correct", "isCorrect"))
+
+
+class QuestionImport(BaseModel):
+    topic: Optional[str] = None
+    question_text: str = Field(validation_alias=AliasChoices("question_text", "questionText"))
+    explanation: Optional[str] = None
+    answers: List[AnswerImport] = Field(min_length=1)
+
+    @field_validator("answers")
+    @classmethod
+    def has_correct_answer(cls, answers: List[AnswerImport]) -> List[AnswerImport]:
+        if not any(answer.is_correct for answer in answers):
+            raise ValueError("У вопроса должен быть хотя бы один правильный ответ")
+        return answers
+
+
+# Ограничение общее для обоих форматов импорта: документа и голого массива вопросов
+QuestionImportList = Annotated[List[QuestionImport], Field(min_length=1, max_length=1000)]
+
+
+class TestImport(BaseModel):
+    title: str
+    description: Optional[str] = None
+    questions: QuestionImportList
+
+
+class TestImportResponse(TestResponse):
+    questions_count: int
+    answers_count: int
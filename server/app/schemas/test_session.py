@@ -9,6 +9,7 @@ from typing import Optional
 class StartTestResponse(BaseModel):
     session_id: UUID
     start_time: datetime
+    resumed: bool = False  # True — вернули уже открытую попытку (?resume=true)
 
 # -------------------------------------------------------------
 # 5.2. Ответ пользователя на вопрос
@@ -50,3 +51,12 @@ class TestStatsResponse(BaseModel):
     avg_correct_answers: float
     avg_wrong_answers: float
     avg_time_seconds: float
+
+# -------------------------------------------------------------
+# 5.6. Разбор попытки: ответы в порядке их выбора
+# -------------------------------------------------------------
+class SessionAnswerResponse(BaseModel):
+    question_id: UUID
+    selected_answer_id: Optional[UUID]
+    is_correct: bool
+    answered_at: datetime
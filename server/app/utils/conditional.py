@@ -0,0 +1,74 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response
+
+# ---------------------------------------------------------
+# Условные GET: ETag / Last-Modified и ответ 304
+# ---------------------------------------------------------
+# Клиент всегда перепроверяет ответ, но при совпадении получает 304 без тела
+CACHE_CONTROL = "private, no-cache"
+
+
+def _as_utc(moment: datetime) -> datetime:
+    # SQLite возвращает время без tzinfo, хотя хранит его в UTC
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def make_etag(*parts) -> str:
+    """ Сильный ETag из версии ресурса: id + updated_at, для коллекций — count + max(updated_at) """
+    raw = "|".join(_as_utc(part).isoformat() if isinstance(part, datetime) else str(part) for part in parts)
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Для GET допускается слабое сравнение: W/"x" совпадает с "x"
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def is_conditional(request: Request) -> bool:
+    """ Есть ли у запроса валидаторы; без них сверять версию заранее незачем """
+    return "If-None-Match" in request.headers or "If-Modified-Since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """ If-None-Match приоритетнее If-Modified-Since (RFC 9110, 13.2.2) """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # В заголовке точность до секунды
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime] = None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None
+) -> Optional[Response]:
+    """
+    Возвращает готовый 304, если у клиента актуальная версия; иначе проставляет
+    валидаторы в response и возвращает None — ручка продолжает обычную загрузку.
+    """
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,84 @@
+"""
+Полнотекстовый поиск по материалам.
+
+В PostgreSQL у materials есть сгенерированная колонка search_vector
+(title — вес A, subtitle — B, content — C) с GIN-индексом; её создаёт миграция,
+в модели её нет, потому что во встроенном режиме (SQLite) такого типа не существует.
+Там поиск откатывается к LIKE по тем же трём полям.
+
+Фрагменты (snippet) — HTML: текст материала экранируется, совпадения выделены <b>...</b>.
+"""
+import html
+import os
+import re
+from typing import Optional
+
+from sqlalchemy import cast, func, literal_column, or_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from server.app.utils.db.models import Material
+
+# Должна совпадать с конфигурацией в выражении колонки (миграция d5c2a8f1e364)
+FTS_CONFIG = "russian"
+# ts_headline отмечает совпадения символами из области частного использования Unicode,
+# а не тегами: текст экранируется уже в Python, и разметка из content не доходит до клиента
+MATCH_START, MATCH_STOP = "\ue000", "\ue001"
+# Опции ts_headline: фрагменты вокруг совпадений
+HEADLINE_FRAGMENTS = os.getenv(
+    "MATERIALS_HEADLINE_FRAGMENTS",
+    "MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter= … "
+)
+HEADLINE_OPTIONS = f"StartSel={MATCH_START}, StopSel={MATCH_STOP}, {HEADLINE_FRAGMENTS}"
+# Длина фрагмента в режиме без Postgres
+PLAIN_SNIPPET_CHARS = 200
+
+search_vector = literal_column("materials.search_vector")
+
+
+def ts_query(query: str):
+    # websearch_to_tsquery понимает "фразы", OR и -исключения и не падает на произвольном вводе
+    return func.websearch_to_tsquery(cast(FTS_CONFIG, REGCONFIG), query)
+
+
+def fts_match(query: str):
+    """ Условие поиска для PostgreSQL: использует GIN-индекс ix_materials_search_vector """
+    return search_vector.op("@@")(ts_query(query))
+
+
+def fts_rank(query: str):
+    return func.ts_rank(search_vector, ts_query(query))
+
+
+def fts_headline(text_column, query: str):
+    """ Результат передаётся в headline_html """
+    return func.ts_headline(cast(FTS_CONFIG, REGCONFIG), text_column, ts_query(query), HEADLINE_OPTIONS)
+
+
+def headline_html(headline: Optional[str]) -> Optional[str]:
+    """ Экранирует фрагмент ts_headline и заменяет метки совпадений на <b>...</b> """
+    if not headline:
+        return None
+    return html.escape(headline).replace(MATCH_START, "<b>").replace(MATCH_STOP, "</b>")
+
+
+def like_match(query: str):
+    """ Условие поиска для SQLite """
+    pattern = f"%{query}%"
+    return or_(Material.title.ilike(pattern), Material.subtitle.ilike(pattern), Material.content.ilike(pattern))
+
+
+def plain_snippet(text: Optional[str], query: str) -> Optional[str]:
+    """ Фрагмент вокруг первого вхождения с тем же выделением и экранированием, что headline_html """
+    if not text:
+        return None
+    pattern = re.compile(f"({re.escape(query)})", flags=re.IGNORECASE)
+    match = pattern.search(text)
+    if not match:
+        return html.escape(text[:PLAIN_SNIPPET_CHARS])
+    start = max(0, match.start() - PLAIN_SNIPPET_CHARS // 2)
+    fragment = text[start:start + PLAIN_SNIPPET_CHARS]
+    # После split совпадения стоят на нечётных позициях
+    return "".join(
+        f"<b>{html.escape(part)}</b>" if index % 2 else html.escape(part)
+        for index, part in enumerate(pattern.split(fragment))
+    )
@@ -0,0 +1,110 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# Учёт SQL-запросов в рамках одного HTTP-запроса
+# ---------------------------------------------------------
+# Заголовки X-DB-Queries / X-DB-Time-ms раскрывают внутренности, поэтому только для dev и тестов
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "false").lower() in ("1", "true", "yes")
+# Сколько одинаковых запросов за один HTTP-запрос считаем признаком N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+_IN_LIST = re.compile(r"\bIN\s*\((?:[^()]|\([^()]*\))*\)", re.IGNORECASE)
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|\$\d+|%\(\w+\)s|:\w+|\?")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """ Текст запроса без параметров и литералов — одинаковый у запросов из одного цикла """
+    statement = _IN_LIST.sub("IN (?)", statement)
+    statement = _LITERALS.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    @property
+    def total_ms(self) -> float:
+        return round(self.total_seconds * 1000, 3)
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list:
+        """ Запросы, повторившиеся не меньше threshold раз, — кандидаты в N+1 """
+        return [(statement, count) for statement, count in self.fingerprints.most_common() if count >= threshold]
+
+
+# Активные сборщики: вложенный (например, бюджет в тесте вокруг HTTP-запроса) не скрывает внешний
+_active_stats: ContextVar[Tuple[QueryStats, ...]] = ContextVar("sql_query_stats", default=())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_stats.get():
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _active_stats.get()
+    started = conn.info.get("query_started_at")
+    if not collectors or not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    for stats in collectors:
+        stats.record(statement, seconds)
+
+
+@contextmanager
+def collect_queries():
+    """
+    Считает все SQL-запросы (sync и async движков), выполненные внутри блока
+    в текущем контексте (asyncio-задаче или потоке).
+    """
+    stats = QueryStats()
+    token = _active_stats.set(_active_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active_stats.reset(token)
+
+
+def log_n_plus_one(stats: QueryStats, where: str) -> None:
+    for statement, count in stats.repeated():
+        logger.warning("Возможный N+1 в %s: %d одинаковых запросов: %s", where, count, statement)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """
+    Помощник для тестов: падает, если внутри блока выполнено больше max_queries запросов.
+        with query_budget(3):
+            client.get("/leaderboard", headers=headers)
+    """
+    with collect_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        details = "\n".join(f"  {count} x {statement}" for statement, count in stats.fingerprints.most_common())
+        raise QueryBudgetExceeded(f"Выполнено {stats.count} запросов при бюджете {max_queries}:\n{details}")
@@ -1,24 +1,24 @@
-import os
 import uuid
 from datetime import datetime, timezone
-from dotenv import load_dotenv
 
 from sqlalchemy import (
-    create_engine, Column, String, Boolean, DateTime,
-    Date, ForeignKey, Text, Integer
+    Column, String, Boolean, DateTime,
+    Date, ForeignKey, Text, Integer, Index, UniqueConstraint, Uuid, false, true, text
 )
-from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import (
-    declarative_base, relationship, sessionmaker
+    declarative_base, relationship
 )
 
-load_dotenv()
+# Движок и фабрика сессий создаются в одном месте — engine.py
+from server.app.utils.db.engine import DATABASE_URL, engine, SessionLocal
+from server.app.utils.ids import uuid7
 
 Base = declarative_base()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
 
 # ---------------------------------------------------------
 # Таблица пользователей
@@ -26,8 +26,8 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 class User(Base):
     __tablename__ = 'users'
 
-    # Генерация UUID (используется postgresql.UUID + python-uuid)
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    # Uuid — нативный UUID в PostgreSQL и CHAR(32) в SQLite, значения генерирует python-uuid
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     email = Column(String, unique=True, nullable=False)
     password = Column(String, nullable=False)
     name = Column(String, nullable=False)
@@ -35,14 +35,20 @@ class User(Base):
     gender = Column(String, nullable=True)  # 'male' / 'female' / 'other' / ...
     grade = Column(String, nullable=True)   # 'junior' / 'middle' / 'senior' / ...
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
-    updated_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow)
 
     # Связи (relationship)
-    chat_messages = relationship('ChatMessage', back_populates='user')
-    user_materials = relationship('UserMaterial', back_populates='user')
-    test_sessions = relationship('UserTestSession', back_populates='user')
-    user_questions = relationship('UserQuestion', back_populates='user')
+    # Зависимые строки удаляет БД (ON DELETE CASCADE), ORM их не загружает
+    chat_messages = relationship('ChatMessage', back_populates='user', passive_deletes=True)
+    user_materials = relationship('UserMaterial', back_populates='user', passive_deletes=True)
+    test_sessions = relationship('UserTestSession', back_populates='user', passive_deletes=True)
+    user_questions = relationship('UserQuestion', back_populates='user', passive_deletes=True)
+
+    __table_args__ = (
+        # Keyset-пагинация списка: ORDER BY created_at, id
+        Index('ix_users_created_id', 'created_at', 'id'),
+    )
 
 
 # ---------------------------------------------------------
@@ -51,17 +57,25 @@ class User(Base):
 class ChatMessage(Base):
     __tablename__ = 'chat_messages'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid7)  # UUIDv7: растущие ключи, вставки идут в правый край индекса
+    user_id = Column(Uuid, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
 
     role = Column(String, nullable=False, default='user')  # 'user' или 'assistant'
     message_text = Column(Text, nullable=False)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
+    # В PostgreSQL таблица разбита на помесячные партиции по created_at,
+    # поэтому ключ партиционирования входит в первичный ключ
+    created_at = Column(DateTime(timezone=True), primary_key=True, default=utcnow)
 
     # Связь
     user = relationship('User', back_populates='chat_messages')
 
+    __table_args__ = (
+        # История чата: WHERE user_id = ? ORDER BY created_at DESC LIMIT n
+        Index('ix_chat_messages_user_created', 'user_id', text('created_at DESC')),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
 
 # ---------------------------------------------------------
 # Учебные материалы
@@ -69,17 +83,29 @@ class ChatMessage(Base):
 class Material(Base):
     __tablename__ = 'materials'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     title = Column(String, nullable=False)
     subtitle = Column(String, nullable=True)
     level = Column(String, nullable=True)   # 'junior' / 'middle' / 'senior' / ...
     content = Column(Text, nullable=True)
+    # Число лайков — меняет set_material_like, только когда флаг действительно переключился.
+    # updated_at при этом не трогается: он описывает версию содержимого (ETag)
+    like_count = Column(Integer, default=0, server_default='0', nullable=False)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
-    updated_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow)
+
+    # В PostgreSQL есть ещё сгенерированная колонка search_vector (tsvector + GIN) —
+    # она создаётся миграцией и используется только через utils/db/fulltext.py
 
     # Связь (через промежуточную таблицу UserMaterial)
-    user_materials = relationship('UserMaterial', back_populates='material')
+    user_materials = relationship('UserMaterial', back_populates='material', passive_deletes=True)
+
+    __table_args__ = (
+        Index('ix_materials_created_id', 'created_at', 'id'),
+        # Популярные материалы: ORDER BY like_count DESC, id DESC
+        Index('ix_materials_like_count_id', 'like_count', 'id'),
+    )
 
 
 # ---------------------------------------------------------
@@ -91,18 +117,25 @@ class UserMaterial(Base):
     """
     __tablename__ = 'user_materials'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
-    material_id = Column(UUID(as_uuid=True), ForeignKey('materials.id'), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    material_id = Column(Uuid, ForeignKey('materials.id', ondelete='CASCADE'), nullable=False)
 
     is_liked = Column(Boolean, default=False)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
 
     # Связи
     user = relationship('User', back_populates='user_materials')
     material = relationship('Material', back_populates='user_materials')
 
+    __table_args__ = (
+        # Одна отметка на пару: на нём держится INSERT ... ON CONFLICT в set_material_like
+        UniqueConstraint('user_id', 'material_id', name='uq_user_materials_user_material'),
+        # Каскадное удаление материала
+        Index('ix_user_materials_material_id', 'material_id'),
+    )
+
 
 # ---------------------------------------------------------
 # Тесты
@@ -110,15 +143,28 @@ class UserMaterial(Base):
 class Test(Base):
     __tablename__ = 'tests'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
-    updated_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow)
+    # Отметка удаления: ставится в транзакции DELETE /tests/{test_id}, строку вместе
+    # с зависимыми затем удаляет purge_test (см. utils/db/purge.py)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
 
     # Связь (один тест -> много вопросов)
-    questions = relationship('Question', back_populates='test')
+    questions = relationship('Question', back_populates='test', passive_deletes=True)
+
+    __table_args__ = (
+        Index('ix_tests_created_id', 'created_at', 'id'),
+        # Незавершённые удаления, которые надо дочистить после перезапуска
+        Index(
+            'ix_tests_pending_purge', 'id',
+            postgresql_where=(deleted_at.isnot(None)),
+            sqlite_where=(deleted_at.isnot(None))
+        ),
+    )
 
 
 # ---------------------------------------------------------
@@ -127,20 +173,25 @@ class Test(Base):
 class Question(Base):
     __tablename__ = 'questions'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    test_id = Column(UUID(as_uuid=True), ForeignKey('tests.id'), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    test_id = Column(Uuid, ForeignKey('tests.id', ondelete='CASCADE'), nullable=False)
 
     topic = Column(String, nullable=True)
     question_text = Column(Text, nullable=False)
     explanation = Column(Text, nullable=True)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
-    updated_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow)
 
     # Связи
     test = relationship('Test', back_populates='questions')
-    answers = relationship('Answer', back_populates='question')
-    user_questions = relationship('UserQuestion', back_populates='question')
+    answers = relationship('Answer', back_populates='question', passive_deletes=True)
+    user_questions = relationship('UserQuestion', back_populates='question', passive_deletes=True)
+
+    __table_args__ = (
+        # Вопросы теста по порядку (keyset-пагинация); покрывает и поиск по test_id
+        Index('ix_questions_test_created_id', 'test_id', 'created_at', 'id'),
+    )
 
 
 # ---------------------------------------------------------
@@ -149,44 +200,64 @@ class Question(Base):
 class Answer(Base):
     __tablename__ = 'answers'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    question_id = Column(UUID(as_uuid=True), ForeignKey('questions.id'), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    question_id = Column(Uuid, ForeignKey('questions.id', ondelete='CASCADE'), nullable=False)
 
     text = Column(String, nullable=False)
     is_correct = Column(Boolean, default=False)
 
-    created_at = Column(DateTime(timezone=True), nullable=False)
-    updated_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, onupdate=utcnow)
 
     # Связь
     question = relationship('Question', back_populates='answers')
 
+    __table_args__ = (
+        Index('ix_answers_question_id', 'question_id'),
+    )
+
 
 # ---------------------------------------------------------
 # Статистика: пользователь - вопрос
 # ---------------------------------------------------------
 class UserQuestion(Base):
     """
-    Фиксирует, как пользователь ответил на конкретный вопрос.
+    Фиксирует, как пользователь ответил на конкретный вопрос в конкретной попытке.
     """
     __tablename__ = 'user_questions'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
-    question_id = Column(UUID(as_uuid=True), ForeignKey('questions.id'), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    user_id = Column(Uuid, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    question_id = Column(Uuid, ForeignKey('questions.id', ondelete='CASCADE'), nullable=False)
+    # NULL — только у старых ответов, которые миграция не смогла отнести к попытке
+    session_id = Column(Uuid, ForeignKey('user_test_sessions.id', ondelete='CASCADE'), nullable=True)
 
-    selected_answer_id = Column(UUID(as_uuid=True), ForeignKey('answers.id'), nullable=True)
+    # Удалённый вариант ответа не должен удалять историю — только обнуляет ссылку
+    selected_answer_id = Column(Uuid, ForeignKey('answers.id', ondelete='SET NULL'), nullable=True)
     is_correct = Column(Boolean, default=False)
 
     answered_at = Column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(timezone.utc)
+        default=utcnow
     )
 
     # Связи
     user = relationship('User', back_populates='user_questions')
     question = relationship('Question', back_populates='user_questions')
     selected_answer = relationship('Answer')
+    session = relationship('UserTestSession', back_populates='answers')
+
+    __table_args__ = (
+        # Один ответ на вопрос в попытке; индекс отдаёт ответы попытки одним range scan
+        UniqueConstraint('session_id', 'question_id', name='uq_user_questions_session_question'),
+        Index('ix_user_questions_user_question', 'user_id', 'question_id'),
+        # Для удаления вопросов и выборок по вопросу
+        Index('ix_user_questions_question_id', 'question_id'),
+        # ON DELETE SET NULL при удалении варианта ответа
+        Index('ix_user_questions_selected_answer_id', 'selected_answer_id'),
+        # Выгрузка /exports/user-questions: диапазон и сортировка по answered_at
+        Index('ix_user_questions_answered_at', 'answered_at'),
+    )
 
 
 # ---------------------------------------------------------
@@ -195,9 +266,9 @@ class UserQuestion(Base):
 class UserTestSession(Base):
     __tablename__ = 'user_test_sessions'
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
-    test_id = Column(UUID(as_uuid=True), ForeignKey('tests.id'), nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid7)
+    user_id = Column(Uuid, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    test_id = Column(Uuid, ForeignKey('tests.id', ondelete='CASCADE'), nullable=False)
 
     start_time = Column(DateTime(timezone=True), nullable=False)
     end_time = Column(DateTime(timezone=True), nullable=True)  # nullable=True — чтобы избежать ошибки при миграции
@@ -205,11 +276,75 @@ class UserTestSession(Base):
     total_time_seconds = Column(Integer, nullable=True)  # исправлено
     is_completed = Column(Boolean, default=False, nullable=False)  # исправлено
 
+    # Счётчики ответов в этой попытке — обновляет answer_question, читать их дешевле, чем пересчитывать
+    answered_count = Column(Integer, default=0, server_default='0', nullable=False)
+    correct_count = Column(Integer, default=0, server_default='0', nullable=False)
+    wrong_count = Column(Integer, default=0, server_default='0', nullable=False)
+
     # Связи
     user = relationship('User', back_populates='test_sessions')
+    answers = relationship('UserQuestion', back_populates='session', passive_deletes=True)
     # Можно при необходимости связать тест напрямую:
     # test = relationship('Test')
 
+    __table_args__ = (
+        # Последняя попытка пользователя по тесту (ORDER BY start_time DESC)
+        Index('ix_user_test_sessions_user_test_start', 'user_id', 'test_id', 'start_time'),
+        # Активная (незавершённая) сессия — ищется в каждом вызове start/answer/finish.
+        # Уникальность гарантирует не больше одной открытой попытки и служит целью ON CONFLICT в start_test
+        Index(
+            'uq_user_test_sessions_open', 'user_id', 'test_id', unique=True,
+            postgresql_where=(is_completed == false()),
+            sqlite_where=(is_completed == false())
+        ),
+        # Завершённые попытки по тесту — статистика для админа
+        Index(
+            'ix_user_test_sessions_test_completed', 'test_id',
+            postgresql_where=(is_completed == true()),
+            sqlite_where=(is_completed == true())
+        ),
+        # Каскадное удаление теста (частичный индекс выше покрывает только завершённые)
+        Index('ix_user_test_sessions_test_id', 'test_id'),
+        # Выгрузка /exports/test-sessions: диапазон и сортировка по start_time
+        Index('ix_user_test_sessions_start_time', 'start_time'),
+    )
+
+
+# ---------------------------------------------------------
+# Refresh-токены (хранятся по jti, токен целиком не сохраняем)
+# ---------------------------------------------------------
+class RefreshToken(Base):
+    __tablename__ = 'refresh_tokens'
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    jti = Column(String, unique=True, nullable=False)
+    user_id = Column(Uuid, ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=utcnow
+    )
+
+
+# ---------------------------------------------------------
+# Отозванные access-токены (до истечения их срока действия)
+# ---------------------------------------------------------
+class RevokedToken(Base):
+    __tablename__ = 'revoked_tokens'
+
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    revoked_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=utcnow
+    )
+
 
 # ---------------------------------------------------------
 # Функция для инициализации схемы (создаёт таблицы)
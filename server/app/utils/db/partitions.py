@@ -0,0 +1,160 @@
+"""
+Помесячные партиции chat_messages (только PostgreSQL): создание будущих партиций
+и перенос старых в сжатый архив.
+
+Разовый запуск (например, из cron):
+    python -m server.app.utils.db.partitions
+"""
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# Настройки обслуживания партиций
+# ---------------------------------------------------------
+CHAT_PARTITIONS_AHEAD = int(os.getenv("CHAT_PARTITIONS_AHEAD", "3"))  # сколько месяцев вперёд держать готовыми
+CHAT_RETENTION_MONTHS = int(os.getenv("CHAT_RETENTION_MONTHS", "0"))  # 0 — ничего не архивировать
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "archive/chat_messages")
+CHAT_PARTITION_MAINTENANCE_SECONDS = float(os.getenv("CHAT_PARTITION_MAINTENANCE_SECONDS", "21600"))
+
+PARENT_TABLE = "chat_messages"
+_PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})_(\d{{2}})$")
+# Ключ advisory lock: обслуживание выполняет только один процесс из всех инстансов
+_MAINTENANCE_LOCK_KEY = 0x63686174
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = _PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def expired_partitions(names: List[str], retention_months: int, today: date) -> List[str]:
+    """ Партиции, все строки которых старше retention_months полных месяцев """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(today.replace(day=1), -retention_months)
+    return sorted(name for name in names if (month := partition_month(name)) and month < cutoff)
+
+
+def is_partitioned(connection: Connection) -> bool:
+    return connection.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = current_schema()::regnamespace"
+    ), {"table": PARENT_TABLE}).first() is not None
+
+
+def list_partitions(connection: Connection) -> List[str]:
+    return list(connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname"
+    ), {"table": PARENT_TABLE}).scalars())
+
+
+def ensure_partitions(connection: Connection, months_ahead: int = CHAT_PARTITIONS_AHEAD, today: Optional[date] = None) -> List[str]:
+    """ Создаёт партиции с текущего месяца на months_ahead вперёд; возвращает созданные """
+    today = today or datetime.now(timezone.utc).date()
+    existing = set(list_partitions(connection))
+    created = []
+    month = today.replace(day=1)
+    for _ in range(months_ahead + 1):
+        name = partition_name(month)
+        if name not in existing:
+            # Границы в UTC — так же, как их создаёт миграция
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def count_archived_rows(path: Path) -> int:
+    """ Число записей в gzip-CSV без заголовка: перевод строки внутри кавычек — часть поля, а не новая запись """
+    with gzip.open(path, "rt", newline="") as archive:
+        return sum(1 for _ in csv.reader(archive)) - 1
+
+
+def archive_partition(engine: Engine, name: str, archive_dir: str = CHAT_ARCHIVE_DIR) -> Path:
+    """
+    Выгружает партицию в gzip-CSV и удаляет её из БД.
+    Партиция удаляется только после того, как число записей в архиве совпало с таблицей.
+    """
+    path = Path(archive_dir) / f"{name}.csv.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"SELECT count(*) FROM {name}")
+        expected = cursor.fetchone()[0]
+        with gzip.open(path, "wb") as archive:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", archive)
+        archived = count_archived_rows(path)
+        if archived != expected:
+            raise RuntimeError(f"Архив {path}: {archived} записей вместо {expected}, партиция {name} не удалена")
+        cursor.execute(f"DROP TABLE {name}")
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return path
+
+
+def run_maintenance(engine: Engine, today: Optional[date] = None) -> dict:
+    today = today or datetime.now(timezone.utc).date()
+    with engine.connect() as connection:
+        if not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _MAINTENANCE_LOCK_KEY}).scalar():
+            return {"skipped": "обслуживание уже выполняется другим процессом"}
+        try:
+            if not is_partitioned(connection):
+                return {"skipped": f"{PARENT_TABLE} не партиционирована"}
+            created = ensure_partitions(connection, today=today)
+            connection.commit()
+            expired = expired_partitions(list_partitions(connection), CHAT_RETENTION_MONTHS, today)
+            connection.commit()
+            # Архивируем, пока держим блокировку, чтобы два процесса не выгружали одну партицию
+            archived = [str(archive_partition(engine, name)) for name in expired]
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MAINTENANCE_LOCK_KEY})
+            connection.commit()
+    return {"created": created, "archived": archived}
+
+
+async def run_periodic_maintenance(engine: Engine, interval: float = CHAT_PARTITION_MAINTENANCE_SECONDS) -> None:
+    while True:
+        try:
+            result = await asyncio.to_thread(run_maintenance, engine)
+            if result.get("created") or result.get("archived"):
+                logger.info("Партиции %s: %s", PARENT_TABLE, result)
+        except Exception:
+            logger.exception("Не удалось обслужить партиции %s", PARENT_TABLE)
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    from server.app.utils.db.engine import engine
+
+    print(run_maintenance(engine))
@@ -0,0 +1,104 @@
+"""
+Удаление пользователей и тестов вместе с историей порциями.
+
+Внешние ключи объявлены с ON DELETE CASCADE, но один DELETE пользователя с длинной
+историей держит блокировки на горячих таблицах, пока БД удаляет все его строки.
+Поэтому зависимые строки удаляются порциями по PURGE_CHUNK_SIZE, каждая — в своей
+транзакции, а родительская строка — последней (каскад подчищает остаток).
+"""
+import asyncio
+import logging
+import os
+from uuid import UUID
+
+from sqlalchemy import and_, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from server.app.utils.db.engine import AsyncSessionLocal
+from server.app.utils.db.models import (
+    Answer, ChatMessage, Material, Question, Test, User, UserMaterial, UserQuestion, UserTestSession
+)
+
+logger = logging.getLogger(__name__)
+
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "1000"))
+# Пауза между порциями, чтобы запросы пользователей успевали взять блокировки
+PURGE_CHUNK_PAUSE_SECONDS = float(os.getenv("PURGE_CHUNK_PAUSE_SECONDS", "0.05"))
+
+
+async def delete_in_chunks(db: AsyncSession, model, condition, chunk_size: int = PURGE_CHUNK_SIZE) -> int:
+    """ DELETE ... WHERE id IN (SELECT id ... LIMIT chunk_size) до тех пор, пока есть строки """
+    deleted = 0
+    while True:
+        chunk = select(model.id).where(condition).limit(chunk_size).scalar_subquery()
+        result = await db.execute(
+            delete(model).where(model.id.in_(chunk)).execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return deleted
+        await asyncio.sleep(PURGE_CHUNK_PAUSE_SECONDS)
+
+
+async def release_likes(db: AsyncSession, user_id: UUID) -> None:
+    """ Снимает лайки пользователя вместе со счётчиками materials.like_count одной транзакцией """
+    liked = and_(UserMaterial.user_id == user_id, UserMaterial.is_liked == True)
+    user_likes = (
+        select(func.count()).select_from(UserMaterial)
+        .where(liked, UserMaterial.material_id == Material.id)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(Material)
+        .where(Material.id.in_(select(UserMaterial.material_id).where(liked)))
+        .values(like_count=Material.like_count - user_likes, updated_at=Material.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        update(UserMaterial).where(liked).values(is_liked=False).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def purge_user(user_id: UUID) -> dict:
+    async with AsyncSessionLocal() as db:
+        # Строки user_materials уходят каскадом и порциями, а счётчик лайков — нет
+        await release_likes(db, user_id)
+        counts = {
+            "user_questions": await delete_in_chunks(db, UserQuestion, UserQuestion.user_id == user_id),
+            "chat_messages": await delete_in_chunks(db, ChatMessage, ChatMessage.user_id == user_id),
+            "user_materials": await delete_in_chunks(db, UserMaterial, UserMaterial.user_id == user_id),
+            "user_test_sessions": await delete_in_chunks(db, UserTestSession, UserTestSession.user_id == user_id),
+        }
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+    logger.info("Пользователь %s удалён: %s", user_id, counts)
+    return counts
+
+
+async def purge_test(test_id: UUID) -> dict:
+    """ Строка tests к этому моменту уже помечена deleted_at (DELETE /tests/{test_id}) """
+    async with AsyncSessionLocal() as db:
+        question_ids = select(Question.id).where(Question.test_id == test_id)
+        counts = {
+            "user_questions": await delete_in_chunks(db, UserQuestion, UserQuestion.question_id.in_(question_ids)),
+            "answers": await delete_in_chunks(db, Answer, Answer.question_id.in_(question_ids)),
+            "user_test_sessions": await delete_in_chunks(db, UserTestSession, UserTestSession.test_id == test_id),
+            "questions": await delete_in_chunks(db, Question, Question.test_id == test_id),
+        }
+        await db.execute(delete(Test).where(Test.id == test_id))
+        await db.commit()
+    logger.info("Тест %s удалён: %s", test_id, counts)
+    return counts
+
+
+async def resume_test_purges() -> None:
+    """ Дочищает тесты, помеченные удалёнными, чьё фоновое удаление прервал перезапуск """
+    async with AsyncSessionLocal() as db:
+        pending = (await db.execute(select(Test.id).where(Test.deleted_at.isnot(None)))).scalars().all()
+    for test_id in pending:
+        try:
+            await purge_test(test_id)
+        except Exception:
+            logger.exception("Не удалось дочистить тест %s", test_id)
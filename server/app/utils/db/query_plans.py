@@ -0,0 +1,96 @@
+"""
+Проверка через EXPLAIN, что горячие запросы используют индексы.
+
+Запуск против текущей БД:
+    python -m server.app.utils.db.query_plans
+"""
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from sqlalchemy import false, select, text, tuple_
+from sqlalchemy.engine import Connection, Engine
+
+from server.app.utils.db.models import (
+    Answer, ChatMessage, Question, Test, UserMaterial, UserQuestion, UserTestSession
+)
+
+_ID = uuid.UUID(int=1)
+_TS = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Запросы, которые выполняются почти в каждом вызове соответствующих ручек
+HOT_QUERIES: Dict[str, Callable] = {
+    "open_test_session": lambda: select(UserTestSession).where(
+        UserTestSession.user_id == _ID,
+        UserTestSession.test_id == _ID,
+        UserTestSession.is_completed == false()
+    ),
+    "user_answer": lambda: select(UserQuestion).where(
+        UserQuestion.session_id == _ID,
+        UserQuestion.question_id == _ID
+    ),
+    "chat_history": lambda: select(ChatMessage).where(
+        ChatMessage.user_id == _ID
+    ).order_by(ChatMessage.created_at.desc()).limit(15),
+    "questions_by_test": lambda: select(Question).where(Question.test_id == _ID),
+    "questions_page": lambda: select(Question).where(
+        Question.test_id == _ID,
+        tuple_(Question.created_at, Question.id) > tuple_(_TS, _ID)
+    ).order_by(Question.created_at, Question.id).limit(51),
+    "tests_page": lambda: select(Test).where(
+        Test.deleted_at.is_(None),
+        tuple_(Test.created_at, Test.id) < tuple_(_TS, _ID)
+    ).order_by(Test.created_at.desc(), Test.id.desc()).limit(51),
+    "answers_by_question": lambda: select(Answer).where(Answer.question_id == _ID),
+    "user_material": lambda: select(UserMaterial).where(
+        UserMaterial.user_id == _ID,
+        UserMaterial.material_id == _ID
+    ),
+    "export_user_questions": lambda: select(UserQuestion).where(
+        UserQuestion.answered_at >= _TS
+    ).order_by(UserQuestion.answered_at),
+    "export_test_sessions": lambda: select(UserTestSession).where(
+        UserTestSession.start_time >= _TS
+    ).order_by(UserTestSession.start_time),
+}
+
+
+def explain(connection: Connection, statement) -> str:
+    dialect = connection.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "postgresql":
+        # На пустых/маленьких таблицах планировщик предпочтёт seq scan —
+        # проверяем именно то, что индекс применим к запросу
+        connection.execute(text("SET LOCAL enable_seqscan = off"))
+        rows = connection.execute(text(f"EXPLAIN {sql}")).all()
+        return "\n".join(row[0] for row in rows)
+    rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def uses_index(plan: str) -> bool:
+    markers = ("Index Scan", "Index Only Scan", "Bitmap Index Scan", "USING INDEX", "USING COVERING INDEX")
+    return any(marker in plan for marker in markers)
+
+
+def check_query_plans(engine: Engine) -> List[dict]:
+    results = []
+    for name, build in HOT_QUERIES.items():
+        with engine.connect() as connection:
+            with connection.begin():
+                plan = explain(connection, build())
+        results.append({"query": name, "uses_index": uses_index(plan), "plan": plan})
+    return results
+
+
+if __name__ == "__main__":
+    from server.app.utils.db.engine import engine
+
+    failed = False
+    for result in check_query_plans(engine):
+        status = "OK  " if result["uses_index"] else "SEQ "
+        failed = failed or not result["uses_index"]
+        print(f"{status}{result['query']}")
+        print("    " + result["plan"].replace("\n", "\n    "))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from server.app.utils.cache import TTLCache
+from server.app.utils.db.engine import AsyncSessionLocal, create_async_db_engine, pool_stats
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------
+# Реплики для чтения: список URL через запятую, пустой — все запросы идут в primary
+# ---------------------------------------------------------
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "10"))
+REPLICA_HEALTH_CHECK_TIMEOUT = float(os.getenv("REPLICA_HEALTH_CHECK_TIMEOUT", "2"))
+# Сколько секунд после записи пользователь читает из primary (read-your-writes)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True
+        self.failures = 0
+
+
+class ReplicaRouter:
+    """
+    Раздаёт сессии чтения по репликам round-robin.
+    Упавшие реплики исключаются по результатам health check; если живых нет — читаем из primary.
+    """
+
+    def __init__(self, urls: List[str], primary: async_sessionmaker = AsyncSessionLocal):
+        self.primary = primary
+        self.replicas = [Replica(create_async_db_engine(url)) for url in urls]
+        self._counter = itertools.count()
+
+    def session_factory(self) -> async_sessionmaker:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return self.primary
+        return healthy[next(self._counter) % len(healthy)].session_factory
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as connection:
+                await asyncio.wait_for(connection.execute(text("SELECT 1")), REPLICA_HEALTH_CHECK_TIMEOUT)
+        except Exception:
+            if replica.healthy:
+                logger.warning("Реплика %s недоступна, чтение переключено на остальные", replica.engine.url)
+            replica.healthy = False
+            replica.failures += 1
+            return
+        if not replica.healthy:
+            logger.info("Реплика %s снова доступна", replica.engine.url)
+        replica.healthy = True
+
+    async def check_health(self) -> None:
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def run_periodic_health_checks(self, interval: float = REPLICA_HEALTH_CHECK_SECONDS) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "url": replica.engine.url.render_as_string(hide_password=True),
+                "healthy": replica.healthy,
+                "failures": replica.failures,
+                **pool_stats(replica.engine),
+            }
+            for replica in self.replicas
+        ]
+
+
+class WritePins:
+    """
+    Пользователи, которые недавно что-то записали: их чтения идут в primary,
+    пока реплики не догонят. Хранится в памяти процесса, поэтому при нескольких
+    воркерах закрепление действует в том воркере, который обработал запись.
+    """
+
+    def __init__(
+        self,
+        ttl: float = READ_YOUR_WRITES_SECONDS,
+        maxsize: int = 100_000,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        self._pins = TTLCache(maxsize=maxsize, ttl=ttl, timer=timer)
+
+    def pin(self, user_id: Optional[str]) -> None:
+        if user_id is not None:
+            self._pins.set(user_id, True)
+
+    def is_pinned(self, user_id: Optional[str]) -> bool:
+        return user_id is not None and self._pins.get(user_id) is not None
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_commit(session: Session) -> None:
+    # Отмечаем сессии, которые что-то зафиксировали, — по ним закрепляем пользователя за primary
+    session.info["committed"] = True
+
+
+replica_router = ReplicaRouter(READ_REPLICA_URLS)
+write_pins = WritePins()
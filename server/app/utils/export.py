@@ -0,0 +1,48 @@
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Iterable
+
+from sqlalchemy import Select
+
+from server.app.utils.db.replicas import replica_router
+
+# Сколько строк забирать с сервера за раз (server-side cursor)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _to_text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def ndjson_chunk(rows: Iterable[dict]) -> str:
+    return "".join(json.dumps(dict(row), default=str, ensure_ascii=False) + "\n" for row in rows)
+
+
+def csv_chunk(rows: Iterable[dict], header: Iterable[str] = None) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header is not None:
+        writer.writerow(header)
+    writer.writerows([_to_text(value) for value in row.values()] for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_rows(statement: Select, export_format: str) -> AsyncIterator[str]:
+    """
+    Отдаёт результат запроса порциями по EXPORT_BATCH_SIZE строк.
+    Сессия открывается внутри генератора: она должна жить, пока клиент читает ответ,
+    а не только пока работает обработчик. В памяти одновременно держится одна порция.
+    """
+    async with replica_router.session_factory()() as db:
+        result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        if export_format == "csv":
+            yield csv_chunk([], header=result.keys())
+        async for rows in result.mappings().partitions():
+            yield ndjson_chunk(rows) if export_format == "ndjson" else csv_chunk(rows)
@@ -0,0 +1,41 @@
+"""
+UUIDv7 (RFC 9562): 48 бит Unix-времени в миллисекундах, затем 12-битный счётчик
+и 62 случайных бита. Ключи растут со временем, поэтому новые строки попадают
+в правый край B-дерева, а не в случайные страницы индекса, как uuid4.
+"""
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Монотонный в пределах процесса: внутри одной миллисекунды растёт счётчик,
+    а при его переполнении (или откате часов) время сдвигается вперёд на 1 мс.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            # Старший бит счётчика обнулён — запас на 2048 инкрементов в миллисекунду
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                _last_ms += 1
+                _counter = 0
+        unix_ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (unix_ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76          # версия
+    value |= counter << 64      # rand_a — счётчик
+    value |= 0b10 << 62         # вариант RFC 9562
+    value |= rand_b
+    return uuid.UUID(int=value)
@@ -0,0 +1,76 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# ---------------------------------------------------------
+# Keyset-пагинация по (created_at, id)
+# ---------------------------------------------------------
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", "200"))
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    """ Зависимость для списков: ?cursor=...&limit=... """
+
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(None, description=f"Значение заголовка {NEXT_CURSOR_HEADER} с предыдущей страницы"),
+        limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX, description="Размер страницы")
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    payload = json.dumps([created_at.isoformat(), row_id.hex]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(payload)
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    entity,
+    page: PageParams,
+    response: Response,
+    descending: bool = True
+) -> list:
+    """
+    Возвращает страницу query, упорядоченную по (entity.created_at, entity.id).
+    Следующая страница начинается строго после последней строки текущей, поэтому
+    глубокие страницы стоят столько же, сколько первая (при индексе на (created_at, id)).
+    Курсор следующей страницы — в заголовке X-Next-Cursor; на последней странице его нет.
+    """
+    key = tuple_(entity.created_at, entity.id)
+    if page.cursor:
+        created_at, row_id = decode_cursor(page.cursor)
+        query = query.where(key < tuple_(created_at, row_id) if descending else key > tuple_(created_at, row_id))
+    if descending:
+        query = query.order_by(entity.created_at.desc(), entity.id.desc())
+    else:
+        query = query.order_by(entity.created_at, entity.id)
+
+    # Одна лишняя строка говорит, есть ли следующая страница, без отдельного COUNT
+    rows = (await db.execute(query.limit(page.limit + 1))).scalars().all()
+    items = rows[:page.limit]
+    if len(rows) > page.limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
+    return items
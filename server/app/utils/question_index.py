@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+
+from server.app.utils.db.models import Answer, Question, Test
+from server.app.utils.db.setup import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Индекс обновляют ручки этого процесса; полная пересборка подтягивает изменения из других воркеров
+QUESTION_INDEX_REBUILD_SECONDS = float(os.getenv("QUESTION_INDEX_REBUILD_SECONDS", "300"))
+# Доля триграмм запроса, которая должна найтись в вопросе
+QUESTION_SEARCH_MIN_SIMILARITY = float(os.getenv("QUESTION_SEARCH_MIN_SIMILARITY", "0.3"))
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+
+def trigrams(text: Optional[str]) -> Set[str]:
+    """ Триграммы слов, как в pg_trgm: слово дополняется двумя пробелами слева и одним справа """
+    grams = set()
+    for word in _NON_WORD.sub(" ", (text or "").lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class IndexedQuestion:
+    id: UUID
+    test_id: UUID
+    topic: Optional[str]
+    question_text: str
+    answers: Dict[UUID, str] = field(default_factory=dict)
+
+    def grams(self) -> Set[str]:
+        return trigrams(" ".join([self.question_text, self.topic or "", *self.answers.values()]))
+
+
+@dataclass
+class QuestionMatch:
+    question: IndexedQuestion
+    score: float
+
+
+class QuestionSearchIndex:
+    """
+    Инвертированный индекс триграмм по тексту вопроса, теме и вариантам ответов.
+    Поиск нечёткий (опечатки, части слов) и не обращается к БД.
+    """
+
+    def __init__(self):
+        self._questions: Dict[UUID, IndexedQuestion] = {}
+        self._postings: Dict[str, Set[UUID]] = {}
+        self._grams: Dict[UUID, Set[str]] = {}
+        # Изменения, сделанные, пока пересборка читает БД: replace повторит их поверх нового снимка
+        self._pending: Optional[List[Tuple[Callable, tuple]]] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def _unindex(self, question_id: UUID) -> None:
+        for gram in self._grams.pop(question_id, ()):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(question_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def _index(self, question: IndexedQuestion) -> None:
+        self._unindex(question.id)
+        grams = question.grams()
+        self._grams[question.id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(question.id)
+
+    def _mutate(self, operation: Callable, *args) -> None:
+        with self._lock:
+            operation(*args)
+            if self._pending is not None:
+                self._pending.append((operation, args))
+
+    def _upsert_question(self, question_id: UUID, test_id: UUID, topic: Optional[str], question_text: str) -> None:
+        existing = self._questions.get(question_id)
+        question = IndexedQuestion(
+            question_id, test_id, topic, question_text, existing.answers if existing else {}
+        )
+        self._questions[question_id] = question
+        self._index(question)
+
+    def _remove_question(self, question_id: UUID) -> None:
+        self._questions.pop(question_id, None)
+        self._unindex(question_id)
+
+    def _remove_test(self, test_id: UUID) -> None:
+        for question_id in [q.id for q in self._questions.values() if q.test_id == test_id]:
+            del self._questions[question_id]
+            self._unindex(question_id)
+
+    def _set_answer(self, question_id: UUID, answer_id: UUID, text: str) -> None:
+        question = self._questions.get(question_id)
+        if question is not None:
+            question.answers[answer_id] = text
+            self._index(question)
+
+    def _remove_answer(self, question_id: UUID, answer_id: UUID) -> None:
+        question = self._questions.get(question_id)
+        if question is not None and question.answers.pop(answer_id, None) is not None:
+            self._index(question)
+
+    def upsert_question(self, question_id: UUID, test_id: UUID, topic: Optional[str], question_text: str) -> None:
+        self._mutate(self._upsert_question, question_id, test_id, topic, question_text)
+
+    def remove_question(self, question_id: UUID) -> None:
+        self._mutate(self._remove_question, question_id)
+
+    def remove_test(self, test_id: UUID) -> None:
+        self._mutate(self._remove_test, test_id)
+
+    def set_answer(self, question_id: UUID, answer_id: UUID, text: str) -> None:
+        self._mutate(self._set_answer, question_id, answer_id, text)
+
+    def remove_answer(self, question_id: UUID, answer_id: UUID) -> None:
+        self._mutate(self._remove_answer, question_id, answer_id)
+
+    def begin_rebuild(self) -> None:
+        """ Начинает запоминать изменения: снимок из БД может их не содержать """
+        with self._lock:
+            self._pending = []
+
+    def replace(self, questions: Iterable[IndexedQuestion]) -> None:
+        """
+        Собирает новый индекс целиком и подменяет текущий. Изменения, сделанные после
+        begin_rebuild, повторяются поверх нового индекса под той же блокировкой —
+        иначе правка, попавшая между чтением снимка и подменой, потерялась бы до следующей
+        пересборки. Операции идемпотентны, поэтому уже вошедшие в снимок не мешают.
+        """
+        fresh = QuestionSearchIndex()
+        for question in questions:
+            fresh._questions[question.id] = question
+            fresh._index(question)
+        with self._lock:
+            self._questions, self._postings, self._grams = fresh._questions, fresh._postings, fresh._grams
+            for operation, args in self._pending or ():
+                operation(*args)
+            self._pending = None
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        test_id: Optional[UUID] = None,
+        min_similarity: float = QUESTION_SEARCH_MIN_SIMILARITY
+    ) -> List[QuestionMatch]:
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        with self._lock:
+            hits = Counter()
+            for gram in query_grams:
+                hits.update(self._postings.get(gram, ()))
+            matches = []
+            for question_id, shared in hits.items():
+                score = shared / len(query_grams)
+                question = self._questions[question_id]
+                if score >= min_similarity and (test_id is None or question.test_id == test_id):
+                    matches.append(QuestionMatch(question, round(score, 3)))
+        matches.sort(key=lambda match: (-match.score, match.question.question_text))
+        return matches[:limit]
+
+    async def rebuild(self) -> None:
+        """ Перечитывает вопросы и ответы из БД (двумя запросами) """
+        # До чтения: правки, закоммиченные раньше, уже будут в снимке, остальные попадут в журнал
+        self.begin_rebuild()
+        try:
+            questions = await self._load()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        self.replace(questions.values())
+
+    @staticmethod
+    async def _load() -> Dict[UUID, IndexedQuestion]:
+        async with AsyncSessionLocal() as db:
+            questions = {
+                row.id: IndexedQuestion(row.id, row.test_id, row.topic, row.question_text)
+                for row in await db.execute(
+                    select(Question.id, Question.test_id, Question.topic, Question.question_text)
+                    # Вопросы удалённых тестов остаются в БД до конца purge_test
+                    .join(Test, Test.id == Question.test_id)
+                    .where(Test.deleted_at.is_(None))
+                )
+            }
+            for row in await db.execute(select(Answer.id, Answer.question_id, Answer.text)):
+                question = questions.get(row.question_id)
+                if question is not None:
+                    question.answers[row.id] = row.text
+        return questions
+
+    async def run_periodic_rebuild(self, interval: float = QUESTION_INDEX_REBUILD_SECONDS) -> None:
+        # Первую сборку делает lifespan до приёма запросов
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.rebuild()
+            except Exception:
+                # Оставляем текущий индекс, попробуем на следующем цикле
+                logger.exception("Не удалось пересобрать индекс вопросов")
+
+
+question_index = QuestionSearchIndex()
@@ -0,0 +1,169 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Лимиты на /auth/login: ёмкость корзины и скорость пополнения (попыток в минуту)
+LOGIN_RATE_BACKEND = os.getenv("LOGIN_RATE_BACKEND", "memory")  # memory / redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "20"))
+LOGIN_EMAIL_BURST = int(os.getenv("LOGIN_EMAIL_BURST", "5"))
+LOGIN_EMAIL_PER_MINUTE = float(os.getenv("LOGIN_EMAIL_PER_MINUTE", "5"))
+# Сколько проверок пароля одновременно может идти во всём процессе
+LOGIN_MAX_CONCURRENT_VERIFICATIONS = int(os.getenv("LOGIN_MAX_CONCURRENT_VERIFICATIONS", str((os.cpu_count() or 2) * 2)))
+
+
+class InMemoryRateLimitBackend:
+    """
+    Token bucket в памяти процесса. Подходит для одного инстанса;
+    при нескольких воркерах лимит действует на каждый воркер отдельно.
+    """
+
+    def __init__(self, max_keys: int = 100_000, timer: Callable[[], float] = time.monotonic):
+        self._buckets: dict = {}
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+        self._timer = timer
+
+    async def consume(self, key: str, capacity: int, per_second: float, cost: float = 1) -> Tuple[bool, float]:
+        """ Возвращает (разрешено ли, через сколько секунд повторить) """
+        now = self._timer()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * per_second)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (cost - tokens) / per_second
+            if len(self._buckets) > self._max_keys:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float) -> None:
+        # Выбрасываем корзины, которые давно не трогали (они всё равно уже полные)
+        stale = [key for key, (_, updated_at) in self._buckets.items() if now - updated_at > 3600]
+        for key in stale:
+            del self._buckets[key]
+        while len(self._buckets) > self._max_keys:
+            self._buckets.pop(next(iter(self._buckets)))
+
+
+# Пополнение и списание выполняются одним скриптом, чтобы между инстансами не было гонок
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local per_second = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * per_second)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / per_second
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / per_second) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Token bucket в Redis — общий лимит для всех инстансов приложения.
+    Если Redis недоступен, запрос пропускается (fail open), чтобы не закрыть вход всем.
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self._client = client
+        self._prefix = prefix
+        self._script = client.register_script(_TOKEN_BUCKET_LUA)
+
+    async def consume(self, key: str, capacity: int, per_second: float, cost: float = 1) -> Tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(
+                keys=[self._prefix + key],
+                args=[capacity, per_second, cost]
+            )
+        except Exception:
+            logger.exception("Redis недоступен, лимит на вход не применяется")
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+
+class ConcurrencyLimiter:
+    """ Неблокирующий семафор: если слотов нет, сразу отказываем, а не ставим в очередь """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._in_use >= self.limit:
+                return False
+            self._in_use += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_use -= 1
+
+    @contextmanager
+    def slot(self):
+        """ Использование: with limiter.slot() as acquired: ... """
+        acquired = self.try_acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release()
+
+
+class LoginRateLimiter:
+    """ Лимиты на попытки входа по IP и по email — проверяются до любого хэширования """
+
+    def __init__(self, backend, max_concurrent_verifications: int = LOGIN_MAX_CONCURRENT_VERIFICATIONS):
+        self.backend = backend
+        self.verifications = ConcurrencyLimiter(max_concurrent_verifications)
+
+    async def check(self, ip: Optional[str], email: str) -> Tuple[bool, float]:
+        if ip:
+            allowed, retry_after = await self.backend.consume(
+                f"login:ip:{ip}", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60
+            )
+            if not allowed:
+                return False, retry_after
+        return await self.backend.consume(
+            f"login:email:{email.lower()}", LOGIN_EMAIL_BURST, LOGIN_EMAIL_PER_MINUTE / 60
+        )
+
+
+def retry_after_header(retry_after: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+def create_rate_limit_backend(kind: str = LOGIN_RATE_BACKEND):
+    if kind == "redis":
+        import redis.asyncio as redis_asyncio
+        return RedisRateLimitBackend(redis_asyncio.from_url(REDIS_URL))
+    if kind == "memory":
+        return InMemoryRateLimitBackend()
+    raise ValueError(f"Неизвестный LOGIN_RATE_BACKEND: {kind}")
+
+
+login_rate_limiter = LoginRateLimiter(create_rate_limit_backend())
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from server.app.utils.db.models import RevokedToken
+from server.app.utils.db.setup import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Как часто подтягивать отозванные токены, отозванные в других процессах
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "30"))
+
+
+def _timestamp(moment: datetime) -> float:
+    # SQLite возвращает время без tzinfo, хотя хранит его в UTC
+    return (moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)).timestamp()
+
+
+class RevocationList:
+    """
+    jti отозванных access-токенов в памяти процесса (jti -> момент истечения токена).
+    Проверка — O(1) и без запросов к БД; источник истины — таблица revoked_tokens,
+    из которой словарь периодически пересобирается. Истёкшие токены и так не проходят
+    проверку подписи, поэтому при синхронизации они удаляются и из памяти, и из БД.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal):
+        self.session_factory = session_factory
+        self._jtis: Dict[str, float] = {}
+        # Отозванные локально во время синхронизации — чтобы replace их не потерял
+        self._added_during_sync: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return jti is not None and jti in self._jtis
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        expires = _timestamp(expires_at)
+        with self._lock:
+            self._jtis[jti] = expires
+            self._added_during_sync[jti] = expires
+
+    def replace(self, entries: Iterable[Tuple[str, datetime]]) -> None:
+        fresh = {jti: _timestamp(expires_at) for jti, expires_at in entries}
+        with self._lock:
+            fresh.update(self._added_during_sync)
+            self._jtis = fresh
+            self._added_during_sync = {}
+
+    def prune(self, now: Optional[datetime] = None) -> int:
+        """ Убирает истёкшие jti; возвращает, сколько убрано """
+        moment = _timestamp(now or datetime.now(timezone.utc))
+        with self._lock:
+            alive = {jti: expires for jti, expires in self._jtis.items() if expires > moment}
+            removed = len(self._jtis) - len(alive)
+            self._jtis = alive
+        return removed
+
+    def __len__(self) -> int:
+        return len(self._jtis)
+
+    async def sync(self) -> None:
+        """ Удаляет истёкшие строки revoked_tokens и перечитывает оставшиеся """
+        with self._lock:
+            self._added_during_sync = {}
+        now = datetime.now(timezone.utc)
+        async with self.session_factory() as db:
+            # Индекс по expires_at; из нескольких процессов удаление идемпотентно
+            await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            await db.commit()
+            result = await db.execute(
+                select(RevokedToken.jti, RevokedToken.expires_at).where(RevokedToken.expires_at > now)
+            )
+            self.replace(result.tuples().all())
+        self.prune(now)
+
+    async def run_periodic_sync(self, interval: float = REVOCATION_SYNC_SECONDS) -> None:
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                # Оставляем предыдущее множество, попробуем на следующем цикле
+                logger.exception("Не удалось синхронизировать отозванные токены")
+            await asyncio.sleep(interval)
+
+
+revocation_list = RevocationList()
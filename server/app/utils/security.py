@@ -1,25 +1,112 @@
-from datetime import datetime, timedelta
-from typing import Optional
+import asyncio
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
 from jose import jwt
 from passlib.context import CryptContext
 
 SECRET_KEY = "supersecretkey"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# Access-токен короткоживущий, продлевается через /auth/refresh
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+ADMIN_EMAIL = "admin@example.com"
+
+# Пул процессов для bcrypt: 0 воркеров — считать в стандартном пуле потоков
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 2)))
+# Сколько задач может ждать свободного воркера, прежде чем мы начнём отказывать
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "64"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_lock = threading.Lock()
+_hash_in_flight = 0
+
+
+class HashingOverloaded(Exception):
+    """ Очередь на хэширование паролей заполнена """
+
+
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+
+def _get_hash_executor() -> Optional[ProcessPoolExecutor]:
+    global _hash_executor
+    if HASH_POOL_WORKERS <= 0:
+        return None
+    with _hash_lock:
+        if _hash_executor is None:
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=HASH_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _hash_executor
+
+
+async def _run_hashing(func, *args):
+    global _hash_in_flight
+    with _hash_lock:
+        if _hash_in_flight >= max(HASH_POOL_WORKERS, 1) + HASH_QUEUE_SIZE:
+            raise HashingOverloaded()
+        _hash_in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_executor(), func, *args)
+    finally:
+        with _hash_lock:
+            _hash_in_flight -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """ bcrypt в отдельном процессе: не держит поток воркера и не блокирует event loop """
+    return await _run_hashing(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_executor
+    with _hash_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=False, cancel_futures=True)
+            _hash_executor = None
+
+
+def role_for_email(email: str) -> str:
+    """ Роль, которая записывается в токен при входе """
+    return "admin" if email == ADMIN_EMAIL else "user"
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.setdefault("type", "access")
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def create_refresh_token(user_id: uuid.UUID) -> Tuple[str, str, datetime]:
+    """ Возвращает (токен, jti, время истечения); в БД сохраняется только jti """
+    jti = uuid.uuid4().hex
+    expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    token = jwt.encode(
+        {"uid": str(user_id), "jti": jti, "type": "refresh", "exp": expires_at},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    return token, jti, expires_at
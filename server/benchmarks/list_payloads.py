@@ -0,0 +1,113 @@
+"""
+Размер и время отдачи страницы списка: полная модель (с content/description)
+против сводной (load_only + MaterialSummary/TestSummary).
+
+В рабочие таблицы добавляются rows материалов и тестов с текстом размером body_kb
+(помечены заголовком bench-list-payloads), в конце они удаляются.
+Для каждого варианта выводится размер JSON одной страницы и p50/p99 времени
+«запрос + сериализация».
+
+Запуск (DATABASE_URL должен указывать на рабочую БД; для быстрого прогона без
+сервера подойдёт встроенный режим: DATABASE_URL=sqlite:///bench.db):
+    python -m server.benchmarks.list_payloads --rows 2000 --body-kb 20 --limit 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import load_only
+
+from server.app.schemas.material import MaterialResponse, MaterialSummary
+from server.app.schemas.test import TestResponse, TestSummary
+from server.app.utils.db.engine import DATABASE_URL, AsyncSessionLocal, async_engine, is_sqlite
+from server.app.utils.db.models import Base, Material, Test, utcnow
+from server.benchmarks.sync_vs_async import percentile
+
+BENCH_TITLE = "bench-list-payloads"
+
+VARIANTS = (
+    ("materials full", lambda: select(Material), List[MaterialResponse], Material),
+    ("materials summary", lambda: select(Material).options(load_only(
+        Material.id, Material.title, Material.subtitle, Material.level, Material.like_count,
+        Material.created_at, Material.updated_at
+    )), List[MaterialSummary], Material),
+    ("tests full", lambda: select(Test), List[TestResponse], Test),
+    ("tests summary", lambda: select(Test).options(load_only(
+        Test.id, Test.title, Test.created_at, Test.updated_at
+    )), List[TestSummary], Test),
+)
+
+
+async def seed(rows, body_kb):
+    body = ("Lorem ipsum dolor sit amet. " * (body_kb * 1024 // 28 + 1))[:body_kb * 1024]
+    now = utcnow()
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(Material), [
+            {"title": BENCH_TITLE, "subtitle": f"#{index}", "level": "middle", "content": body,
+             "created_at": now, "updated_at": now}
+            for index in range(rows)
+        ])
+        await db.execute(insert(Test), [
+            {"title": BENCH_TITLE, "description": body, "created_at": now, "updated_at": now}
+            for _ in range(rows)
+        ])
+        await db.commit()
+
+
+async def cleanup():
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Material).where(Material.title == BENCH_TITLE))
+        await db.execute(delete(Test).where(Test.title == BENCH_TITLE))
+        await db.commit()
+
+
+async def measure(build, response_type, entity, limit, repeats):
+    adapter = TypeAdapter(response_type)
+    latencies, size = [], 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            query = build().where(entity.title == BENCH_TITLE)
+            items = (await db.execute(
+                query.order_by(entity.created_at.desc(), entity.id.desc()).limit(limit)
+            )).scalars().all()
+            payload = adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+        latencies.append((time.perf_counter() - started) * 1000)
+        size = len(payload)
+    return size, latencies
+
+
+async def run(rows, body_kb, limit, repeats):
+    if is_sqlite(DATABASE_URL):
+        async with async_engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+    print(f"БД: {DATABASE_URL.split('@')[-1]}, строк: {rows}, текст: {body_kb} КБ, страница: {limit}")
+    await seed(rows, body_kb)
+    try:
+        for name, build, response_type, entity in VARIANTS:
+            size, latencies = await measure(build, response_type, entity, limit, repeats)
+            print(
+                f"{name:>17}: {size / 1024:9.1f} КБ/страница, "
+                f"p50={statistics.median(latencies):.1f} мс, p99={percentile(latencies, 99):.1f} мс"
+            )
+    finally:
+        await cleanup()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--body-kb", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.body_kb, args.limit, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
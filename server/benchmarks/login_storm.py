@@ -0,0 +1,99 @@
+"""
+Нагрузочный тест: шторм логинов и задержка остальных ручек.
+
+Запускает concurrency параллельных клиентов, которые непрерывно логинятся
+(по кругу на accounts аккаунтах), и одновременно опрашивает дешёвую ручку (GET /) —
+выводит логины/сек и p50/p99 задержки "соседних" запросов.
+
+Все запросы идут с одного IP, поэтому с лимитами по умолчанию (LOGIN_IP_BURST,
+LOGIN_EMAIL_BURST) почти все логины получат 429 до хэширования и замер покажет
+работу лимитера, а не bcrypt. Для замера хэширования сервер поднимается с
+поднятыми лимитами; ограничение одновременных проверок (LOGIN_MAX_CONCURRENT_VERIFICATIONS)
+при этом остаётся в силе:
+    LOGIN_IP_BURST=1000000 LOGIN_IP_PER_MINUTE=1000000 \
+    LOGIN_EMAIL_BURST=1000000 LOGIN_EMAIL_PER_MINUTE=1000000 \
+    uvicorn server.app.main:app
+
+Запуск (сервер должен быть поднят):
+    python -m server.benchmarks.login_storm --base-url http://127.0.0.1:8000 --duration 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def login_worker(client, credentials, deadline, counters):
+    while time.monotonic() < deadline:
+        response = await client.post("/auth/login", json=credentials)
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+
+async def probe_worker(client, path, deadline, latencies, interval):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        await client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+
+
+async def run(base_url, concurrency, accounts, duration, probe_path, probe_interval):
+    prefix = uuid.uuid4().hex[:8]
+    accounts = [
+        {"email": f"bench-{prefix}-{index}@example.com", "password": "bench-password"}
+        for index in range(accounts)
+    ]
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        for credentials in accounts:
+            await client.post("/auth/register", json={**credentials, "name": "Bench"})
+
+        # Базовая задержка без нагрузки
+        baseline = []
+        await probe_worker(client, probe_path, time.monotonic() + 2, baseline, probe_interval)
+
+        counters = {}
+        latencies = []
+        deadline = time.monotonic() + duration
+        started = time.monotonic()
+        await asyncio.gather(
+            probe_worker(client, probe_path, deadline, latencies, probe_interval),
+            *(login_worker(client, accounts[index % len(accounts)], deadline, counters) for index in range(concurrency)),
+        )
+        elapsed = time.monotonic() - started
+
+    successful = counters.get(200, 0)
+    total = sum(counters.values())
+    print(f"логинов всего: {total}, по статусам: {counters}")
+    if total and counters.get(429, 0) > total / 2:
+        print("внимание: больше половины логинов отклонены с 429 — подняты ли лимиты на сервере (см. описание)?")
+    print(f"успешных логинов/сек: {successful / elapsed:.1f}")
+    print(f"{probe_path} без нагрузки: p50={statistics.median(baseline):.1f} мс, p99={percentile(baseline, 99):.1f} мс")
+    print(f"{probe_path} под штормом: p50={statistics.median(latencies):.1f} мс, p99={percentile(latencies, 99):.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--accounts", type=int, default=50, help="Сколько аккаунтов делят между собой клиенты")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--probe-path", default="/")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.concurrency, args.accounts, args.duration, args.probe_path, args.probe_interval))
+
+
+if __name__ == "__main__":
+    main()
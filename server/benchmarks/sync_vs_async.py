@@ -0,0 +1,122 @@
+"""
+Сравнение пропускной способности синхронного (Session + threadpool)
+и асинхронного (AsyncSession) стека на одном и том же запросе к БД.
+
+Оба варианта поднимаются как ASGI-приложения в одном процессе и нагружаются
+clients параллельными клиентами; выводятся запросы/сек и p50/p99 задержки.
+Синхронный вариант упирается в размер пула потоков anyio (по умолчанию 40).
+
+Запуск (DATABASE_URL должен указывать на рабочую БД; для быстрого прогона без
+сервера подойдёт встроенный режим: DATABASE_URL=sqlite:///bench.db):
+    python -m server.benchmarks.sync_vs_async --clients 500 --duration 15
+    python -m server.benchmarks.sync_vs_async --query "SELECT pg_sleep(0.01)"
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+
+from server.app.utils.db.engine import DATABASE_URL, create_async_db_engine, create_db_engine
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def build_sync_app(query, pool_size):
+    engine = create_db_engine(DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    session_factory = sessionmaker(bind=engine)
+    app = FastAPI()
+
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/query")
+    def run_query(db=Depends(get_db)):
+        db.execute(text(query))
+        return {"ok": True}
+
+    return app, engine.dispose
+
+
+def build_async_app(query, pool_size):
+    engine = create_async_db_engine(DATABASE_URL, pool_size=pool_size, max_overflow=0)
+    session_factory = async_sessionmaker(engine)
+    app = FastAPI()
+
+    async def get_db():
+        async with session_factory() as db:
+            yield db
+
+    @app.get("/query")
+    async def run_query(db=Depends(get_db)):
+        await db.execute(text(query))
+        return {"ok": True}
+
+    async def dispose():
+        await engine.dispose()
+
+    return app, dispose
+
+
+async def load(app, clients, duration):
+    latencies = []
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        deadline = time.monotonic() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = await client.get("/query")
+                if response.status_code != 200:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.monotonic() - started
+    return len(latencies) / elapsed, latencies, errors
+
+
+async def run(clients, duration, query, pool_size):
+    print(f"БД: {DATABASE_URL.split('@')[-1]}, клиентов: {clients}, запрос: {query}")
+    for name, builder in (("sync", build_sync_app), ("async", build_async_app)):
+        app, dispose = builder(query, pool_size)
+        rps, latencies, errors = await load(app, clients, duration)
+        result = dispose()
+        if asyncio.iscoroutine(result):
+            await result
+        print(
+            f"{name:>5}: {rps:8.1f} запросов/сек, "
+            f"p50={statistics.median(latencies):.1f} мс, p99={percentile(latencies, 99):.1f} мс, ошибок: {errors}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--query", default="SELECT 1")
+    parser.add_argument("--pool-size", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.duration, args.query, args.pool_size))
+
+
+if __name__ == "__main__":
+    main()
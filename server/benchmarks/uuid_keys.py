@@ -0,0 +1,93 @@
+"""
+Вставка строк с первичным ключом uuid4 и uuid7: скорость вставки и размер индекса PK.
+
+Для каждого генератора создаётся отдельная таблица той же формы, что user_questions,
+в неё пачками вставляются rows строк; выводятся строки/сек и размер индекса
+первичного ключа (в PostgreSQL — pg_relation_size, в SQLite — через dbstat).
+
+Запуск (DATABASE_URL должен указывать на рабочую БД; для быстрого прогона без
+сервера подойдёт встроенный режим: DATABASE_URL=sqlite:///bench.db):
+    python -m server.benchmarks.uuid_keys --rows 1000000 --batch 1000
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import Boolean, Column, DateTime, MetaData, Table, Uuid, insert, text
+from sqlalchemy.exc import OperationalError
+
+from server.app.utils.db.engine import DATABASE_URL, create_db_engine
+from server.app.utils.ids import uuid7
+
+GENERATORS = (("uuid4", uuid.uuid4), ("uuid7", uuid7))
+
+
+def build_table(metadata, name):
+    return Table(
+        name, metadata,
+        Column("id", Uuid, primary_key=True),
+        Column("user_id", Uuid, nullable=False),
+        Column("question_id", Uuid, nullable=False),
+        Column("is_correct", Boolean),
+        Column("answered_at", DateTime(timezone=True)),
+    )
+
+
+def index_size(connection, table) -> str:
+    if connection.dialect.name == "postgresql":
+        size = connection.execute(text(
+            "SELECT pg_relation_size(i.indexrelid) FROM pg_index i "
+            "WHERE i.indrelid = CAST(:table AS regclass) AND i.indisprimary"
+        ), {"table": table.name}).scalar()
+    else:
+        # Uuid в SQLite хранится как CHAR(32), PK — отдельный индекс sqlite_autoindex_*
+        try:
+            size = connection.execute(text(
+                "SELECT sum(pgsize) FROM dbstat WHERE name LIKE :pattern"
+            ), {"pattern": f"sqlite_autoindex_{table.name}_%"}).scalar()
+        except OperationalError:
+            return "н/д (SQLite собран без dbstat)"
+    return f"{size / 1024 / 1024:.1f} МБ"
+
+
+def run(rows, batch):
+    engine = create_db_engine(DATABASE_URL)
+    metadata = MetaData()
+    tables = {name: build_table(metadata, f"bench_keys_{name}") for name, _ in GENERATORS}
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    print(f"БД: {DATABASE_URL.split('@')[-1]}, строк: {rows}, пачка: {batch}")
+    try:
+        for name, generate in GENERATORS:
+            table = tables[name]
+            user_id, question_id = uuid.uuid4(), uuid.uuid4()
+            started = time.perf_counter()
+            for offset in range(0, rows, batch):
+                now = datetime.now(timezone.utc)
+                chunk = [
+                    {"id": generate(), "user_id": user_id, "question_id": question_id,
+                     "is_correct": True, "answered_at": now}
+                    for _ in range(min(batch, rows - offset))
+                ]
+                with engine.begin() as connection:
+                    connection.execute(insert(table), chunk)
+            elapsed = time.perf_counter() - started
+            with engine.connect() as connection:
+                size = index_size(connection, table)
+            print(f"{name}: {rows / elapsed:10.1f} строк/сек, индекс PK: {size}")
+    finally:
+        metadata.drop_all(engine)
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.rows, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Модули приложения читают настройки при импорте, поэтому задаём их до импорта тестов.
+# Встроенный режим на SQLite-файле: синхронный и асинхронный движки видят одну и ту же БД.
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'interviewer-test.db')}")
+os.environ.setdefault("TOGETHER_API_KEY", "test-key")
+os.environ.setdefault("SQL_INSTRUMENTATION", "true")
@@ -1,17 +1,26 @@
+import json
 import sys
-import os
 from pathlib import Path
+from uuid import UUID
 
 import pytest
 from fastapi.testclient import TestClient
 from server.app.main import app
-from server.app.utils.db.models import SessionLocal, Base, engine, User, Task
+from server.app.utils import rate_limit
+from server.app.utils.db.models import (
+    Base, engine, utcnow, ChatMessage, Question, Test as QuizTest, UserMaterial, UserQuestion, UserTestSession
+)
+from server.app.utils.db.instrumentation import query_budget
+from server.app.utils.db import purge
+from server.app.routers import tests as tests_router_module
+from server.app.utils.security import ADMIN_EMAIL
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
 # Добавляем корень проекта в sys.path
 sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
 
-# Создаем тестовую базу данных
+# Тестовая база — SQLite-файл из conftest.py, внешний Postgres не нужен
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 @pytest.fixture(scope="function")
@@ -26,13 +35,23 @@ def test_db():
 
 
 @pytest.fixture(scope="function")
-def client():
-    return TestClient(app)
+def client(test_db, monkeypatch):
+    # Лимиты на вход не должны переноситься между тестами
+    monkeypatch.setattr(rate_limit.login_rate_limiter, "backend", rate_limit.InMemoryRateLimitBackend())
+    with TestClient(app) as test_client:
+        yield test_client
 
 
-# Тест: Создание пользователя
+def register_and_login(client, email, password="testpassword"):
+    client.post("/auth/register", json={"email": email, "password": password, "name": "Test User"})
+    response = client.post("/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+# Тест: Регистрация пользователя
 def test_create_user(client):
-    response = client.post("/users/", json={
+    response = client.post("/auth/register", json={
         "email": "testuser@example.com",
         "password": "testpassword",
         "name": "Test User"
@@ -40,44 +59,490 @@ def test_create_user(client):
     assert response.status_code == 200
     assert response.json()["email"] == "testuser@example.com"
 
+    headers = register_and_login(client, "testuser@example.com")
+    me = client.get("/users/me", headers=headers)
+    assert me.status_code == 200
+    assert me.json()["name"] == "Test User"
 
-# Тест: Получение списка пользователей
+
+# Тест: Получение списка пользователей (только админ)
 def test_read_users(client):
-    response = client.get("/users/")
+    user_headers = register_and_login(client, "testuser@example.com")
+    assert client.get("/users/", headers=user_headers).status_code == 403
+
+    admin_headers = register_and_login(client, ADMIN_EMAIL)
+    response = client.get("/users/", headers=admin_headers)
     assert response.status_code == 200
     assert isinstance(response.json(), list)
+    assert len(response.json()) == 2
 
 
-# Тест: Создание задачи
-def test_create_task(client):
-    response = client.post("/tasks/", json={
+# Тест: Создание теста
+def test_create_test(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    response = client.post("/tests/", headers=headers, json={
         "title": "Solve Algorithm",
-        "description": "Write a solution for the given problem",
-        "difficulty": "Medium"
+        "description": "Write a solution for the given problem"
     })
     assert response.status_code == 200
     assert response.json()["title"] == "Solve Algorithm"
 
 
-# Тест: Получение списка задач
-def test_read_tasks(client):
-    response = client.get("/tasks/")
+# Тест: Получение списка тестов
+def test_read_tests(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    client.post("/tests/", headers=headers, json={"title": "Python basics"})
+
+    response = client.get("/tests/", headers=headers)
     assert response.status_code == 200
-    assert isinstance(response.json(), list)
+    assert [test["title"] for test in response.json()] == ["Python basics"]
 
 
-# Тест: Удаление задачи
-def test_delete_task(client):
-    task_response = client.post("/tasks/", json={
-        "title": "Task to Delete",
-        "description": "This task will be deleted",
-        "difficulty": "Easy"
+# Тест: Удаление теста
+def test_delete_test(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    test_response = client.post("/tests/", headers=headers, json={
+        "title": "Test to Delete",
+        "description": "This test will be deleted"
     })
-    task_id = task_response.json()["id"]
+    test_id = test_response.json()["id"]
 
-    delete_response = client.delete(f"/tasks/{task_id}")
+    delete_response = client.delete(f"/tests/{test_id}", headers=headers)
     assert delete_response.status_code == 200
-    assert delete_response.json()["detail"] == "Task deleted"
+    assert client.get(f"/tests/{test_id}", headers=headers).status_code == 404
+
+
+def seed_completed_sessions(test_db, client, users=5):
+    """ Пользователи с завершённой попыткой теста и одним правильным ответом """
+    headers, user_ids = [], []
+    for index in range(users):
+        user_headers = register_and_login(client, f"user{index}@example.com")
+        user_ids.append(UUID(client.get("/users/me", headers=user_headers).json()["id"]))
+        headers.append(user_headers)
+
+    test = QuizTest(title="Budget")
+    question = Question(test=test, question_text="Q?")
+    test_db.add_all([test, question])
+    test_db.flush()
+    for user_id in user_ids:
+        session = UserTestSession(
+            user_id=user_id, test_id=test.id, start_time=utcnow(), is_completed=True, total_time_seconds=60,
+            answered_count=1, correct_count=1
+        )
+        test_db.add_all([session, UserQuestion(user_id=user_id, question=question, session=session, is_correct=True)])
+    test_db.commit()
+    return headers
+
+
+# Тест: лидерборд выполняет фиксированное число запросов независимо от числа пользователей
+def test_leaderboard_query_budget(client, test_db):
+    headers = seed_completed_sessions(test_db, client)
+
+    with query_budget(1):
+        response = client.get("/leaderboard", headers=headers[0])
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert all(row["total_correct_answers"] == 1 for row in response.json())
+    assert response.headers["X-DB-Queries"] == "1"
+
+
+# Тест: история попыток пользователя не делает запрос на каждую сессию
+def test_user_sessions_query_budget(client, test_db):
+    headers = seed_completed_sessions(test_db, client, users=1)
+
+    with query_budget(2):
+        response = client.get("/users/me/sessions", headers=headers[0])
+    assert response.json() == [{"correct_answers": 1, "incorrect_answers": 0, "duration": 60}]
+
+
+# Тест: статистика по темам считается одним агрегатом в БД
+def test_user_questions_stats_query_budget(client, test_db):
+    headers = seed_completed_sessions(test_db, client, users=1)
+
+    with query_budget(1):
+        response = client.get("/users/me/questions/stats", headers=headers[0])
+    assert response.json() == {
+        "total_correct_answers": 1,
+        "total_wrong_answers": 0,
+        "by_topic": {"No Topic": {"correct": 1, "wrong": 0}}
+    }
+
+
+# Тест: импорт теста целиком — фиксированное число запросов при любом числе вопросов
+def test_import_test(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    document = {
+        "title": "Swift",
+        "questions": [
+            {
+                "topic": "Основы",
+                "question_text": f"Вопрос {index}",
+                "answers": [{"text": "Да", "is_correct": True}, {"text": "Нет", "is_correct": False}]
+            }
+            for index in range(50)
+        ]
+    }
+
+    with query_budget(4):
+        response = client.post("/tests/import", headers=headers, json=document)
+    assert response.status_code == 200
+    assert response.json()["questions_count"] == 50
+    assert response.json()["answers_count"] == 100
+
+    questions = client.get(f"/tests/{response.json()['id']}/questions", headers=headers).json()
+    assert len(questions) == 50
+    answers = client.get(f"/questions/{questions[0]['id']}/answers", headers=headers).json()
+    assert sorted(answer["is_correct"] for answer in answers) == [False, True]
+
+
+# Тест: импорт принимает формат /ai/generate-test и отклоняет вопросы без правильного ответа
+def test_import_generated_test(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    generated = [{
+        "id": "q1",
+        "topic": "Основы Swift",
+        "questionText": "Что такое optional?",
+        "answers": [{"text": "Тип", "isCorrect": True}, {"text": "Цикл", "isCorrect": False}],
+        "explanation": "Optional хранит значение или nil"
+    }]
+
+    response = client.post("/tests/import", headers=headers, json=generated)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Основы Swift"
+
+    user_headers = register_and_login(client, "testuser@example.com")
+    assert client.post("/tests/import", headers=user_headers, json=generated).status_code == 403
+
+    generated[0]["answers"][0]["isCorrect"] = False
+    assert client.post("/tests/import", headers=headers, json=generated).status_code == 422
+
+    # Голый массив ограничен так же, как документ: 422, а не 500
+    generated[0]["answers"][0]["isCorrect"] = True
+    assert client.post("/tests/import", headers=headers, json=generated * 1001).status_code == 422
+    assert client.post("/tests/import", headers=headers, json=[]).status_code == 422
+
+
+# Тест: потоковая выгрузка ответов в NDJSON и CSV с фильтрами
+def test_export_user_questions(client, test_db):
+    headers = seed_completed_sessions(test_db, client, users=3)
+    admin_headers = register_and_login(client, ADMIN_EMAIL)
+    user_id = client.get("/users/me", headers=headers[0]).json()["id"]
+
+    assert client.get("/exports/user-questions", headers=headers[0]).status_code == 403
+
+    response = client.get("/exports/user-questions", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 3 and all(row["is_correct"] for row in rows)
+
+    response = client.get("/exports/user-questions", headers=admin_headers, params={"format": "csv", "user_id": user_id})
+    lines = response.text.splitlines()
+    assert lines[0].split(",") == [
+        "id", "user_id", "session_id", "test_id", "question_id", "selected_answer_id", "is_correct", "answered_at"
+    ]
+    assert len(lines) == 2 and UUID(lines[1].split(",")[1]) == UUID(user_id)
+
+    response = client.get("/exports/test-sessions", headers=admin_headers, params={"since": "2100-01-01T00:00:00"})
+    assert response.text == ""
+
+
+# Тест: keyset-пагинация проходит все строки без пропусков и повторов, курсор — в заголовке
+def test_keyset_pagination(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    document = {
+        "title": "Paged",
+        "questions": [
+            {"question_text": f"Вопрос {index}", "answers": [{"text": "Да", "is_correct": True}]}
+            for index in range(7)
+        ]
+    }
+    test_id = client.post("/tests/import", headers=headers, json=document).json()["id"]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/tests/{test_id}/questions", headers=headers, params=params)
+        assert response.status_code == 200
+        seen.extend(question["question_text"] for question in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [f"Вопрос {index}" for index in range(7)]
+
+    assert client.get("/tests/", headers=headers, params={"limit": 1000}).status_code == 422
+    assert client.get("/tests/", headers=headers, params={"cursor": "garbage"}).status_code == 400
+
+
+# Тест: удаление пользователя и теста с историей — каскадом и порциями
+def test_delete_with_history(client, test_db, monkeypatch):
+    monkeypatch.setattr(purge, "PURGE_CHUNK_SIZE", 2)
+    monkeypatch.setattr(purge, "PURGE_CHUNK_PAUSE_SECONDS", 0)
+    headers = seed_completed_sessions(test_db, client, users=3)
+    admin_headers = register_and_login(client, ADMIN_EMAIL)
+    user_id = UUID(client.get("/users/me", headers=headers[0]).json()["id"])
+    test_db.add_all([ChatMessage(user_id=user_id, message_text=f"Сообщение {index}") for index in range(5)])
+    test_db.commit()
+
+    assert client.delete("/users/me", headers=headers[0]).status_code == 200
+    assert client.get(f"/users/{user_id}").status_code == 404
+    assert test_db.query(ChatMessage).count() == 0
+    assert test_db.query(UserQuestion).filter_by(user_id=user_id).count() == 0
+    assert test_db.query(UserTestSession).count() == 2
+
+    test_id = test_db.query(QuizTest.id).scalar()
+    assert client.delete(f"/tests/{test_id}", headers=admin_headers).status_code == 200
+    assert test_db.query(Question).count() == 0
+    assert test_db.query(UserQuestion).count() == 0
+    assert test_db.query(UserTestSession).count() == 0
+
+
+# Тест: удалённый тест пропадает из API сразу, прерванное фоновое удаление дочищается
+def test_delete_test_marks_deleted(client, test_db, monkeypatch):
+    async def interrupted(test_id):
+        pass
+
+    monkeypatch.setattr(tests_router_module, "purge_test", interrupted)
+    headers = register_and_login(client, ADMIN_EMAIL)
+    document = {"title": "Gone", "questions": [{"question_text": "Q?", "answers": [{"text": "A", "is_correct": True}]}]}
+    test_id = client.post("/tests/import", headers=headers, json=document).json()["id"]
+
+    assert client.delete(f"/tests/{test_id}", headers=headers).status_code == 200
+    assert client.get(f"/tests/{test_id}", headers=headers).status_code == 404
+    assert client.get(f"/tests/{test_id}/questions", headers=headers).status_code == 404
+    assert client.get("/tests/", headers=headers).json() == []
+    assert client.post(f"/tests/{test_id}/start", headers=headers).status_code == 404
+    assert client.delete(f"/tests/{test_id}", headers=headers).status_code == 404
+    assert test_db.query(QuizTest).one().deleted_at is not None
+
+    client.portal.call(purge.resume_test_purges)
+    test_db.expire_all()
+    assert test_db.query(QuizTest).count() == 0
+    assert test_db.query(Question).count() == 0
+
+
+# Тест: счётчики попытки учитывают смену ответа и не переносят ответы прошлой попытки
+def test_session_score_counters(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    document = {
+        "title": "Counters",
+        "questions": [
+            {"question_text": f"Вопрос {index}", "answers": [{"text": "Да", "is_correct": True}, {"text": "Нет"}]}
+            for index in range(2)
+        ]
+    }
+    test_id = client.post("/tests/import", headers=headers, json=document).json()["id"]
+    questions = client.get(f"/tests/{test_id}/questions", headers=headers).json()
+    answers = {
+        question["id"]: {
+            answer["is_correct"]: answer["id"]
+            for answer in client.get(f"/questions/{question['id']}/answers", headers=headers).json()
+        }
+        for question in questions
+    }
+
+    def answer(question, correct):
+        url = f"/tests/{test_id}/questions/{question['id']}/answer"
+        response = client.post(url, headers=headers, json={"selected_answer_id": answers[question["id"]][correct]})
+        assert response.status_code == 200
+
+    client.post(f"/tests/{test_id}/start", headers=headers)
+    answer(questions[0], False)
+    answer(questions[0], True)
+    answer(questions[1], False)
+    finished = client.post(f"/tests/{test_id}/finish", headers=headers).json()
+    assert (finished["correct_answers_count"], finished["wrong_answers_count"]) == (1, 1)
+
+    session_id = client.post(f"/tests/{test_id}/start", headers=headers).json()["session_id"]
+    answer(questions[1], True)
+    stats = client.get(f"/tests/{test_id}/stats/me", headers=headers).json()
+    assert (stats["correct_answers_count"], stats["wrong_answers_count"]) == (1, 0)
+
+    # Повторная попытка не перезаписывает ответы первой; разбор — в порядке вопросов
+    review = client.get(f"/sessions/{finished['session_id']}/answers", headers=headers).json()
+    assert [(row["question_id"], row["is_correct"]) for row in review] == [
+        (questions[0]["id"], True), (questions[1]["id"], False)
+    ]
+    review = client.get(f"/sessions/{session_id}/answers", headers=headers).json()
+    assert [(row["question_id"], row["is_correct"]) for row in review] == [(questions[1]["id"], True)]
+
+    stats = client.get(f"/tests/{test_id}/stats", headers=headers).json()
+    assert stats["total_users_attempted"] == 1 and stats["avg_correct_answers"] == 1.0
+
+    # Средние — на попытку: пересдача не раздувает числитель при том же числе пользователей
+    client.post(f"/tests/{test_id}/finish", headers=headers)
+    stats = client.get(f"/tests/{test_id}/stats", headers=headers).json()
+    assert stats["total_users_attempted"] == 1
+    assert (stats["avg_correct_answers"], stats["avg_wrong_answers"]) == (1.0, 0.5)
+
+
+# Тест: многократная смена одного ответа не сдвигает счётчики попытки
+def test_changed_answer_keeps_counters(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    document = {"title": "Change", "questions": [
+        {"question_text": "Вопрос", "answers": [{"text": "Да", "is_correct": True}, {"text": "Нет"}]}
+    ]}
+    test_id = client.post("/tests/import", headers=headers, json=document).json()["id"]
+    question_id = client.get(f"/tests/{test_id}/questions", headers=headers).json()[0]["id"]
+    answers = {
+        answer["is_correct"]: answer["id"]
+        for answer in client.get(f"/questions/{question_id}/answers", headers=headers).json()
+    }
+
+    client.post(f"/tests/{test_id}/start", headers=headers)
+    for correct in (False, True, True, False, True):
+        response = client.post(
+            f"/tests/{test_id}/questions/{question_id}/answer", headers=headers,
+            json={"selected_answer_id": answers[correct]}
+        )
+        assert response.status_code == 200 and response.json()["is_correct"] is correct
+
+    stats = client.get(f"/tests/{test_id}/stats/me", headers=headers).json()
+    assert (stats["correct_answers_count"], stats["wrong_answers_count"]) == (1, 0)
+    finished = client.post(f"/tests/{test_id}/finish", headers=headers).json()
+    assert (finished["correct_answers_count"], finished["wrong_answers_count"]) == (1, 0)
+
+
+# Тест: повторный старт не создаёт вторую открытую попытку, resume возвращает текущую
+def test_start_test_once(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    test_id = client.post("/tests/", headers=headers, json={"title": "Start"}).json()["id"]
+
+    started = client.post(f"/tests/{test_id}/start", headers=headers)
+    assert started.status_code == 200 and started.json()["resumed"] is False
+    assert client.post(f"/tests/{test_id}/start", headers=headers).status_code == 400
+
+    resumed = client.post(f"/tests/{test_id}/start", headers=headers, params={"resume": True}).json()
+    assert resumed["session_id"] == started.json()["session_id"] and resumed["resumed"] is True
+
+    assert client.post(f"/tests/{UUID(int=1)}/start", headers=headers).status_code == 404
+
+
+# Тест: токен удалённого пользователя ещё действует — внешний ключ на users даёт 401, а не 404
+def test_start_test_deleted_user(client):
+    admin = register_and_login(client, ADMIN_EMAIL)
+    test_id = client.post("/tests/", headers=admin, json={"title": "Orphan"}).json()["id"]
+    headers = register_and_login(client, "gone@example.com")
+    assert client.delete("/users/me", headers=headers).status_code == 200
+
+    assert client.post(f"/tests/{test_id}/start", headers=headers).status_code == 401
+
+
+# Тест: поиск материалов смотрит и в текст, фрагмент выделяет совпадение
+def test_search_materials(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    client.post("/materials/", headers=headers, json={"title": "Swift", "content": "Протоколы и generics в Swift"})
+    client.post("/materials/", headers=headers, json={"title": "Kotlin", "content": "Корутины"})
+
+    listed = client.get("/materials/", headers=headers, params={"search": "generics"}).json()
+    assert [material["title"] for material in listed] == ["Swift"]
+    # Список отдаёт сводку, полный текст — только карточка материала
+    assert "content" not in listed[0]
+    assert client.get(f"/materials/{listed[0]['id']}", headers=headers).json()["content"].startswith("Протоколы")
+
+    found = client.get("/materials/search", headers=headers, params={"q": "generics"}).json()
+    assert [material["title"] for material in found] == ["Swift"]
+    assert "<b>generics</b>" in found[0]["snippet"]
+
+    # Разметка из текста материала приходит экранированной, живые теги — только выделение
+    client.post("/materials/", headers=headers, json={"title": "XSS", "content": "<img src=x onerror=alert(1)> closures"})
+    snippet = client.get("/materials/search", headers=headers, params={"q": "closures"}).json()[0]["snippet"]
+    assert snippet == "&lt;img src=x onerror=alert(1)&gt; <b>closures</b>"
+    assert client.get("/materials/search", headers=headers, params={"q": ""}).status_code == 422
+
+
+# Тест: импортированные вопросы сразу находятся поиском, удалённые — пропадают
+def test_search_questions(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    document = {
+        "title": "Swift",
+        "questions": [
+            {"question_text": "Что такое optional?", "answers": [{"text": "Тип-обёртка", "is_correct": True}]},
+            {"question_text": "Что делает defer?", "answers": [{"text": "Откладывает код", "is_correct": True}]},
+        ]
+    }
+    client.post("/tests/import", headers=headers, json=document)
+
+    found = client.get("/questions/search", headers=headers, params={"q": "optinal"}).json()
+    assert [question["question_text"] for question in found] == ["Что такое optional?"]
+
+    client.delete(f"/questions/{found[0]['id']}", headers=headers)
+    assert client.get("/questions/search", headers=headers, params={"q": "optinal"}).json() == []
+
+
+# Тест: условный GET отдаёт 304, пока ресурс не изменился
+def test_conditional_get(client):
+    headers = register_and_login(client, ADMIN_EMAIL)
+    material_id = client.post("/materials/", headers=headers, json={"title": "Swift", "content": "Текст"}).json()["id"]
+
+    # Без валидаторов — один запрос к БД, ETag считается по загруженной строке
+    with query_budget(1):
+        first = client.get(f"/materials/{material_id}", headers=headers)
+    etag = first.headers["ETag"]
+    assert client.get(f"/materials/{material_id}", headers={**headers, "If-None-Match": etag}).status_code == 304
+    since = {**headers, "If-Modified-Since": first.headers["Last-Modified"]}
+    assert client.get(f"/materials/{material_id}", headers=since).status_code == 304
+
+    client.put(f"/materials/{material_id}", headers=headers, json={"content": "Новый текст"})
+    changed = client.get(f"/materials/{material_id}", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.json()["content"] == "Новый текст"
+
+    document = {"title": "ETag", "questions": [{"question_text": "Q?", "answers": [{"text": "A", "is_correct": True}]}]}
+    test_id = client.post("/tests/import", headers=headers, json=document).json()["id"]
+    questions = client.get(f"/tests/{test_id}/questions", headers=headers)
+    etag = questions.headers["ETag"]
+    assert client.get(f"/tests/{test_id}/questions", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    client.delete(f"/questions/{questions.json()[0]['id']}", headers=headers)
+    after_delete = client.get(f"/tests/{test_id}/questions", headers={**headers, "If-None-Match": etag})
+    assert after_delete.status_code == 200 and after_delete.json() == []
+
+
+# Тест: счётчик лайков меняется только при переключении флага, популярные — по счётчику
+def test_material_likes(client):
+    admin = register_and_login(client, ADMIN_EMAIL)
+    user = register_and_login(client, "liker@example.com")
+    swift = client.post("/materials/", headers=admin, json={"title": "Swift"}).json()["id"]
+    kotlin = client.post("/materials/", headers=admin, json={"title": "Kotlin"}).json()["id"]
+    etag = client.get(f"/materials/{swift}", headers=admin).headers["ETag"]
+
+    for headers in (admin, user):
+        client.post(f"/materials/{swift}/like", headers=headers, json={"is_liked": True})
+    client.post(f"/materials/{swift}/like", headers=user, json={"is_liked": True})
+    client.post(f"/materials/{kotlin}/like", headers=user, json={"is_liked": False})
+    client.post(f"/materials/{kotlin}/like", headers=user, json={"is_liked": True})
+
+    popular = client.get("/materials/popular", headers=user).json()
+    assert [(m["title"], m["like_count"]) for m in popular] == [("Swift", 2), ("Kotlin", 1)]
+    liked = client.get("/materials/my/liked", headers=user).json()
+    assert {m["title"] for m in liked} == {"Swift", "Kotlin"}
+
+    client.post(f"/materials/{swift}/like", headers=user, json={"is_liked": False})
+    client.post(f"/materials/{swift}/like", headers=user, json={"is_liked": False})
+    assert [m["title"] for m in client.get("/materials/my/liked", headers=user).json()] == ["Kotlin"]
+    counts = {m["title"]: m["like_count"] for m in client.get("/materials/popular", headers=user).json()}
+    assert counts == {"Swift": 1, "Kotlin": 1}
+    # Лайк не меняет версию содержимого
+    assert client.get(f"/materials/{swift}", headers={**admin, "If-None-Match": etag}).status_code == 304
+    assert client.post(f"/materials/{UUID(int=1)}/like", headers=user, json={"is_liked": True}).status_code == 404
+
+
+# Тест: вторая строка user_materials на ту же пару отклоняется — параллельный первый лайк не задвоит счётчик
+def test_material_like_unique(client, test_db):
+    admin = register_and_login(client, ADMIN_EMAIL)
+    material_id = UUID(client.post("/materials/", headers=admin, json={"title": "Swift"}).json()["id"])
+    user_id = UUID(client.get("/users/me", headers=admin).json()["id"])
+    client.post(f"/materials/{material_id}/like", headers=admin, json={"is_liked": False})
+
+    test_db.add(UserMaterial(user_id=user_id, material_id=material_id, is_liked=True))
+    with pytest.raises(IntegrityError):
+        test_db.commit()
+    test_db.rollback()
+
+    # Строка уже есть: лайк проходит через UPDATE и засчитывается один раз
+    client.post(f"/materials/{material_id}/like", headers=admin, json={"is_liked": True})
+    assert [m["like_count"] for m in client.get("/materials/popular", headers=admin).json()] == [1]
+    assert len(client.get("/materials/my/liked", headers=admin).json()) == 1
 
 
 # Запуск тестов
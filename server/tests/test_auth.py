@@ -0,0 +1,183 @@
+from uuid import uuid4
+
+from server.app.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Тест: кэш возвращает значение до истечения TTL и считает попадания/промахи
+def test_ttl_cache_hit_miss_and_expiry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=30, timer=clock)
+
+    assert cache.get("token") is None
+    cache.set("token", "user")
+    assert cache.get("token") == "user"
+
+    clock.now = 31
+    assert cache.get("token") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 0
+
+
+# Тест: TTL записи не превышает переданный (срок жизни JWT)
+def test_ttl_cache_per_entry_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=60, timer=clock)
+
+    cache.set("short", "user", ttl=5)
+    cache.set("expired", "user", ttl=-1)
+    clock.now = 6
+    assert cache.get("short") is None
+    assert cache.get("expired") is None
+
+
+# Тест: при переполнении вытесняется давно не использованная запись
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+# Тест: инвалидация всех токенов пользователя
+def test_ttl_cache_invalidate_where():
+    cache = TTLCache(maxsize=10, ttl=60)
+    user_id, other_id = uuid4(), uuid4()
+    cache.set("t1", user_id)
+    cache.set("t2", user_id)
+    cache.set("t3", other_id)
+
+    assert cache.invalidate_where(lambda value: value == user_id) == 2
+    assert cache.get("t1") is None
+    assert cache.get("t3") == other_id
+
+
+# Тест: хэширование в пуле процессов совместимо с синхронной проверкой
+def test_hash_password_async_roundtrip():
+    import asyncio
+    from server.app.utils import security
+
+    async def scenario():
+        hashed = await security.hash_password_async("secret")
+        assert security.verify_password("secret", hashed)
+        assert await security.verify_password_async("secret", hashed)
+        assert not await security.verify_password_async("wrong", hashed)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        security.shutdown_hash_pool()
+
+
+# Тест: при заполненной очереди хэширование сразу отклоняется
+def test_hashing_queue_overflow(monkeypatch):
+    import asyncio
+    import pytest
+    from server.app.utils import security
+
+    monkeypatch.setattr(security, "HASH_POOL_WORKERS", 0)
+    monkeypatch.setattr(security, "HASH_QUEUE_SIZE", 0)
+
+    async def scenario():
+        results = await asyncio.gather(
+            security.hash_password_async("a"),
+            security.hash_password_async("b"),
+            return_exceptions=True,
+        )
+        assert sum(isinstance(r, security.HashingOverloaded) for r in results) == 1
+
+    asyncio.run(scenario())
+
+
+# Тест: Principal собирается из claims токена без обращения к БД
+def test_get_current_principal_from_claims():
+    import asyncio
+    import pytest
+    from fastapi import HTTPException
+    from server.app.routers.auth import get_current_principal
+    from server.app.utils.security import create_access_token
+
+    user_id = uuid4()
+    token = create_access_token(data={"sub": "admin@example.com", "uid": str(user_id), "role": "admin"})
+    principal = asyncio.run(get_current_principal(token))
+    assert principal.id == user_id
+    assert principal.is_admin
+
+    legacy_token = create_access_token(data={"sub": "user@example.com"})
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_principal(legacy_token))
+    assert exc_info.value.status_code == 401
+
+
+# Тест: локально отозванный токен не теряется при пересборке множества из БД
+def test_revocation_list_replace_keeps_local_additions():
+    from datetime import datetime, timedelta, timezone
+    from server.app.utils.revocation import RevocationList
+
+    later = datetime.now(timezone.utc) + timedelta(hours=1)
+    revoked = RevocationList()
+    revoked.replace([("a", later), ("b", later)])
+    assert revoked.is_revoked("a")
+    assert not revoked.is_revoked(None)
+
+    revoked.add("c", later)
+    revoked.replace([("a", later)])
+    assert revoked.is_revoked("c")
+    assert not revoked.is_revoked("b")
+
+
+# Тест: истёкшие jti убираются из памяти, а синхронизация удаляет их строки из БД
+def test_revocation_list_prunes_expired():
+    import asyncio
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.pool import StaticPool
+    from server.app.utils.db.models import Base, RevokedToken
+    from server.app.utils.revocation import RevocationList
+
+    now = datetime.now(timezone.utc)
+    revoked = RevocationList()
+    revoked.add("old", now - timedelta(seconds=1))
+    revoked.add("live", now + timedelta(hours=1))
+    assert revoked.prune(now) == 1
+    assert not revoked.is_revoked("old") and revoked.is_revoked("live")
+
+    async def scenario():
+        # Своя БД в памяти, общий движок тестов не трогаем
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False)
+            async with session_factory() as db:
+                db.add_all([
+                    RevokedToken(jti="expired", expires_at=now - timedelta(hours=1)),
+                    RevokedToken(jti="active", expires_at=now + timedelta(hours=1)),
+                ])
+                await db.commit()
+
+            synced = RevocationList(session_factory)
+            await synced.sync()
+            assert synced.is_revoked("active") and not synced.is_revoked("expired")
+            async with session_factory() as db:
+                assert (await db.execute(select(RevokedToken.jti))).scalars().all() == ["active"]
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,14 @@
+import time
+
+from server.app.utils.ids import uuid7
+
+
+# Тест: UUIDv7 — версия 7, время в старших битах, монотонность внутри процесса
+def test_uuid7_is_time_ordered():
+    before_ms = time.time_ns() // 1_000_000
+    ids = [uuid7() for _ in range(10_000)]
+
+    assert all(value.version == 7 for value in ids)
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert ids[0].int >> 80 >= before_ms
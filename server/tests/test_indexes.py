@@ -0,0 +1,12 @@
+from sqlalchemy import create_engine
+
+from server.app.utils.db.models import Base
+from server.app.utils.db.query_plans import check_query_plans
+
+
+# Тест: все горячие запросы попадают в индексы (EXPLAIN QUERY PLAN на SQLite)
+def test_hot_queries_use_indexes():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    for result in check_query_plans(engine):
+        assert result["uses_index"], f"{result['query']}: {result['plan']}"
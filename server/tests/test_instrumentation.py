@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from server.app.utils.db.engine import InstrumentedQueuePool, create_db_engine, pool_stats
+from server.app.utils.db.instrumentation import (
+    QueryBudgetExceeded, collect_queries, fingerprint, query_budget
+)
+
+
+# Тест: запросы, отличающиеся только параметрами, дают один отпечаток
+def test_fingerprint_ignores_parameters():
+    assert fingerprint("SELECT * FROM users WHERE id = 'a1' AND age > 18") == \
+        fingerprint("SELECT *\n  FROM users WHERE id = 'b2' AND age > 30")
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT * FROM t WHERE id IN ($1)")
+
+
+# Тест: сборщик считает запросы, время и повторы; вложенный бюджет не скрывает внешний сборщик
+def test_collect_queries_and_budget():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        with collect_queries() as outer:
+            for value in range(6):
+                connection.execute(text("SELECT :value"), {"value": value})
+            with pytest.raises(QueryBudgetExceeded, match="бюджете 1"):
+                with query_budget(1):
+                    connection.execute(text("SELECT 1"))
+                    connection.execute(text("SELECT 2"))
+        connection.execute(text("SELECT 3"))
+
+    assert outer.count == 8
+    assert outer.total_ms >= 0
+    assert outer.repeated(threshold=5) == [("SELECT ?", 8)]
+
+
+# Тест: при исчерпанном пуле checkout ждёт pool_timeout и засчитывается как таймаут
+def test_pool_wait_stats_on_exhausted_pool(tmp_path):
+    engine = create_db_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    with engine.connect():
+        before = pool_stats(engine)
+        assert before["checked_out"] == 1 and before["connects"] == 1 and before["timeouts"] == 0
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    stats = pool_stats(engine)
+    assert stats["timeouts"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["max_wait_ms"] >= 100 > before["max_wait_ms"]
+    # Ожидание в очереди не открывает соединение
+    assert stats["connects"] == 1
+    engine.dispose()
@@ -0,0 +1,82 @@
+import csv
+import io
+from datetime import date
+from types import SimpleNamespace
+
+from server.app.utils.db.partitions import (
+    add_months, archive_partition, count_archived_rows, expired_partitions, partition_month, partition_name
+)
+
+
+# Тест: имена партиций и переход через границу года
+def test_partition_names_and_months():
+    assert partition_name(date(2026, 12, 1)) == "chat_messages_p2026_12"
+    assert partition_month("chat_messages_p2026_12") == date(2026, 12, 1)
+    assert partition_month("chat_messages_default") is None
+    assert add_months(date(2026, 11, 1), 3) == date(2027, 2, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+
+# Тест: архивируются только партиции старше срока хранения, default не трогаем
+def test_expired_partitions():
+    names = [
+        "chat_messages_p2026_06",
+        "chat_messages_p2026_07",
+        "chat_messages_p2026_08",
+        "chat_messages_p2026_10",
+        "chat_messages_default",
+    ]
+    today = date(2026, 10, 16)
+    assert expired_partitions(names, 2, today) == ["chat_messages_p2026_06", "chat_messages_p2026_07"]
+    assert expired_partitions(names, 0, today) == []
+
+
+class FakeCursor:
+    """ Курсор psycopg2: COPY выгружает CSV, как это делает PostgreSQL """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, statement):
+        self.executed.append(statement)
+
+    def fetchone(self):
+        return (len(self.rows),)
+
+    def copy_expert(self, statement, stream):
+        buffer = io.StringIO(newline="")
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "message_text"])
+        writer.writerows(self.rows)
+        stream.write(buffer.getvalue().encode())
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# Тест: многострочные сообщения считаются одной записью, партиция удаляется
+def test_archive_partition_multiline_messages(tmp_path):
+    cursor = FakeCursor([("1", "Первая строка\nвторая строка"), ("2", "Код:\n```\nprint()\n```")])
+    connection = FakeConnection(cursor)
+    engine = SimpleNamespace(raw_connection=lambda: connection)
+
+    path = archive_partition(engine, "chat_messages_p2026_01", str(tmp_path))
+    assert count_archived_rows(path) == 2
+    assert cursor.executed[-1] == "DROP TABLE chat_messages_p2026_01"
+    assert connection.committed
@@ -0,0 +1,52 @@
+from uuid import uuid4
+
+from server.app.utils.question_index import IndexedQuestion, QuestionSearchIndex
+
+
+# Тест: нечёткий поиск находит вопрос по опечатке и по тексту ответа, индекс обновляется точечно
+def test_question_index_incremental_updates():
+    index = QuestionSearchIndex()
+    test_id, question_id, answer_id = uuid4(), uuid4(), uuid4()
+    index.upsert_question(question_id, test_id, "Swift", "Что такое optional binding?")
+    index.upsert_question(uuid4(), test_id, "Kotlin", "Чем корутины отличаются от потоков?")
+
+    assert [match.question.id for match in index.search("optionl")] == [question_id]
+    assert index.search("guard let") == []
+
+    index.set_answer(question_id, answer_id, "Распаковка через guard let")
+    assert [match.question.id for match in index.search("guard let")] == [question_id]
+    assert index.search("guard let", test_id=uuid4()) == []
+
+    index.remove_answer(question_id, answer_id)
+    assert index.search("guard let") == []
+
+    index.remove_test(test_id)
+    assert len(index) == 0 and index.search("корутины") == []
+
+
+# Тест: правки, сделанные пока пересборка читала БД, не теряются при подмене индекса
+def test_question_index_replace_replays_concurrent_updates():
+    index = QuestionSearchIndex()
+    test_id, kept_id, added_id, removed_id = uuid4(), uuid4(), uuid4(), uuid4()
+    index.upsert_question(kept_id, test_id, "Swift", "Что такое optional binding?")
+    index.upsert_question(removed_id, test_id, "Swift", "Что такое замыкание?")
+
+    index.begin_rebuild()
+    # Снимок прочитан до этих правок
+    snapshot = [
+        IndexedQuestion(kept_id, test_id, "Swift", "Что такое optional binding?"),
+        IndexedQuestion(removed_id, test_id, "Swift", "Что такое замыкание?"),
+    ]
+    index.upsert_question(added_id, test_id, "Kotlin", "Чем корутины отличаются от потоков?")
+    index.set_answer(kept_id, uuid4(), "Распаковка через guard let")
+    index.remove_question(removed_id)
+    index.replace(snapshot)
+
+    assert [match.question.id for match in index.search("корутины")] == [added_id]
+    assert [match.question.id for match in index.search("guard let")] == [kept_id]
+    assert index.search("замыкание") == [] and len(index) == 2
+
+    # Без пересборки журнал не копится
+    index.remove_question(added_id)
+    index.replace(snapshot[:1])
+    assert len(index) == 1
@@ -0,0 +1,56 @@
+import asyncio
+
+import fakeredis
+
+from server.app.utils.rate_limit import (
+    ConcurrencyLimiter, InMemoryRateLimitBackend, RedisRateLimitBackend
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# Тест: корзина в памяти пропускает burst, затем отказывает и пополняется со временем
+def test_in_memory_token_bucket():
+    clock = FakeClock()
+    backend = InMemoryRateLimitBackend(timer=clock)
+
+    async def scenario():
+        results = [await backend.consume("ip", capacity=3, per_second=1) for _ in range(4)]
+        assert [allowed for allowed, _ in results] == [True, True, True, False]
+        assert results[-1][1] == 1.0
+
+        clock.now = 1.0
+        assert (await backend.consume("ip", capacity=3, per_second=1))[0]
+        # Другие ключи не затронуты
+        assert (await backend.consume("other", capacity=3, per_second=1))[0]
+
+    asyncio.run(scenario())
+
+
+# Тест: общая корзина в Redis (fakeredis)
+def test_redis_token_bucket():
+    backend = RedisRateLimitBackend(fakeredis.FakeAsyncRedis())
+
+    async def scenario():
+        results = [await backend.consume("email:a@example.com", capacity=2, per_second=0.1) for _ in range(3)]
+        assert [allowed for allowed, _ in results] == [True, True, False]
+        assert results[-1][1] > 0
+
+    asyncio.run(scenario())
+
+
+# Тест: глобальный лимит одновременных проверок пароля
+def test_concurrency_limiter():
+    limiter = ConcurrencyLimiter(1)
+    with limiter.slot() as first:
+        assert first
+        with limiter.slot() as second:
+            assert not second
+    with limiter.slot() as again:
+        assert again